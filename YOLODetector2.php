@@ -98,10 +98,11 @@ class YOLODetector2
      * 
      * @param string $imagePath Path to the image file
      * @param bool $returnFullResponse Return full response including annotated image path
+     * @param array $context Optional 'image_path' and 'arduino_data' stored with the result in the detection history
      * @return array Array of detections with type and confidence, or full response
      * @throws Exception If detection fails
      */
-    public function detectPests($imagePath, $returnFullResponse = false)
+    public function detectPests($imagePath, $returnFullResponse = false, $context = [])
     {
         // Validate image file exists
         if (!file_exists($imagePath)) {
@@ -114,7 +115,7 @@ class YOLODetector2
         }
 
         // Send request to Flask service
-        $response = $this->sendDetectionRequest($imagePath);
+        $response = $this->sendDetectionRequest($imagePath, $context);
 
         // Parse results
         $data = json_decode($response, true);
@@ -135,19 +136,27 @@ class YOLODetector2
      * Send detection request to Flask service
      * 
      * @param string $imagePath Path to the image file
+     * @param array $context Optional 'image_path' and 'arduino_data' for the detection history
      * @return string JSON response from service
      * @throws Exception If request fails
      */
-    private function sendDetectionRequest($imagePath)
+    private function sendDetectionRequest($imagePath, $context = [])
     {
         $ch = curl_init($this->serviceUrl . '/detect');
         
         // Create CURLFile for image upload
         $cfile = new CURLFile($imagePath, 'image/jpeg', 'frame.jpg');
+        $postFields = ['image' => $cfile];
+        if (!empty($context['image_path'])) {
+            $postFields['image_path'] = $context['image_path'];
+        }
+        if (!empty($context['arduino_data'])) {
+            $postFields['arduino_data'] = json_encode($context['arduino_data']);
+        }
         
         curl_setopt_array($ch, [
             CURLOPT_POST => true,
-            CURLOPT_POSTFIELDS => ['image' => $cfile],
+            CURLOPT_POSTFIELDS => $postFields,
             CURLOPT_RETURNTRANSFER => true,
             CURLOPT_TIMEOUT => $this->timeout,
             CURLOPT_CONNECTTIMEOUT => $this->connectTimeout,
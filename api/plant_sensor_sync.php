@@ -13,8 +13,85 @@ date_default_timezone_set('Asia/Manila');
 
 require_once __DIR__ . '/../includes/plant-monitor-logic.php';
 
+/**
+ * Store one entry of a bridge batch; returns its per-reading result
+ */
+function processBatchReading($monitor, $reading, $key) {
+    $rollup = null;
+    if (isset($reading['window'])) {
+        try {
+            $rollup = $monitor->saveRollup(
+                $reading['window'],
+                $reading['window_start'] ?? 0,
+                $reading['count'] ?? 0,
+                $reading['stats'] ?? []
+            );
+        } catch (PDOException $e) {
+            // e.g. SensorRollups not created yet (database/create_sensor_rollups.sql)
+            $rollup = [
+                'success' => false,
+                'message' => 'Rollup not saved: ' . $e->getMessage()
+            ];
+        }
+        if (empty($reading['log_reading'])) {
+            return $rollup;
+        }
+    }
+    
+    if (!isset($reading['soil_moisture']) || !isset($reading['temperature']) || !isset($reading['humidity'])) {
+        return [
+            'success' => false,
+            'message' => 'Missing required sensor data: soil_moisture, temperature, humidity'
+        ];
+    }
+    
+    $recordedAt = isset($reading['recorded_at']) && is_numeric($reading['recorded_at'])
+        ? (int)$reading['recorded_at']
+        : null;
+    
+    // Transitions and logged rollups carry the bridge's warning state
+    $bridgeState = isset($reading['warning_level']) ? [
+        'warning_level' => $reading['warning_level'],
+        'notify' => !empty($reading['notify']),
+        'violations' => $reading['violations'] ?? null
+    ] : null;
+    
+    $result = $monitor->processSensorReading(
+        floatval($reading['soil_moisture']),
+        floatval($reading['temperature']),
+        floatval($reading['humidity']),
+        $recordedAt,
+        $bridgeState,
+        $key
+    );
+    
+    // The reading row is keyed, so the bridge can resend the entry until its rollup is stored too
+    if ($rollup !== null && empty($rollup['success']) && !empty($result['success'])) {
+        $result['success'] = false;
+        $result['message'] = $rollup['message'];
+    }
+    return $result;
+}
+
 try {
-    $monitor = new PlantMonitor();
+    // Multi-device bridges name the plant each reading belongs to
+    // (?plant_id= on GET, "plant_id" in the POST body); default is the active plant
+    $input = null;
+    $plantID = $_GET['plant_id'] ?? null;
+    if ($_SERVER['REQUEST_METHOD'] === 'POST') {
+        // Get JSON input
+        $input = json_decode(file_get_contents('php://input'), true);
+        
+        // Support both JSON and form data
+        if (!$input) {
+            $input = $_POST;
+        }
+        if (isset($input['plant_id'])) {
+            $plantID = $input['plant_id'];
+        }
+    }
+    
+    $monitor = new PlantMonitor(is_numeric($plantID) ? intval($plantID) : null);
     
     // Handle GET request - return active plant info
     if ($_SERVER['REQUEST_METHOD'] === 'GET') {
@@ -23,7 +100,7 @@ try {
         if (!$activePlant) {
             echo json_encode([
                 'success' => false,
-                'message' => 'No active plant configured'
+                'message' => $plantID !== null ? 'Plant not found' : 'No active plant configured'
             ]);
             exit;
         }
@@ -56,12 +133,53 @@ try {
     
     // Handle POST request - process sensor data
     if ($_SERVER['REQUEST_METHOD'] === 'POST') {
-        // Get JSON input
-        $input = json_decode(file_get_contents('php://input'), true);
-        
-        // Support both JSON and form data
-        if (!$input) {
-            $input = $_POST;
+        // Batch format from plant_sensor_bridge.py:
+        // {"readings": [{"soil_moisture", "temperature", "humidity", "recorded_at"}, ...]}
+        // Each entry may carry a "key"; replayed keys are acknowledged, not stored twice,
+        // and every result echoes its key so the bridge only drops what was stored.
+        // Readings are processed in order so consecutive-violation tracking still holds.
+        // Window rollups also carry "window", "window_start", "count", "stats" and
+        // "log_reading"; only the finest window's rollup becomes a SensorReadings row.
+        if (isset($input['readings']) && is_array($input['readings'])) {
+            $results = [];
+            $processed = 0;
+            
+            foreach ($input['readings'] as $reading) {
+                $key = isset($reading['key']) ? substr((string)$reading['key'], 0, 64) : null;
+                try {
+                    $result = processBatchReading($monitor, $reading, $key);
+                } catch (Exception $e) {
+                    // One failing entry must not fail (and replay) the rest of the batch
+                    $result = [
+                        'success' => false,
+                        'message' => 'Error: ' . $e->getMessage()
+                    ];
+                }
+                if ($key !== null) {
+                    $result['key'] = $key;
+                }
+                if (!empty($result['success'])) {
+                    $processed++;
+                }
+                $results[] = $result;
+            }
+            
+            // Latest result that went through threshold checks (rollup-only entries don't)
+            $checked = array_values(array_filter($results, function ($result) {
+                return isset($result['warning_level']);
+            }));
+            $latest = end($checked) ?: [];
+            echo json_encode([
+                'success' => true,
+                'processed' => $processed,
+                'received' => count($input['readings']),
+                'results' => $results,
+                // Latest reading's state, same keys as a single-reading response
+                'violations' => $latest['violations'] ?? [],
+                'warning_level' => $latest['warning_level'] ?? 0,
+                'notification_triggered' => in_array(true, array_column($results, 'notification_triggered'), true)
+            ]);
+            exit;
         }
         
         // Validate required fields
@@ -77,8 +195,10 @@ try {
         $temperature = floatval($input['temperature']);
         $humidity = floatval($input['humidity']);
         
+        $key = isset($input['key']) ? substr((string)$input['key'], 0, 64) : null;
+        
         // Process the reading
-        $result = $monitor->processSensorReading($soilMoisture, $temperature, $humidity);
+        $result = $monitor->processSensorReading($soilMoisture, $temperature, $humidity, null, null, $key);
         
         echo json_encode($result);
         exit;
@@ -4,45 +4,1050 @@ Arduino Bridge Service for IoT Farm Monitoring System
 Reads sensor data from Arduino and provides REST API endpoints
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 import serial
+import binascii
+import gzip
+import os
+import selectors
+import socket
+import struct
+from types import MappingProxyType
+from urllib.parse import parse_qs, urlsplit
 import threading
 import time
 import json
 import logging
+import math
+from array import array
+import numpy as np
 from datetime import datetime
 
+try:
+    import msgpack  # optional compact encoding for /data responses
+except ImportError:
+    msgpack = None
+
+from service_logging import setup_logging
+from service_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Configure logging: a background thread writes the records, repeated
+# messages are rate-limited (ARDUINO_LOG_LEVEL / _LOG_LEVELS / _LOG_RATE_LIMIT)
+log_rate_limit, log_listener = setup_logging("ARDUINO", fmt=logging.BASIC_FORMAT)
+logger = logging.getLogger("arduino_bridge")
+serial_logger = logging.getLogger("arduino_bridge.serial")  # per-line and per-reading messages
+
+# Prometheus metrics (/metrics). Device series read the device's own counters
+# when scraped (see register_device_metrics), so serial reads pay nothing extra
+metrics = MetricsRegistry()
+serial_lines_total = metrics.counter("arduino_serial_lines", "Serial lines or binary frames read", ["device"])
+readings_total = metrics.counter("arduino_readings", "Readings recorded", ["device"])
+parse_failures_total = metrics.counter("arduino_parse_failures",
+                                       "Serial lines that did not parse into a reading", ["device"])
+read_errors_total = metrics.counter("arduino_read_errors", "Serial port read errors", ["device"])
+timeseries_errors_total = metrics.counter("arduino_timeseries_errors", "Failed on-disk history appends", ["device"])
+frame_errors_total = metrics.counter("arduino_frame_errors", "Binary framing problems by kind", ["device", "kind"])
+reading_age_seconds = metrics.gauge("arduino_reading_age_seconds",
+                                    "Seconds since each sensor last reported a real reading", ["device", "sensor"])
+request_seconds = metrics.histogram("arduino_request_seconds", "HTTP request latency", ["endpoint"])
+requests_total = metrics.counter("arduino_requests", "HTTP requests by endpoint and status", ["endpoint", "status"])
 
 # Arduino configuration
 ARDUINO_PORT = "COM3"  # Change this to your Arduino port
 BAUD_RATE = 9600
 TIMEOUT = 1
 
-# Global variables
-arduino = None
-latest_readings = {
-    "temperature": {"value": None, "timestamp": None, "status": "offline"},
-    "humidity": {"value": None, "timestamp": None, "status": "offline"},
-    "soil_moisture": {"value": None, "timestamp": None, "status": "offline"}
-}
-
-def connect_arduino():
-    """Initialize Arduino connection"""
-    global arduino
+SIMULATION_INTERVAL = 1  # seconds between simulated readings
+HISTORY_SIZE = 3600  # samples kept per sensor
+
+# On-disk sensor history: memory-mapped append-only columns per device/sensor,
+# raw samples plus 1 min and 1 h rollups so year-long range queries stay small
+TIMESERIES_ENABLED = os.environ.get("ARDUINO_TIMESERIES", "1") != "0"
+TIMESERIES_DIR = os.environ.get("ARDUINO_TIMESERIES_DIR",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "timeseries"))
+TIMESERIES_LEVELS = (60, 3600)      # rollup resolutions in seconds (raw is always kept)
+TIMESERIES_CHUNK_ROWS = 1 << 16     # file growth step
+TIMESERIES_FLUSH_INTERVAL = 30      # seconds between msync of dirty pages
+HISTORY_DEFAULT_POINTS = 500        # /history resolution when no step is given
+HISTORY_MAX_POINTS = 5000           # step is raised to stay under this
+
+# Reading responses: versioned, cached per encoding, conditional (ETag) and long-pollable
+LONGPOLL_TIMEOUT = 25       # default seconds a ?since_version= request waits for a new reading
+LONGPOLL_MAX_TIMEOUT = 55   # upper bound for ?timeout=
+GZIP_MIN_BYTES = 256        # smaller bodies are sent uncompressed
+
+# Serial framing: "auto" asks the board for binary frames after connecting and
+# keeps parsing text lines if it never acknowledges; "text" never asks
+SERIAL_FRAMING = os.environ.get("ARDUINO_FRAMING", "auto")
+FRAMING_NEGOTIATE_TIMEOUT = 8  # seconds (setup() on the board takes ~3s after reset)
+FRAMING_FALLBACK_BYTES = 256   # bytes without a valid frame before going back to text (board reset)
+
+# Binary frame, little-endian, 12 bytes (see sendFrame() in src/main.cpp):
+#   0xAA 0x55 | flags u8 | seq u16 | temperature i16 (x10) | humidity u16 (x10) | soil u8 | crc u16
+# crc is CRC-16/XMODEM (binascii.crc_hqx with init 0) over flags..soil
+FRAME_SYNC = b"\xaa\x55"
+FRAME_BODY = struct.Struct("<BHhHB")
+FRAME_CRC = struct.Struct("<H")
+FRAME_SIZE = len(FRAME_SYNC) + FRAME_BODY.size + FRAME_CRC.size
+FRAME_FLAG_SIMULATED = 0x01
+
+# Live push stream (Server-Sent Events). GET /stream on the main port (5001,
+# the one tunnelled through ngrok) is always served. The dedicated single-thread
+# server on STREAM_PORT scales to many local subscribers; it is only reachable
+# remotely if that port is exposed too (ARDUINO_STREAM_PORT=0 disables it)
+STREAM_HOST = os.environ.get("ARDUINO_STREAM_HOST", "127.0.0.1")
+STREAM_PORT = int(os.environ.get("ARDUINO_STREAM_PORT", "5002"))
+STREAM_KEEPALIVE = 15  # seconds between keep-alive comments
+STREAM_CLIENT_TIMEOUT = 60  # drop clients that accept nothing for this long
+STREAM_MAX_CLIENTS = 500
+# Each /stream subscriber on the main port holds a Flask worker thread while connected
+STREAM_MAIN_MAX_SUBSCRIBERS = int(os.environ.get("ARDUINO_STREAM_MAIN_MAX", "8"))
+
+class SensorHistory:
+    """Fixed-size ring buffer of (timestamp, value) samples backed by flat arrays"""
+    
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._start = 0   # physical index of the oldest sample
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def append(self, timestamp, value):
+        """Add a sample, overwriting the oldest one when full"""
+        with self._lock:
+            index = (self._start + self._count) % self.capacity
+            self._timestamps[index] = timestamp
+            self._values[index] = value
+            if self._count < self.capacity:
+                self._count += 1
+            else:
+                self._start = (self._start + 1) % self.capacity
+    
+    def _first_after(self, since):
+        """Logical index of the first sample newer than since (binary search)"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamps[(self._start + middle) % self.capacity] > since:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+    
+    def since(self, since=None, limit=None):
+        """Return (timestamps, values) lists of samples newer than since, oldest first"""
+        with self._lock:
+            first = self._first_after(since) if since is not None else 0
+            count = self._count - first
+            if limit is not None and count > limit:
+                first, count = self._count - limit, limit
+            if count <= 0:
+                return [], []
+            
+            begin = (self._start + first) % self.capacity
+            end = begin + count
+            if end <= self.capacity:
+                return self._timestamps[begin:end].tolist(), self._values[begin:end].tolist()
+            # Wrapped around the end of the buffer: two slices
+            end -= self.capacity
+            timestamps = self._timestamps[begin:].tolist() + self._timestamps[:end].tolist()
+            values = self._values[begin:].tolist() + self._values[:end].tolist()
+            return timestamps, values
+    
+    def __len__(self):
+        return self._count
+
+class MappedSeries:
+    """Append-only columns in memory-mapped files, ordered by timestamp"""
+    
+    def __init__(self, path, columns, chunk_rows=TIMESERIES_CHUNK_ROWS):
+        self.path = path
+        self.columns = columns  # name -> dtype, must include "ts"
+        self.chunk_rows = chunk_rows
+        self.arrays = {}
+        self.capacity = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        
+        existing = max(os.path.getsize(self._file(name)) // np.dtype(dtype).itemsize
+                       if os.path.exists(self._file(name)) else 0
+                       for name, dtype in columns.items())
+        self._map(max(chunk_rows, math.ceil(existing / chunk_rows) * chunk_rows))
+        # Unused capacity is zero-filled and timestamps are always > 0
+        self.length = int(np.count_nonzero(self.arrays["ts"]))
+        self.last_ts = float(self.arrays["ts"][self.length - 1]) if self.length else 0.0
+    
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+    
+    def _map(self, capacity):
+        # Drop our maps first: Windows refuses to resize a file with an open mapped
+        # view. The file grows by appending zeros, never SetEndOfFile (truncate), so
+        # views a reader still holds from view() don't block it either
+        self.arrays = {}
+        arrays = {}
+        for name, dtype in self.columns.items():
+            path = self._file(name)
+            size = capacity * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.write(bytes(size - f.tell()))
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(capacity,))
+        self.arrays = arrays
+        self.capacity = capacity
+    
+    def append(self, row):
+        """Append one row (column name -> value); timestamps never go backwards"""
+        with self._lock:
+            if self.length == self.capacity:
+                self._flush()
+                self._map(self.capacity + self.chunk_rows)
+            ts = max(row["ts"], self.last_ts)
+            for name, value in row.items():
+                if name != "ts":
+                    self.arrays[name][self.length] = value
+            self.arrays["ts"][self.length] = ts  # written last: a torn row isn't counted on reload
+            self.length += 1
+            self.last_ts = ts
+    
+    def view(self, start, end):
+        """Zero-copy column slices for start <= ts < end"""
+        with self._lock:
+            arrays, length = self.arrays, self.length
+        ts = arrays["ts"][:length]
+        lo, hi = ts.searchsorted(start), ts.searchsorted(end)
+        return {name: column[lo:hi] for name, column in arrays.items()}
+    
+    def _flush(self):
+        for column in self.arrays.values():
+            column.flush()
+    
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+class TimeSeriesStore:
+    """One device's sensor history on disk with downsampled range queries"""
+    
+    RAW_COLUMNS = {"ts": "<f8", "value": "<f4"}
+    ROLLUP_COLUMNS = {"ts": "<f8", "min": "<f4", "max": "<f4", "sum": "<f8", "count": "<u4"}
+    
+    def __init__(self, path, sensors, levels=TIMESERIES_LEVELS):
+        self.levels = tuple(sorted(levels))
+        self.raw = {sensor: MappedSeries(os.path.join(path, sensor, "raw"), self.RAW_COLUMNS)
+                    for sensor in sensors}
+        self.rollups = {
+            sensor: {level: MappedSeries(os.path.join(path, sensor, f"{level}s"), self.ROLLUP_COLUMNS)
+                     for level in self.levels}
+            for sensor in sensors
+        }
+        # Buckets still filling: sensor -> level -> [start, min, max, sum, count]
+        self._open = {sensor: dict.fromkeys(self.levels) for sensor in sensors}
+    
+    def append(self, ts, values):
+        """Store one sample per sensor and roll completed buckets up"""
+        for sensor, value in values.items():
+            if sensor not in self.raw or value is None:
+                continue
+            self.raw[sensor].append({"ts": ts, "value": value})
+            for level in self.levels:
+                bucket = ts - ts % level
+                pending = self._open[sensor][level]
+                if pending is not None and pending[0] != bucket:
+                    self.rollups[sensor][level].append({
+                        "ts": pending[0], "min": pending[1], "max": pending[2],
+                        "sum": pending[3], "count": pending[4]
+                    })
+                    pending = None
+                if pending is None:
+                    self._open[sensor][level] = [bucket, value, value, value, 1]
+                else:
+                    pending[1] = min(pending[1], value)
+                    pending[2] = max(pending[2], value)
+                    pending[3] += value
+                    pending[4] += 1
+    
+    def align_step(self, step):
+        """Round a derived step up to a multiple of the coarsest level it spans"""
+        for level in reversed(self.levels):
+            if step > level:
+                return math.ceil(step / level) * level
+        return step
+    
+    def query(self, sensor, start, end, step):
+        """Series downsampled to step-second buckets (mean/min/max/count per bucket)
+        
+        Reads the coarsest rollup level that divides step exactly, so a year at
+        step=3600 touches ~8760 rows instead of ~31M raw samples.
+        """
+        level = next((lv for lv in reversed(self.levels) if step >= lv and step % lv == 0), None)
+        if level is None:
+            columns = self.raw[sensor].view(start, end)
+            ts = columns["ts"]
+            values = columns["value"].astype(np.float64)
+            sums, counts, mins, maxs = values, np.ones(len(ts), dtype=np.int64), values, values
+        else:
+            start -= start % level  # bucket edges on rollup boundaries
+            columns = self.rollups[sensor][level].view(start, end)
+            pending = self._open[sensor][level]
+            ts, mins, maxs, sums, counts = (columns["ts"], columns["min"], columns["max"],
+                                            columns["sum"], columns["count"])
+            if pending is not None and start <= pending[0] < end:
+                # include the bucket that is still filling
+                ts, mins, maxs, sums, counts = (np.append(ts, pending[0]), np.append(mins, pending[1]),
+                                                np.append(maxs, pending[2]), np.append(sums, pending[3]),
+                                                np.append(counts, pending[4]))
+        
+        result = {"level": level or "raw", "step": step, "timestamps": [], "mean": [],
+                  "min": [], "max": [], "count": []}
+        if not len(ts):
+            return result
+        
+        bucket = ((ts - start) // step).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+        total = np.add.reduceat(np.asarray(sums, dtype=np.float64), starts)
+        count = np.add.reduceat(np.asarray(counts, dtype=np.int64), starts)
+        result.update(
+            timestamps=(start + bucket[starts] * step).tolist(),
+            mean=np.round(total / count, 2).tolist(),
+            min=np.round(np.minimum.reduceat(mins, starts).astype(np.float64), 2).tolist(),
+            max=np.round(np.maximum.reduceat(maxs, starts).astype(np.float64), 2).tolist(),
+            count=count.tolist()
+        )
+        return result
+    
+    def flush(self):
+        for sensor, series in self.raw.items():
+            series.flush()
+            for rollup in self.rollups[sensor].values():
+                rollup.flush()
+
+class StreamClient:
+    """One SSE subscriber: its socket, unsent bytes and coalesced pending changes"""
+    
+    __slots__ = ("sock", "request", "outbuf", "pending", "streaming", "last_progress",
+                 "sensors", "devices")
+    
+    def __init__(self, sock):
+        self.sock = sock
+        self.request = b""
+        self.outbuf = bytearray()
+        self.pending = {}       # device_id -> {sensor_type: latest reading not yet serialized}
+        self.streaming = False  # True once the request was accepted
+        self.last_progress = time.time()
+        self.sensors = None     # optional ?sensors= filter
+        self.devices = None     # optional ?device= filter
+
+class StreamSubscriber:
+    """SSE subscriber on the main HTTP port, written to by its own request thread
+    
+    Changes are coalesced in `pending` while the thread is busy writing, the
+    same back-pressure as the selector clients get.
+    """
+    
+    __slots__ = ("pending", "ready", "sensors", "devices")
+    
+    def __init__(self, sensors=None, devices=None):
+        self.pending = {}  # device_id -> {sensor_type: latest reading not yet written}
+        self.ready = threading.Condition()
+        self.sensors = sensors
+        self.devices = devices
+
+def parse_stream_filter(values):
+    """Repeated and/or comma-separated query values -> set, None when absent"""
+    items = {item for value in values for item in value.split(",") if item}
+    return items or None
+
+class SensorStream:
+    """Single-threaded SSE server pushing changed sensor values to many subscribers
+    
+    One selector loop serves every client (no thread per connection). A slow
+    client never grows an unbounded queue: while its socket is busy, newer
+    values overwrite older pending ones, so it receives the latest state once
+    it catches up.
+    """
+    
+    def __init__(self, host=STREAM_HOST, port=STREAM_PORT):
+        self.host = host
+        self.port = port
+        self.clients = {}
+        self.subscribers = set()  # StreamSubscriber on the main HTTP port
+        self._selector = selectors.DefaultSelector()
+        self._incoming = {}
+        self._lock = threading.Lock()
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_send.setblocking(False)  # publishers never wait on the loop
+        self._event_id = 0
+        self.events_sent = 0
+        self.coalesced = 0
+        self.dropped_clients = 0
+    
+    def start(self):
+        """Bind the listening socket (unless port is 0) and start the event loop thread"""
+        if self.port:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.port))
+            listener.listen(128)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ, "listener")
+        self._wake_recv.setblocking(False)
+        self._selector.register(self._wake_recv, selectors.EVENT_READ, "wake")
+        threading.Thread(target=self._run, name="sensor-stream", daemon=True).start()
+    
+    def publish(self, device_id, changes):
+        """Queue a device's changed readings (sensor_type -> reading dict); safe from any thread"""
+        if not changes:
+            return
+        with self._lock:
+            self._incoming.setdefault(device_id, {}).update(changes)
+        try:
+            self._wake_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # loop is already awake
+    
+    def _run(self):
+        last_keepalive = time.time()
+        while True:
+            for key, mask in self._selector.select(timeout=1.0):
+                if key.data == "listener":
+                    self._accept(key.fileobj)
+                elif key.data == "wake":
+                    try:
+                        while self._wake_recv.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                        self._flush(client)
+            
+            with self._lock:
+                incoming, self._incoming = self._incoming, {}
+            if incoming:
+                self._fan_out(incoming)
+            
+            now = time.time()
+            if now - last_keepalive >= STREAM_KEEPALIVE:
+                last_keepalive = now
+                for client in list(self.clients.values()):
+                    if not client.streaming:
+                        continue
+                    if client.outbuf and now - client.last_progress > STREAM_CLIENT_TIMEOUT:
+                        self.dropped_clients += 1
+                        self._close(client)
+                    elif not client.outbuf:
+                        client.outbuf += b": keep-alive\n\n"
+                        self._flush(client)
+    
+    def _accept(self, listener):
+        try:
+            sock, _ = listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        if len(self.clients) + len(self.subscribers) >= STREAM_MAX_CLIENTS:
+            sock.close()
+            return
+        sock.setblocking(False)
+        client = StreamClient(sock)
+        self.clients[sock.fileno()] = client
+        self._selector.register(sock, selectors.EVENT_READ, client)
+    
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(client)
+            return
+        if client.streaming:
+            return  # SSE clients don't send anything after the request
+        
+        client.request += data
+        if b"\r\n\r\n" not in client.request:
+            if len(client.request) > 8192:
+                self._close(client)
+            return
+        
+        request_line = client.request.split(b"\r\n", 1)[0].decode("latin-1")
+        parts = request_line.split(" ")
+        path = parts[1] if len(parts) >= 2 else ""
+        if parts[0] != "GET" or not (path == "/stream" or path.startswith("/stream?")):
+            client.outbuf += (b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n"
+                              b"Connection: close\r\n\r\n")
+            self._flush(client)
+            self._close(client)
+            return
+        
+        query = parse_qs(urlsplit(path).query)
+        client.sensors = parse_stream_filter(query.get("sensors", []))
+        client.devices = parse_stream_filter(query.get("device", []))
+        
+        client.streaming = True
+        client.outbuf += (b"HTTP/1.1 200 OK\r\n"
+                          b"Content-Type: text/event-stream\r\n"
+                          b"Cache-Control: no-cache\r\n"
+                          b"Connection: keep-alive\r\n"
+                          b"Access-Control-Allow-Origin: *\r\n\r\n"
+                          b"retry: 3000\n\n")
+        # Start every subscriber from the full current state
+        for device in list(devices.values()):
+            client.pending[device.id] = device.snapshot.to_dict()
+        self._serialize(client)
+        self._flush(client)
+    
+    def subscribe(self, sensors=None, device_ids=None):
+        """Register a main-port subscriber starting from the full current state (None if full)"""
+        subscriber = StreamSubscriber(sensors, device_ids)
+        subscriber.pending = {device.id: device.snapshot.to_dict() for device in list(devices.values())}
+        with self._lock:
+            if (len(self.subscribers) >= STREAM_MAIN_MAX_SUBSCRIBERS
+                    or len(self.clients) + len(self.subscribers) >= STREAM_MAX_CLIENTS):
+                return None
+            self.subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+    
+    def _fan_out(self, changes):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            with subscriber.ready:
+                if subscriber.pending:
+                    self.coalesced += 1
+                for device_id, device_changes in changes.items():
+                    subscriber.pending.setdefault(device_id, {}).update(device_changes)
+                subscriber.ready.notify()
+        for client in list(self.clients.values()):
+            if not client.streaming:
+                continue
+            if client.pending:
+                self.coalesced += 1
+            for device_id, device_changes in changes.items():
+                client.pending.setdefault(device_id, {}).update(device_changes)
+            if not client.outbuf:
+                self._serialize(client)
+                self._flush(client)
+    
+    def _serialize(self, client):
+        """Turn pending changes into one SSE event per device (only when the socket is idle)"""
+        pending, client.pending = client.pending, {}
+        client.outbuf += self.format_events(pending, client.sensors, client.devices)
+    
+    def format_events(self, pending, sensors=None, device_ids=None):
+        """SSE "reading" events for pending changes, one per device, after filtering"""
+        events = bytearray()
+        for device_id, readings in pending.items():
+            if device_ids is not None and device_id not in device_ids:
+                continue
+            if sensors is not None:
+                readings = {k: v for k, v in readings.items() if k in sensors}
+            if not readings:
+                continue
+            device = devices.get(device_id)
+            with self._lock:
+                self._event_id += 1
+                event_id = self._event_id
+                self.events_sent += 1
+            payload = {
+                "device": device_id,
+                "plant_id": device.plant_id if device else None,
+                "readings": readings
+            }
+            events += (f"id: {event_id}\nevent: reading\n"
+                       f"data: {json.dumps(payload)}\n\n").encode("utf-8")
+        return bytes(events)
+    
+    def _flush(self, client):
+        if client.outbuf:
+            try:
+                sent = client.sock.send(client.outbuf)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self._close(client)
+                return
+            if sent:
+                del client.outbuf[:sent]
+                client.last_progress = time.time()
+        
+        # Socket drained: send whatever changed meanwhile, coalesced into one event
+        if not client.outbuf and client.pending:
+            self._serialize(client)
+            if client.outbuf:
+                self._flush(client)
+                return
+        
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbuf else 0)
+        try:
+            self._selector.modify(client.sock, events, client)
+        except (KeyError, ValueError):
+            pass
+    
+    def _close(self, client):
+        self.clients.pop(client.sock.fileno(), None)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+    
+    def stats(self):
+        """Subscriber and back-pressure counters for /health"""
+        return {
+            "port": self.port,
+            "subscribers": (sum(1 for client in list(self.clients.values()) if client.streaming)
+                            + len(self.subscribers)),
+            "events_sent": self.events_sent,
+            "coalesced": self.coalesced,
+            "dropped_clients": self.dropped_clients
+        }
+
+# Serial devices served by this bridge: each port feeds one PlantID.
+# ARDUINO_DEVICES="bed1=COM3@1,bed2=COM4@2" overrides this list; with
+# AUTO_DISCOVER every attached Arduino-like USB serial port is added.
+DEVICES = [
+    {"id": "default", "port": ARDUINO_PORT, "plant_id": None}
+]
+AUTO_DISCOVER = False
+ARDUINO_USB_VIDS = {0x2341, 0x2A03, 0x1A86, 0x10C4}  # Arduino, Arduino.org, CH340, CP210x
+SENSOR_TYPES = ("temperature", "humidity", "soil_moisture")
+
+class ReadingSnapshot:
+    """Immutable reading set of one device: replaced as a whole, never modified
+    
+    Writers build a new snapshot and publish it with a single reference swap,
+    so readers see one consistent set (same seq, no half-updated sensors)
+    without taking a lock.
+    """
+    
+    __slots__ = ("seq", "taken_at", "readings")
+    
+    def __init__(self, seq, taken_at, readings):
+        object.__setattr__(self, "seq", seq)
+        object.__setattr__(self, "taken_at", taken_at)
+        object.__setattr__(self, "readings", MappingProxyType(readings))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("ReadingSnapshot is immutable")
+    
+    def replace(self, taken_at, updates):
+        """Next snapshot with some sensors' readings replaced"""
+        readings = dict(self.readings)
+        readings.update(updates)
+        return ReadingSnapshot(self.seq + 1, taken_at, readings)
+    
+    def to_dict(self):
+        """sensor -> reading dict, for serialization"""
+        return dict(self.readings)
+
+def encode_frame(seq, temperature, humidity, soil_moisture, flags=0):
+    """Build one binary frame (same layout the sketch sends)"""
+    body = FRAME_BODY.pack(flags, seq & 0xFFFF, round(temperature * 10),
+                           round(humidity * 10), int(soil_moisture))
+    return FRAME_SYNC + body + FRAME_CRC.pack(binascii.crc_hqx(body, 0))
+
+class FrameDecoder:
+    """Incremental binary frame parser with CRC checks and sequence-gap detection"""
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped_frames = 0  # inferred from sequence gaps
+        self.resets = 0          # sequence restarted at 0 (board reset)
+        self.skipped_bytes = 0   # noise/text skipped while looking for a sync marker
+    
+    def feed(self, data):
+        """Add received bytes, returns [(seq, flags, values), ...] for complete valid frames"""
+        buf = self.buffer
+        buf += data
+        frames = []
+        pos = 0
+        end = len(buf)
+        
+        while True:
+            start = buf.find(FRAME_SYNC, pos)
+            if start < 0:
+                # A trailing 0xAA may be the first half of the next sync marker
+                keep = 1 if end > pos and buf[-1] == FRAME_SYNC[0] else 0
+                self.skipped_bytes += end - pos - keep
+                pos = end - keep
+                break
+            self.skipped_bytes += start - pos
+            if end - start < FRAME_SIZE:
+                pos = start  # wait for the rest of the frame
+                break
+            
+            body_at = start + len(FRAME_SYNC)
+            crc_at = body_at + FRAME_BODY.size
+            if binascii.crc_hqx(buf[body_at:crc_at], 0) != FRAME_CRC.unpack_from(buf, crc_at)[0]:
+                self.crc_errors += 1
+                pos = start + 1  # resync on the next marker
+                continue
+            
+            flags, seq, temperature, humidity, soil_moisture = FRAME_BODY.unpack_from(buf, body_at)
+            self._track(seq)
+            frames.append((seq, flags, {
+                "temperature": temperature / 10,
+                "humidity": humidity / 10,
+                "soil_moisture": float(soil_moisture)
+            }))
+            pos = start + FRAME_SIZE
+        
+        del buf[:pos]
+        return frames
+    
+    def _track(self, seq):
+        self.frames += 1
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq - 1) & 0xFFFF
+            if seq == 0 and gap:
+                self.resets += 1
+            elif gap < 0x8000:
+                self.dropped_frames += gap
+            # larger gaps are duplicates/reordering, not losses
+        self.last_seq = seq
+    
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "crc_errors": self.crc_errors,
+            "dropped_frames": self.dropped_frames,
+            "resets": self.resets,
+            "skipped_bytes": self.skipped_bytes
+        }
+
+class SerialDevice:
+    """One Arduino on one serial port: its readings, history and reader thread"""
+    
+    def __init__(self, device_id, port, plant_id=None, baud_rate=BAUD_RATE, simulate=True):
+        self.id = device_id
+        self.port = port
+        self.plant_id = plant_id
+        self.baud_rate = baud_rate
+        self.simulate_when_offline = simulate
+        self.serial = None
+        self.framing = "text"
+        self.decoder = FrameDecoder()
+        self.negotiate_until = None
+        self.bytes_since_frame = 0
+        self.framing_fallbacks = 0
+        self.snapshot = ReadingSnapshot(0, None, {
+            sensor_type: {"value": None, "timestamp": None, "status": "offline"}
+            for sensor_type in SENSOR_TYPES
+        })
+        self.history = {sensor_type: SensorHistory() for sensor_type in SENSOR_TYPES}
+        self.timeseries = (TimeSeriesStore(os.path.join(TIMESERIES_DIR, device_id), SENSOR_TYPES)
+                           if TIMESERIES_ENABLED else None)
+        self.lines_read = 0
+        self.readings = 0
+        self.read_errors = 0
+        self.timeseries_errors = 0
+        self.parse_failures = 0
+        self.sensor_updated_at = dict.fromkeys(SENSOR_TYPES)  # last real reading per sensor
+        self.responses = {}         # (route key, encoding) -> (version, serialized body)
+        self._changed = threading.Condition()  # serializes writers, wakes long-polls
+        self.last_reading_at = None
+        self.thread = None
+    
+    def connect(self):
+        """Initialize Arduino connection"""
+        try:
+            self.serial = serial.Serial(self.port, self.baud_rate, timeout=TIMEOUT)
+            time.sleep(2)  # Wait for Arduino to initialize
+            logger.info("✅ [%s] Arduino connected on %s", self.id, self.port)
+            self.negotiate()
+            return True
+        except Exception as e:
+            self.serial = None
+            mode = "running in simulation mode" if self.simulate_when_offline else "offline"
+            logger.warning("⚠️ [%s] Arduino not found on %s - %s: %s", self.id, self.port, mode, e)
+            return False
+    
+    def negotiate(self):
+        """Ask the board for binary frames; handle_line() switches over on its reply"""
+        if SERIAL_FRAMING != "text":
+            # Older sketches ignore this and keep sending text lines
+            self.serial.write(b"MODE BIN\n")
+            self.negotiate_until = time.time() + FRAMING_NEGOTIATE_TIMEOUT
+    
+    def start(self):
+        """Connect and read on a dedicated thread (connecting waits for the board reset)"""
+        self.thread = threading.Thread(target=self._run, name=f"serial-{self.id}", daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        self.connect()
+        self.read_forever()
+    
+    def read_forever(self):
+        """Continuously read data from Arduino"""
+        while True:
+            # Simulate data if no Arduino (for testing)
+            if self.serial is None:
+                if self.simulate_when_offline:
+                    self.simulate()
+                time.sleep(SIMULATION_INTERVAL)
+                continue
+            
+            try:
+                if self.framing == "binary":
+                    # Whatever is buffered, or block for the first byte of the next frame
+                    data = self.serial.read(self.serial.in_waiting or 1)
+                    if data:
+                        self.handle_bytes(data)
+                    continue
+                
+                # Blocks until a full line arrives (or the serial TIMEOUT expires),
+                # so readings are handled as soon as they are sent
+                line = self.serial.readline().decode('utf-8', errors='replace').strip()
+                if line:
+                    self.handle_line(line)
+                elif self.negotiate_until and time.time() > self.negotiate_until:
+                    self.negotiate_until = None
+                    logger.info("📝 [%s] No binary framing support, using text lines", self.id)
+            except Exception as e:
+                self.read_errors += 1
+                serial_logger.error("⚠️ [%s] Error reading serial: %s", self.id, e)
+                # Mark all sensors as offline on error
+                snapshot = self.update(time.time(), {
+                    sensor_type: dict(reading, status="error")
+                    for sensor_type, reading in self.snapshot.readings.items()
+                })
+                sensor_stream.publish(self.id, snapshot.to_dict())
+                time.sleep(1)  # don't spin on a broken port
+    
+    def handle_line(self, line):
+        """Parse one serial line and record its values"""
+        self.lines_read += 1
+        if line == "MODE BIN OK":
+            self.framing = "binary"
+            self.negotiate_until = None
+            self.bytes_since_frame = 0
+            logger.info("📦 [%s] Switched to binary framing", self.id)
+            return
+        serial_logger.debug("📊 [%s] Raw Arduino data: %s", self.id, line)
+        
+        parsed_data = parse_arduino_data(line)
+        if parsed_data:
+            self.record(parsed_data, "simulated" if "[SIMULATED]" in line else "online")
+        else:
+            self.parse_failures += 1
+    
+    def handle_bytes(self, data):
+        """Decode binary frames and record their values"""
+        dropped = self.decoder.dropped_frames
+        frames = self.decoder.feed(data)
+        for seq, flags, values in frames:
+            self.lines_read += 1
+            # Boards without a DHT22 flag their readings, like "[SIMULATED]" on text lines
+            self.record(values, "simulated" if flags & FRAME_FLAG_SIMULATED else "online")
+        if self.decoder.dropped_frames != dropped:
+            serial_logger.warning("⚠️ [%s] Sequence gap: %d frame(s) lost", self.id,
+                                  self.decoder.dropped_frames - dropped)
+        
+        self.bytes_since_frame = 0 if frames else self.bytes_since_frame + len(data)
+        if self.bytes_since_frame >= FRAMING_FALLBACK_BYTES:
+            # A reset board starts over in text mode: parse lines and ask again
+            logger.warning("📝 [%s] No valid frame in %d bytes (board reset?), back to text lines",
+                           self.id, self.bytes_since_frame)
+            self.framing = "text"
+            self.framing_fallbacks += 1
+            self.bytes_since_frame = 0
+            self.decoder.buffer.clear()
+            self.negotiate()
+    
+    def record(self, values, status):
+        """Store sensor values, append them to history and push the changes"""
+        now = time.time()
+        current_time = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        previous = self.snapshot.readings
+        snapshot = self.update(now, {
+            sensor_type: {"value": value, "timestamp": current_time, "status": status}
+            for sensor_type, value in values.items()
+            if sensor_type in previous
+        })
+        changes = {}
+        
+        for sensor_type, value in values.items():
+            if sensor_type in previous:
+                if previous[sensor_type]["value"] != value or previous[sensor_type]["status"] != status:
+                    changes[sensor_type] = snapshot.readings[sensor_type]
+                self.history[sensor_type].append(now, value)
+                if status == "online":
+                    self.sensor_updated_at[sensor_type] = now
+                    if sensor_type == 'temperature':
+                        serial_logger.info("🌡️ [%s] Temperature: %s°C", self.id, value)
+                    elif sensor_type == 'humidity':
+                        serial_logger.info("💧 [%s] Humidity: %s%%", self.id, value)
+                    elif sensor_type == 'soil_moisture':
+                        serial_logger.info("🌱 [%s] Soil Moisture: %s%%", self.id, value)
+        
+        # Only real readings go to the on-disk history
+        if self.timeseries is not None and status == "online":
+            try:
+                self.timeseries.append(now, values)
+            except Exception as e:
+                # A history-store failure must not stop live readings
+                self.timeseries_errors += 1
+                serial_logger.error("[%s] Time-series append failed: %s", self.id, e)
+        
+        self.readings += 1
+        self.last_reading_at = now
+        # Push only the values that changed to stream subscribers
+        sensor_stream.publish(self.id, changes)
+    
+    @property
+    def version(self):
+        return self.snapshot.seq
+    
+    @property
+    def latest_readings(self):
+        """Read-only view of the current readings"""
+        return self.snapshot.readings
+    
+    def update(self, taken_at, updates):
+        """Publish the next snapshot (some sensors replaced), returns it
+        
+        Writers (reader thread, /simulate) are serialized here; readers just
+        load self.snapshot once and never lock.
+        """
+        with self._changed:
+            snapshot = self.snapshot.replace(taken_at, updates)
+            self.snapshot = snapshot
+            self.responses = {}
+            self._changed.notify_all()
+        return snapshot
+    
+    def wait_for_change(self, since_version, timeout):
+        """Block until version > since_version or the timeout expires"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.snapshot.seq > since_version, timeout)
+    
+    def simulate(self):
+        """Simulate sensor data for testing without Arduino"""
+        import random
+        
+        # Simulate realistic sensor values
+        self.record({
+            "temperature": round(random.uniform(20, 30), 1),
+            "humidity": round(random.uniform(60, 80), 1),
+            "soil_moisture": round(random.uniform(40, 60), 1)
+        }, "simulated")
+    
+    def health(self):
+        """Per-device health summary"""
+        age = round(time.time() - self.last_reading_at, 1) if self.last_reading_at else None
+        if self.serial is not None:
+            status = "online" if age is not None and age < 30 else "stale"
+        else:
+            status = "simulated" if self.simulate_when_offline else "offline"
+        return {
+            "id": self.id,
+            "port": self.port,
+            "plant_id": self.plant_id,
+            "status": status,
+            "arduino_connected": self.serial is not None,
+            "framing": self.framing,
+            "frames": self.decoder.stats() if self.framing == "binary" else None,
+            "framing_fallbacks": self.framing_fallbacks,
+            "lines_read": self.lines_read,
+            "readings": self.readings,
+            "read_errors": self.read_errors,
+            "timeseries_errors": self.timeseries_errors,
+            "parse_failures": self.parse_failures,
+            "last_reading_age_seconds": age
+        }
+
+def discover_ports():
+    """Serial ports that look like Arduinos (by USB vendor id)"""
     try:
-        arduino = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=TIMEOUT)
-        time.sleep(2)  # Wait for Arduino to initialize
-        logger.info(f"✅ Arduino connected on {ARDUINO_PORT}")
-        return True
-    except Exception as e:
-        arduino = None
-        logger.warning(f"⚠️ Arduino not found on {ARDUINO_PORT} - running in simulation mode: {e}")
-        return False
+        from serial.tools import list_ports
+    except ImportError:
+        return []
+    return sorted(port.device for port in list_ports.comports() if port.vid in ARDUINO_USB_VIDS)
+
+def load_device_config():
+    """Device list from ARDUINO_DEVICES, DEVICES and (optionally) auto-discovery"""
+    configured = []
+    env_devices = os.environ.get("ARDUINO_DEVICES", "").strip()
+    if env_devices:
+        for entry in env_devices.split(","):
+            device_id, _, target = entry.strip().partition("=")
+            port, _, plant_id = target.partition("@")
+            configured.append({
+                "id": device_id,
+                "port": port,
+                "plant_id": int(plant_id) if plant_id else None
+            })
+    else:
+        configured = [dict(device) for device in DEVICES]
+    
+    if AUTO_DISCOVER:
+        known_ports = {device["port"] for device in configured}
+        for index, port in enumerate(discover_ports(), start=1):
+            if port not in known_ports:
+                configured.append({"id": f"device{index}", "port": port, "plant_id": None})
+    return configured
+
+# Global variables
+devices = {}  # device_id -> SerialDevice, in configuration order
+sensor_stream = SensorStream()
+metrics.gauge("arduino_stream_subscribers", "Live SSE subscribers").set_function(
+    lambda: sensor_stream.stats()["subscribers"])
+
+def add_device(device_id, port, plant_id=None, simulate=True):
+    """Register a serial device (call start() on it to begin reading)"""
+    device = SerialDevice(device_id, port, plant_id, simulate=simulate)
+    devices[device_id] = device
+    register_device_metrics(device)
+    return device
+
+def register_device_metrics(device):
+    """Expose a device's counters as metric series, read when scraped"""
+    serial_lines_total.labels(device.id).set_function(lambda: device.lines_read)
+    readings_total.labels(device.id).set_function(lambda: device.readings)
+    parse_failures_total.labels(device.id).set_function(lambda: device.parse_failures)
+    read_errors_total.labels(device.id).set_function(lambda: device.read_errors)
+    timeseries_errors_total.labels(device.id).set_function(lambda: device.timeseries_errors)
+    for kind in ("crc_errors", "dropped_frames", "resets", "skipped_bytes"):
+        frame_errors_total.labels(device.id, kind).set_function(
+            lambda kind=kind: getattr(device.decoder, kind))
+    for sensor_type in SENSOR_TYPES:
+        def age(sensor_type=sensor_type):
+            updated_at = device.sensor_updated_at[sensor_type]
+            return round(time.time() - updated_at, 3) if updated_at else None
+        reading_age_seconds.labels(device.id, sensor_type).set_function(age)
+
+def flush_timeseries():
+    """Periodically write dirty history pages to disk"""
+    while True:
+        time.sleep(TIMESERIES_FLUSH_INTERVAL)
+        for device in list(devices.values()):
+            if device.timeseries is not None:
+                try:
+                    device.timeseries.flush()
+                except Exception as e:
+                    logger.error("⚠️ [%s] History flush failed: %s", device.id, e)
+
+def default_device():
+    """The first configured device, served by the legacy un-namespaced routes"""
+    return next(iter(devices.values()), None)
 
 def parse_arduino_data(line):
     """
@@ -99,12 +1104,12 @@ def parse_arduino_data(line):
         
         # Add simulation status
         if data and is_simulated:
-            logger.info("📊 Using simulated sensor data (DHT22 not connected)")
+            serial_logger.info("📊 Using simulated sensor data (DHT22 not connected)")
         
         return data if data else None
             
     except Exception as e:
-        logger.error(f"Error parsing Arduino data '{line}': {e}")
+        serial_logger.error("Error parsing Arduino data '%s': %s", line, e)
     
     return None
 
@@ -112,113 +1117,260 @@ def map_value(value, in_min, in_max, out_min, out_max):
     """Map value from one range to another"""
     return (value - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
 
-def read_from_arduino():
-    """Continuously read data from Arduino"""
-    global latest_readings
-    
-    while True:
-        if arduino and arduino.in_waiting > 0:
-            try:
-                line = arduino.readline().decode('utf-8').strip()
-                if line:
-                    logger.info(f"📊 Raw Arduino data: {line}")
-                    
-                    parsed_data = parse_arduino_data(line)
-                    if parsed_data:
-                        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        
-                        for sensor_type, value in parsed_data.items():
-                            if sensor_type in latest_readings:
-                                latest_readings[sensor_type] = {
-                                    "value": value,
-                                    "timestamp": current_time,
-                                    "status": "online"
-                                }
-                                if sensor_type == 'temperature':
-                                    logger.info(f"🌡️ Temperature: {value}°C")
-                                elif sensor_type == 'humidity':
-                                    logger.info(f"💧 Humidity: {value}%")
-                                elif sensor_type == 'soil_moisture':
-                                    logger.info(f"🌱 Soil Moisture: {value}%")
-                        
-            except Exception as e:
-                logger.error(f"⚠️ Error reading serial: {e}")
-                # Mark all sensors as offline on error
-                for sensor_type in latest_readings:
-                    latest_readings[sensor_type]["status"] = "error"
-        
-        # Simulate data if no Arduino (for testing)
-        elif arduino is None:
-            simulate_sensor_data()
-        
-        time.sleep(1)
+def with_cors(response, status_code=200):
+    response.status_code = status_code
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
 
-def simulate_sensor_data():
-    """Simulate sensor data for testing without Arduino"""
-    import random
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Simulate realistic sensor values
-    simulated_data = {
-        "temperature": round(random.uniform(20, 30), 1),
-        "humidity": round(random.uniform(60, 80), 1),
-        "soil_moisture": round(random.uniform(40, 60), 1)
-    }
-    
-    for sensor_type, value in simulated_data.items():
-        latest_readings[sensor_type] = {
-            "value": value,
-            "timestamp": current_time,
-            "status": "simulated"
-        }
+def device_not_found(device_id):
+    return with_cors(jsonify({
+        "status": "error",
+        "message": f"Device '{device_id}' not found"
+    }), 404)
+
+@app.before_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count and time every request (long-polls included)"""
+    endpoint = request.endpoint or "unmatched"
+    requests_total.labels(endpoint, response.status_code).inc()
+    started = g.get("metrics_started")
+    if started is not None:
+        request_seconds.labels(endpoint).observe_since(started)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
+    device = default_device()
     return jsonify({
         "status": "healthy",
-        "arduino_connected": arduino is not None,
-        "port": ARDUINO_PORT,
-        "version": "1.0"
+        "arduino_connected": device is not None and device.serial is not None,
+        "port": device.port if device else None,
+        "version": "1.0",
+        "devices": {device_id: d.health() for device_id, d in devices.items()},
+        "stream": sensor_stream.stats()
     })
 
+@app.route("/devices", methods=["GET"])
+def list_devices():
+    """List serial devices with their plant mapping and health"""
+    return with_cors(jsonify({
+        "status": "success",
+        "devices": [device.health() for device in devices.values()]
+    }))
+
+@app.route("/devices/<device_id>/health", methods=["GET"])
+def device_health(device_id):
+    """Health of one device"""
+    device = devices.get(device_id)
+    if device is None:
+        return device_not_found(device_id)
+    return with_cors(jsonify({"status": "success", "device": device.health()}))
+
+def negotiate_encoding():
+    """msgpack if asked for (and installed), else gzip if accepted, else plain JSON"""
+    if msgpack is not None and "msgpack" in request.headers.get("Accept", ""):
+        return "msgpack"
+    if "gzip" in request.accept_encodings:
+        return "gzip"
+    return "identity"
+
+def reading_response(device, key, build_payload):
+    """Serve a reading payload with ETag/If-None-Match, ?since_version= long-poll
+    and a per-version cache of the encoded body"""
+    since_version = request.args.get("since_version", type=int)
+    if since_version is not None:
+        timeout = min(request.args.get("timeout", LONGPOLL_TIMEOUT, type=float), LONGPOLL_MAX_TIMEOUT)
+        device.wait_for_change(since_version, max(0.0, timeout))
+    
+    encoding = negotiate_encoding()
+    snapshot = device.snapshot  # one consistent reading set for this response
+    version = snapshot.seq
+    etag = f"{device.id}.{version}.{key}.{encoding}"
+    headers = {
+        "X-Data-Version": str(version),
+        "Vary": "Accept, Accept-Encoding",
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": "ETag, X-Data-Version"
+    }
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+    
+    cached = device.responses.get((key, encoding))
+    if cached is not None and cached[0] == version:
+        body = cached[1]
+    else:
+        payload = dict(build_payload(snapshot), version=version)
+        if encoding == "msgpack":
+            body = msgpack.packb(payload)
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            if encoding == "gzip":
+                body = gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else body
+        device.responses[(key, encoding)] = (version, body)
+    
+    if encoding == "gzip" and body[:2] == b"\x1f\x8b":
+        headers["Content-Encoding"] = "gzip"
+    response = Response(body, mimetype="application/msgpack" if encoding == "msgpack" else "application/json",
+                        headers=headers)
+    response.set_etag(etag)
+    return response
+
 @app.route("/data", methods=["GET"])
-def get_all_data():
+@app.route("/devices/<device_id>/data", methods=["GET"])
+def get_all_data(device_id=None):
     """Get all sensor readings"""
-    response = jsonify({
+    device = devices.get(device_id) if device_id else default_device()
+    if device is None:
+        return device_not_found(device_id)
+    return reading_response(device, "all", lambda snapshot: {
         "status": "success",
-        "data": latest_readings,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "device": device.id,
+        "plant_id": device.plant_id,
+        "data": snapshot.to_dict(),
+        # When this reading set changed, not the response time: the body is cached
+        # (and 304'd) until the next reading
+        "updated_at": (datetime.fromtimestamp(snapshot.taken_at).strftime("%Y-%m-%d %H:%M:%S")
+                       if snapshot.taken_at else None)
     })
-    response.headers.add("Access-Control-Allow-Origin", "*")
-    return response
 
 @app.route("/data/<sensor_type>", methods=["GET"])
-def get_sensor_data(sensor_type):
+@app.route("/devices/<device_id>/data/<sensor_type>", methods=["GET"])
+def get_sensor_data(sensor_type, device_id=None):
     """Get specific sensor reading"""
-    if sensor_type in latest_readings:
-        response = jsonify({
-            "status": "success",
-            "sensor_type": sensor_type,
-            "data": latest_readings[sensor_type]
-        })
-    else:
-        response = jsonify({
+    device = devices.get(device_id) if device_id else default_device()
+    if device is None:
+        return device_not_found(device_id)
+    if sensor_type not in device.latest_readings:
+        return with_cors(jsonify({
+            "status": "error",
+            "message": f"Sensor type '{sensor_type}' not found"
+        }), 404)
+    return reading_response(device, sensor_type, lambda snapshot: {
+        "status": "success",
+        "sensor_type": sensor_type,
+        "data": snapshot.readings[sensor_type]
+    })
+
+@app.route("/data/<sensor_type>/history", methods=["GET"])
+@app.route("/devices/<device_id>/data/<sensor_type>/history", methods=["GET"])
+def get_sensor_history(sensor_type, device_id=None):
+    """Get recent samples for one sensor (?since=<unix time>&limit=<n>)"""
+    device = devices.get(device_id) if device_id else default_device()
+    if device is None:
+        return device_not_found(device_id)
+    if sensor_type not in device.history:
+        return with_cors(jsonify({
             "status": "error",
             "message": f"Sensor type '{sensor_type}' not found"
-        }), 404
+        }), 404)
     
-    response.headers.add("Access-Control-Allow-Origin", "*")
-    return response
+    since = request.args.get("since", type=float)
+    limit = request.args.get("limit", type=int)
+    # Columnar lists straight from the ring buffer, no per-sample dicts
+    timestamps, values = device.history[sensor_type].since(since, limit)
+    return with_cors(jsonify({
+        "status": "success",
+        "sensor_type": sensor_type,
+        "count": len(values),
+        "timestamps": timestamps,
+        "values": values
+    }))
+
+@app.route("/history", methods=["GET"])
+@app.route("/devices/<device_id>/history", methods=["GET"])
+def get_history(device_id=None):
+    """Downsampled on-disk history (?sensor=&from=&to=&step=, unix seconds; ?device= on /history)"""
+    device_id = device_id or request.args.get("device")
+    device = devices.get(device_id) if device_id else default_device()
+    if device is None:
+        return device_not_found(device_id)
+    if device.timeseries is None:
+        return with_cors(jsonify({"status": "error", "message": "History storage is disabled"}), 404)
+    
+    sensor_type = request.args.get("sensor", "")
+    if sensor_type not in device.timeseries.raw:
+        return with_cors(jsonify({
+            "status": "error",
+            "message": f"Sensor type '{sensor_type}' not found"
+        }), 404)
+    
+    end = request.args.get("to", type=float) or time.time()
+    start = request.args.get("from", type=float)
+    if start is None:
+        start = end - 86400
+    if end <= start:
+        return with_cors(jsonify({"status": "error", "message": "'from' must be before 'to'"}), 400)
+    requested = request.args.get("step", type=int)
+    step = max(1, requested or math.ceil((end - start) / HISTORY_DEFAULT_POINTS),
+               math.ceil((end - start) / HISTORY_MAX_POINTS))
+    if step != requested:
+        # derived or raised: keep it on rollup boundaries so coarse levels are used
+        step = device.timeseries.align_step(step)
+    
+    series = device.timeseries.query(sensor_type, start, end, step)
+    return with_cors(jsonify(dict(series, **{
+        "status": "success",
+        "device": device.id,
+        "sensor": sensor_type,
+        "from": start,
+        "to": end
+    })))
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    """Live readings as Server-Sent Events on the main (tunnelled) port
+    
+    ?sensors= and ?device= filter like on the dedicated STREAM_PORT server.
+    """
+    subscriber = sensor_stream.subscribe(parse_stream_filter(request.args.getlist("sensors")),
+                                         parse_stream_filter(request.args.getlist("device")))
+    if subscriber is None:
+        # Capped so a few dashboards can't tie up the threads that serve /data
+        response = with_cors(jsonify({"status": "error", "message": "Too many stream subscribers"}), 503)
+        response.headers["Retry-After"] = str(STREAM_KEEPALIVE)
+        return response
+    
+    def generate():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                with subscriber.ready:
+                    if not subscriber.pending:
+                        subscriber.ready.wait(STREAM_KEEPALIVE)
+                    pending, subscriber.pending = subscriber.pending, {}
+                events = sensor_stream.format_events(pending, subscriber.sensors, subscriber.devices)
+                yield events or b": keep-alive\n\n"
+        finally:
+            sensor_stream.unsubscribe(subscriber)
+    
+    return with_cors(Response(generate(), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}))
 
 @app.route("/simulate", methods=["POST"])
 def simulate_data():
-    """Manually trigger data simulation (for testing)"""
-    simulate_sensor_data()
+    """Manually trigger data simulation (for testing), ?device= picks the device"""
+    device_id = request.args.get("device")
+    device = devices.get(device_id) if device_id else default_device()
+    if device is None:
+        return device_not_found(device_id)
+    device.simulate()
     return jsonify({
         "status": "success",
         "message": "Simulation data generated",
-        "data": latest_readings
+        "data": device.snapshot.to_dict()
     })
 
 if __name__ == "__main__":
@@ -226,14 +1378,25 @@ if __name__ == "__main__":
     print("Arduino Bridge Service - IoT Farm Monitoring")
     print("=" * 60)
     
-    # Try to connect to Arduino
-    arduino_connected = connect_arduino()
+    # Register every configured (or discovered) device
+    for config in load_device_config():
+        add_device(config["id"], config["port"], config.get("plant_id"))
     
-    # Start background thread for reading data
-    threading.Thread(target=read_from_arduino, daemon=True).start()
+    # Start the live push stream, history flusher, then one reader thread per device
+    sensor_stream.start()
+    if TIMESERIES_ENABLED:
+        threading.Thread(target=flush_timeseries, name="history-flush", daemon=True).start()
+    for device in devices.values():
+        device.start()
     
     print(f"🚀 Service starting on http://127.0.0.1:5001")
-    print(f"📡 Arduino Status: {'Connected' if arduino_connected else 'Simulation Mode'}")
+    for device in devices.values():
+        plant = f"PlantID {device.plant_id}" if device.plant_id else "active plant"
+        print(f"📡 Device {device.id}: {device.port} → {plant} (/devices/{device.id}/data)")
+    print("📺 Live stream (SSE): http://127.0.0.1:5001/stream")
+    if STREAM_PORT:
+        print(f"📺 Dedicated stream server: http://{STREAM_HOST}:{STREAM_PORT}/stream "
+              f"(expose this port too for remote use)")
     print("=" * 60)
     
     app.run(host="127.0.0.1", port=5001, debug=False)
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+On-Bridge Aggregation Benchmark
+Feeds a simulated day of raw samples through plant_sensor_bridge.RollupAggregator
+and compares upload volume and analytics scan size against uploading raw points.
+
+Usage:
+    python benchmarks/aggregation_bench.py [--sample-interval 10] [--days 1]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import plant_sensor_bridge
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure rollup upload volume and aggregation cost")
+    parser.add_argument("--sample-interval", type=int, default=plant_sensor_bridge.RAW_SAMPLE_INTERVAL,
+                        help="Seconds between raw samples")
+    parser.add_argument("--days", type=float, default=1.0, help="Simulated time span")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    rng = random.Random(1)
+    aggregator = plant_sensor_bridge.RollupAggregator()
+    samples = int(args.days * 86400 / args.sample_interval)
+    start = 1_700_000_000
+    
+    rollups = []
+    began = time.perf_counter()
+    for i in range(samples):
+        ts = start + i * args.sample_interval
+        rollups.extend(aggregator.add(ts, {
+            "temperature": round(25 + 5 * math.sin(ts / 43200 * math.pi) + rng.uniform(-0.3, 0.3), 1),
+            "humidity": round(rng.uniform(60, 80), 1),
+            "soil_moisture": float(rng.randint(40, 60))
+        }))
+    elapsed = time.perf_counter() - began
+    
+    per_window = {}
+    for rollup in rollups:
+        per_window[rollup["window"]] = per_window.get(rollup["window"], 0) + 1
+    batches_raw = math.ceil(samples / plant_sensor_bridge.UPLOAD_BATCH_SIZE)
+    batches_rollup = math.ceil(len(rollups) / plant_sensor_bridge.UPLOAD_BATCH_SIZE)
+    results = {
+        "raw_samples": samples,
+        "uploaded_rollups": len(rollups),
+        "rollups_per_window": per_window,
+        "upload_reduction": round(samples / len(rollups), 1) if rollups else None,
+        "upload_batches_raw": batches_raw,
+        "upload_batches_rollup": batches_rollup,
+        # rows read to chart the period hourly: raw SensorReadings vs 1 h SensorRollups
+        "hourly_chart_rows_raw": samples,
+        "hourly_chart_rows_rollup": per_window.get(3600, 0),
+        "aggregate_us_per_sample": round(1e6 * elapsed / samples, 3)
+    }
+    for key, value in results.items():
+        print(f"{key:>26}: {value}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
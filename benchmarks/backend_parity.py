@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+YOLO Backend Parity & Latency Check
+Runs the same sample images through the PyTorch and ONNX backends of
+yolo_detect2.py, checks that both return the same pests/bbox output and
+compares per-image latency.
+
+Usage:
+    python yolo_detect2.py --export-onnx [--int8]
+    python benchmarks/backend_parity.py <image_dir> [--onnx best.int8.onnx] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image
+
+import yolo_detect2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def box_iou(a, b):
+    """IoU of two [x1, y1, x2, y2] boxes"""
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(reference, candidate, min_iou, max_conf_diff):
+    """Greedily pair same-class boxes, returns (matched, reference_count, candidate_count)"""
+    unmatched = list(candidate)
+    matched = 0
+    for class_id, confidence, xyxy in sorted(reference, key=lambda d: -d[1]):
+        best, best_iou = None, min_iou
+        for other in unmatched:
+            if other[0] != class_id or abs(other[1] - confidence) > max_conf_diff:
+                continue
+            iou = box_iou(xyxy, other[2])
+            if iou >= best_iou:
+                best, best_iou = other, iou
+        if best is not None:
+            unmatched.remove(best)
+            matched += 1
+    return matched, len(reference), len(candidate)
+
+
+def time_backend(backend, images, runs):
+    """Per-image latency in milliseconds over several runs"""
+    backend.predict(images[:1])  # warm-up
+    latencies = []
+    for _ in range(runs):
+        for image in images:
+            started = time.perf_counter()
+            backend.predict([image])
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare YOLO backends for output parity and latency")
+    parser.add_argument("image_dir", help="Directory of sample images")
+    parser.add_argument("--pt", default=yolo_detect2.PT_MODEL_PATH, help="PyTorch weights")
+    parser.add_argument("--onnx", default=yolo_detect2.ONNX_MODEL_PATH, help="ONNX model (FP32 or INT8)")
+    parser.add_argument("--runs", type=int, default=3, help="Timed passes over the images")
+    parser.add_argument("--min-iou", type=float, default=0.9, help="IoU for two boxes to count as equal")
+    parser.add_argument("--max-conf-diff", type=float, default=0.05, help="Allowed confidence difference")
+    parser.add_argument("--min-parity", type=float, default=0.95, help="Required matched-box ratio")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.image_dir, name) for name in os.listdir(args.image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        print(f"ERROR: No images found in {args.image_dir}", file=sys.stderr)
+        return 2
+    images = [Image.open(path).convert("RGB") for path in paths]
+
+    pytorch = yolo_detect2.create_backend("pytorch", args.pt)
+    onnx = yolo_detect2.create_backend("onnx", args.onnx)
+    if dict(pytorch.names) != dict(onnx.names):
+        print("ERROR: Backends disagree on class names", file=sys.stderr)
+        return 1
+
+    matched = reference_total = candidate_total = 0
+    per_image = []
+    for path, image in zip(paths, images):
+        reference = pytorch.predict([image])[0]
+        candidate = onnx.predict([image])[0]
+        m, r, c = match_detections(reference, candidate, args.min_iou, args.max_conf_diff)
+        matched, reference_total, candidate_total = matched + m, reference_total + r, candidate_total + c
+        per_image.append({"image": os.path.basename(path), "pytorch": r, "onnx": c, "matched": m})
+
+    # Parity counts boxes missing on either side
+    expected = max(reference_total, candidate_total)
+    parity = matched / expected if expected else 1.0
+
+    report = {
+        "images": len(images),
+        "onnx_model": args.onnx,
+        "parity": round(parity, 4),
+        "boxes": {"pytorch": reference_total, "onnx": candidate_total, "matched": matched},
+        "per_image": per_image,
+        "latency": {
+            "pytorch": summarize(time_backend(pytorch, images, args.runs)),
+            "onnx": summarize(time_backend(onnx, images, args.runs))
+        }
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if parity < args.min_parity:
+        print(f"✗ Parity {parity:.1%} below required {args.min_parity:.0%}", file=sys.stderr)
+        return 1
+    print(f"✓ Parity {parity:.1%} ({matched}/{expected} boxes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
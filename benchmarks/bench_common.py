@@ -0,0 +1,71 @@
+"""
+Shared helpers for the benchmark scripts: latency percentiles, peak RSS,
+free ports and result files with enough metadata to compare runs.
+"""
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean/max of a list of numbers (nearest-rank)"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+    
+    return {
+        "count": len(ordered),
+        "p50": round(rank(50), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "max": round(ordered[-1], 3)
+    }
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+    except ImportError:  # Windows
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_metadata():
+    """Where and on what code a result was produced"""
+    repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def save_results(path, benchmark, config, results):
+    """Write one benchmark's results as JSON"""
+    with open(path, "w") as f:
+        json.dump({"benchmark": benchmark, "meta": run_metadata(), "config": config,
+                   "results": results}, f, indent=2)
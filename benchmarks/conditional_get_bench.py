@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Bridge Polling Cost Benchmark
+Measures per-request CPU time and bytes on the wire for dashboard-style polls
+of arduino_bridge.py /data: fresh serialization, cached body, gzip, msgpack
+and 304 Not Modified via If-None-Match (Flask test client, no network).
+
+Usage:
+    python benchmarks/conditional_get_bench.py [--requests 5000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("ARDUINO_TIMESERIES", "0")
+
+import arduino_bridge
+
+
+def run(client, device, count, headers=None, fresh=False):
+    """Average microseconds and response bytes per request"""
+    sent = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        if fresh:
+            device.update(time.time(), {})  # a new snapshot before every poll: nothing cached
+        response = client.get("/data", headers=headers or {})
+        sent += len(response.data)
+    elapsed = time.perf_counter() - start
+    return {"us_per_request": round(1e6 * elapsed / count, 1), "bytes_per_request": round(sent / count, 1),
+            "status": response.status_code}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /data polling cost per response mode")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per mode")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    arduino_bridge.logger.setLevel("WARNING")
+    device = arduino_bridge.add_device("bench", "bench-port")
+    device.record({"temperature": 24.5, "humidity": 65.2, "soil_moisture": 45.0}, "online")
+    client = arduino_bridge.app.test_client()
+    
+    modes = [
+        ("fresh JSON (new reading each poll)", lambda: {}, True),
+        ("cached JSON", lambda: {}, False),
+        ("cached gzip", lambda: {"Accept-Encoding": "gzip"}, False),
+        ("304 Not Modified", lambda: {"If-None-Match": client.get("/data").headers["ETag"]}, False)
+    ]
+    if arduino_bridge.msgpack is not None:
+        modes.insert(3, ("cached msgpack", lambda: {"Accept": "application/msgpack"}, False))
+    
+    results = {}
+    for name, headers, fresh in modes:
+        results[name] = run(client, device, args.requests, headers(), fresh)
+        print(f"{name:>36}: {results[name]['us_per_request']} us/request, "
+              f"{results[name]['bytes_per_request']} bytes (HTTP {results[name]['status']})")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+/detect Load Generator
+Fires concurrent uploads at yolo_detect2.py and reports images/sec, latency
+percentiles and peak RSS. By default the service runs in-process with a mock
+backend that sleeps for a fixed inference time, so the HTTP, decode, cache and
+batching paths can be measured without weights or a GPU.
+
+Usage:
+    python benchmarks/detect_load.py [--clients 8] [--duration 10] [--infer-ms 40] [--mode thread]
+    python benchmarks/detect_load.py --url http://127.0.0.1:5000 --images <dir>   # real service
+"""
+
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+from PIL import Image
+
+from bench_common import free_port, peak_rss_kb, percentiles, save_results
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class MockBackend:
+    """Stands in for a YOLO backend: fixed cost per call plus per image"""
+    
+    name = "mock"
+    
+    @staticmethod
+    def import_dependencies():
+        pass
+    
+    def __init__(self, model_path=None, threads=None, infer_ms=None, per_image_ms=None):
+        self.names = {0: "aphid", 1: "whitefly"}
+        # Spawned workers construct their own mock: costs come through the environment
+        self.infer_ms = infer_ms if infer_ms is not None else float(os.environ.get("MOCK_INFER_MS", "40"))
+        self.per_image_ms = (per_image_ms if per_image_ms is not None
+                             else float(os.environ.get("MOCK_PER_IMAGE_MS", "5")))
+        self.calls = 0
+    
+    def predict(self, images):
+        self.calls += 1
+        time.sleep((self.infer_ms + self.per_image_ms * len(images)) / 1000)
+        return [[(0, 0.9, [10.0, 10.0, 100.0, 100.0])] for _ in images]
+
+
+def synthetic_images(count, size, seed=0):
+    """Distinct noisy JPEGs (distinct bytes, so the exact cache never hits)"""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.effect_noise(size, rng.uniform(20, 80)).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+    return images
+
+
+def start_service(args):
+    """Import yolo_detect2 with the mock backend and serve it on a free port"""
+    if not args.cache:
+        os.environ["YOLO_CACHE_MODE"] = "off"
+    os.environ["YOLO_SERVING_MODE"] = args.mode
+    os.environ["YOLO_BATCH_MAX_SIZE"] = str(args.batch_size)
+    os.environ["YOLO_BACKEND"] = MockBackend.name
+    os.environ["MOCK_INFER_MS"] = str(args.infer_ms)
+    os.environ["MOCK_PER_IMAGE_MS"] = str(args.per_image_ms)
+    # Results are still written to a detection history, just not the real one
+    os.environ["YOLO_HISTORY_DB"] = os.path.join(tempfile.mkdtemp(prefix="detect-load-"), "history.db")
+    import yolo_detect2
+    from werkzeug.serving import make_server
+    
+    # Per-request access logging would dominate the measurement
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    
+    yolo_detect2.BACKENDS[MockBackend.name] = MockBackend
+    yolo_detect2.MODEL_BACKEND = MockBackend.name
+    yolo_detect2.model = MockBackend(infer_ms=args.infer_ms, per_image_ms=args.per_image_ms)
+    yolo_detect2.startup["state"] = "ready"
+    if args.mode == "process":
+        # Workers are spawned: they re-run this module (see the bottom) to get the mock
+        yolo_detect2.worker_pool = yolo_detect2.WorkerPool()
+        yolo_detect2.worker_pool.start()
+    else:
+        yolo_detect2.batcher.start()
+    
+    port = free_port()
+    server = make_server("127.0.0.1", port, yolo_detect2.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="detect-server", daemon=True).start()
+    return yolo_detect2, server, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=2).json().get("status") == "healthy":
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def client(url, images, params, stop, latencies, errors, lock, offset):
+    """One keep-alive client posting images back to back until stopped"""
+    session = requests.Session()
+    index = offset
+    while not stop.is_set():
+        data = images[index % len(images)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{url}/detect", params=params,
+                                    files={"image": ("frame.jpg", data, "image/jpeg")}, timeout=60)
+            ok = response.status_code == 200 and "pests" in response.json()
+        except (requests.RequestException, ValueError):
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            if ok:
+                latencies.append((time.perf_counter(), elapsed_ms))
+            else:
+                errors.append(elapsed_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for /detect")
+    parser.add_argument("--url", help="Target a running service instead of the in-process mock")
+    parser.add_argument("--images", help="Directory of JPEG/PNG images (default: synthetic)")
+    parser.add_argument("--image-count", type=int, default=32, help="Synthetic images to generate")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1280, 720), metavar=("W", "H"))
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds first")
+    parser.add_argument("--annotate", action="store_true", help="Request annotated images")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread",
+                        help="In-process serving mode (YOLO_SERVING_MODE)")
+    parser.add_argument("--batch-size", type=int, default=8, help="YOLO_BATCH_MAX_SIZE")
+    parser.add_argument("--infer-ms", type=float, default=40.0, help="Mock cost per model call")
+    parser.add_argument("--per-image-ms", type=float, default=5.0, help="Mock cost per image")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    images = load_images(args.images) if args.images else \
+        synthetic_images(args.image_count, tuple(args.image_size))
+    if not images:
+        print("No images to send")
+        return 1
+    
+    service = server = None
+    url = args.url
+    if url is None:
+        service, server, url = start_service(args)
+    if not wait_ready(url):
+        print(f"Service at {url} never reported a loaded model")
+        return 1
+    
+    params = {"annotate": "1" if args.annotate else "0"}
+    stop = threading.Event()
+    latencies, errors, lock = [], [], threading.Lock()
+    threads = [threading.Thread(target=client, daemon=True,
+                                args=(url, images, params, stop, latencies, errors, lock, i * 7))
+               for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    
+    time.sleep(args.warmup)
+    measure_start = time.perf_counter()
+    with lock:
+        errors_before = len(errors)
+    time.sleep(args.duration)
+    measure_end = time.perf_counter()
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=65)
+    
+    measured = [ms for finished, ms in latencies if measure_start <= finished <= measure_end]
+    elapsed = measure_end - measure_start
+    results = {
+        "images_per_second": round(len(measured) / elapsed, 2),
+        "requests": len(measured),
+        "errors": len(errors) - errors_before,
+        "latency_ms": percentiles(measured),
+        "peak_rss_kb": peak_rss_kb()
+    }
+    if service is not None:
+        results["engine"] = service.get_engine().stats()
+        results["model_calls"] = service.model.calls if args.mode == "thread" else None
+        server.shutdown()
+    
+    latency = results["latency_ms"]
+    print(f"{args.clients} client(s), {elapsed:.1f}s: {results['images_per_second']} images/s, "
+          f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms, "
+          f"{results['errors']} error(s), peak RSS {results['peak_rss_kb']} KiB")
+    
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, "detect_load", config, results)
+    return 0 if results["requests"] else 1
+
+
+if __name__ == "__mp_main__":
+    # Inside a spawned inference worker: register the mock it will instantiate
+    import yolo_detect2
+    yolo_detect2.BACKENDS[MockBackend.name] = MockBackend
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Fake Arduino on a pseudo-terminal
+Writes the same serial lines as src/main.cpp to the master side of a pty so
+arduino_bridge.py can open the slave side (/dev/pts/N) like a real port.
+Answers "MODE BIN" with binary frames like the sketch does. POSIX only.
+
+Usage:
+    python benchmarks/fake_arduino.py [--interval 3] [--text-only]   # prints the port to use
+"""
+
+import argparse
+import os
+import random
+import select
+import struct
+import binascii
+import threading
+import time
+import tty
+
+FRAME_BODY = struct.Struct("<BHhHB")
+
+
+def reading_line(temperature, humidity, soil_moisture):
+    """One reading in the exact format printed by src/main.cpp"""
+    return f"Temp: {temperature:.1f} °C | Humidity: {humidity:.1f} % | Soil Moisture: {soil_moisture} %\r\n"
+
+
+def reading_frame(seq, temperature, humidity, soil_moisture):
+    """One reading as the sketch's binary frame (see sendFrame() in src/main.cpp)"""
+    body = FRAME_BODY.pack(0, seq & 0xFFFF, round(temperature * 10), round(humidity * 10), soil_moisture)
+    return b"\xaa\x55" + body + struct.pack("<H", binascii.crc_hqx(body, 0))
+
+
+class FakeArduino:
+    """Emits readings on a pty at a fixed interval from a background thread"""
+    
+    def __init__(self, interval=3.0, seed=None, binary_capable=True):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)  # binary frames must pass through untouched
+        self.port = os.ttyname(self.slave_fd)
+        self.interval = interval
+        self.binary_capable = binary_capable
+        self.binary = False
+        self.seq = 0
+        self.lines_written = 0
+        self._random = random.Random(seed)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def write_line(self, line=None):
+        """Write one reading (random values unless a line is given)"""
+        values = (self._random.uniform(20, 30), self._random.uniform(60, 80), self._random.randint(30, 70))
+        if line is not None:
+            data = line.encode("utf-8")
+        elif self.binary:
+            data = reading_frame(self.seq, *values)
+            self.seq += 1
+        else:
+            data = reading_line(*values).encode("utf-8")
+        os.write(self.master_fd, data)
+        self.lines_written += 1
+    
+    def _handle_commands(self):
+        """Answer MODE BIN / MODE TEXT like handleSerialCommands() in the sketch"""
+        while select.select([self.master_fd], [], [], 0)[0]:
+            try:
+                command = os.read(self.master_fd, 64)
+            except OSError:
+                return
+            if not self.binary_capable:
+                continue
+            if b"MODE BIN" in command:
+                os.write(self.master_fd, b"MODE BIN OK\r\n")
+                self.binary = True
+                self.seq = 0
+            elif b"MODE TEXT" in command:
+                self.binary = False
+                os.write(self.master_fd, b"MODE TEXT OK\r\n")
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+    
+    def _run(self):
+        # Banner like the real sketch prints on reset
+        os.write(self.master_fd, b"Soil Moisture, DHT22 Sensor Test\r\n")
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self._handle_commands()
+            self.write_line()
+            next_tick += self.interval
+            self._stop.wait(max(0.0, next_tick - time.monotonic()))
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate an Arduino sensor board on a pty")
+    parser.add_argument("--interval", type=float, default=3.0, help="Seconds between readings")
+    parser.add_argument("--text-only", action="store_true", help="Ignore MODE BIN like older sketches")
+    args = parser.parse_args()
+    
+    fake = FakeArduino(args.interval, binary_capable=not args.text_only).start()
+    print(f"Fake Arduino on {fake.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
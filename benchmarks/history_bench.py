@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Detection History Benchmark
+Fills yolo_detect2's SQLite detection history with synthetic results (a few
+pests each, spread over a year) and measures, at rising table sizes, the
+cost of an append on the request thread, the writer's sustained rate, and
+the latency of the /history queries: a time-range page, a class page, a
+class + confidence page and the daily counts.
+
+Usage:
+    python benchmarks/history_bench.py [--records 300000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_common import peak_rss_kb, percentiles, save_results
+
+CLASSES = ("aphid", "whitefly", "thrips", "spider_mite", "caterpillar", "mealybug")
+YEAR = 365 * 86400
+FILL_BATCH = 5000
+
+
+def synthetic_entry(rng, now, index):
+    """One writer entry as DetectionHistory.record() would queue it"""
+    pests = []
+    for _ in range(rng.choice((0, 0, 1, 1, 2, 3))):
+        x, y = rng.uniform(0, 560), rng.uniform(0, 400)
+        pests.append({
+            "type": rng.choice(CLASSES),
+            "confidence": round(rng.uniform(25, 99), 1),
+            "bbox": {"x1": x, "y1": y, "x2": x + 80, "y2": y + 80}
+        })
+    return (now - rng.uniform(0, YEAR), "bench", f"uploads/captures/{index}.jpg", None,
+            (640, 480), {"temperature": "25.0", "humidity": "60.0"}, pests, None)
+
+
+def measure_appends(history, count):
+    """Per-call cost of record() and the time until the writer has committed them"""
+    latencies = []
+    pests = [{"type": "aphid", "confidence": 91.5, "bbox": {"x1": 1, "y1": 2, "x2": 3, "y2": 4}}]
+    started = time.perf_counter()
+    for _ in range(count):
+        before = time.perf_counter()
+        history.record(pests, "bench", "frame.jpg", None, (640, 480), {"temperature": "25.0"})
+        latencies.append((time.perf_counter() - before) * 1e6)
+    history.flush()
+    elapsed = time.perf_counter() - started
+    return percentiles(latencies), round(count / elapsed, 1)
+
+
+def measure_queries(history, rng, now, count):
+    day = 86400
+    queries = {
+        "time_range_page": lambda start: history.query(start, start + 7 * day, limit=100),
+        "class_page": lambda start: history.query(start, start + 30 * day, rng.choice(CLASSES), limit=100),
+        "class_confidence_page": lambda start: history.query(
+            start, start + 30 * day, rng.choice(CLASSES), min_confidence=90, limit=100),
+        "confidence_page": lambda start: history.query(start, start + 30 * day, min_confidence=95, limit=100),
+        "daily_year": lambda start: history.daily_counts(),
+        "daily_class_month": lambda start: history.daily_counts(
+            time.strftime("%Y-%m-%d", time.localtime(start)),
+            time.strftime("%Y-%m-%d", time.localtime(start + 30 * day)), rng.choice(CLASSES)),
+    }
+    results = {}
+    for name, query in queries.items():
+        latencies = []
+        for _ in range(count):
+            start = now - rng.uniform(30 * day, YEAR)
+            before = time.perf_counter()
+            query(start)
+            latencies.append((time.perf_counter() - before) * 1000)
+        results[name] = percentiles(latencies)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=300000, help="Final number of stored detections")
+    parser.add_argument("--steps", type=int, default=3, help="Table sizes measured on the way up")
+    parser.add_argument("--appends", type=int, default=5000, help="record() calls timed per step")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per kind and step")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="history-bench-")
+    os.environ["YOLO_HISTORY_DB"] = os.path.join(workdir, "history.db")
+    import yolo_detect2
+    history = yolo_detect2.history
+    rng = random.Random(0)
+    now = time.time()
+    
+    steps = []
+    stored = 0
+    db = history._connect()
+    for step in range(1, args.steps + 1):
+        target = args.records * step // args.steps
+        fill_started = time.perf_counter()
+        while stored < target:
+            size = min(FILL_BATCH, target - stored)
+            history._insert(db, [synthetic_entry(rng, now, stored + i) for i in range(size)])
+            stored += size
+        fill_seconds = time.perf_counter() - fill_started
+        
+        append_us, writer_rate = measure_appends(history, args.appends)
+        stored += args.appends
+        queries = measure_queries(history, rng, now, args.queries)
+        steps.append({"records": stored, "append_us": append_us,
+                      "writer_records_per_second": writer_rate, "query_ms": queries})
+        print(f"{stored:>8} records: append p50 {append_us['p50']:.1f} us / p99 {append_us['p99']:.1f} us, "
+              f"writer {writer_rate:,.0f}/s (bulk fill {fill_seconds:.1f}s)")
+        for name, latency in queries.items():
+            print(f"{'':18}{name:22} p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms")
+    db.close()
+    
+    if args.output:
+        save_results(args.output, "history", vars(args), {
+            "steps": steps,
+            "database_bytes": os.path.getsize(os.environ["YOLO_HISTORY_DB"]),
+            "peak_rss_kb": peak_rss_kb()
+        })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Serial Hot-Path Logging Benchmark
+Feeds text lines through SerialDevice.handle_line() with INFO logging on and
+a deliberately slow log sink (like a Windows console or a network share),
+comparing a synchronous StreamHandler with the queued listener from
+service_logging.py, with and without rate limiting.
+
+Usage:
+    python benchmarks/logging_bench.py [--lines 2000] [--sink-ms 0.2]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ["ARDUINO_TIMESERIES"] = "0"
+import arduino_bridge
+import service_logging
+from bench_common import percentiles, save_results
+from fake_arduino import reading_line
+
+
+class SlowSink:
+    """Text stream that takes a fixed time per write"""
+    
+    def __init__(self, delay_ms):
+        self.delay = delay_ms / 1000
+        self.writes = 0
+    
+    def write(self, text):
+        self.writes += 1
+        time.sleep(self.delay)
+        return len(text)
+    
+    def flush(self):
+        pass
+
+
+def configure(mode, sink):
+    """Point the root logger at the sink for one mode, returns the listener (or None)"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        return None
+    os.environ["BENCH_LOG_RATE_LIMIT"] = "5/60" if mode == "async_ratelimit" else "0"
+    _, listener = service_logging.setup_logging("BENCH", stream=sink)
+    return listener
+
+
+def run(mode, lines, sink_ms):
+    sink = SlowSink(sink_ms)
+    listener = configure(mode, sink)
+    device = arduino_bridge.SerialDevice(f"bench-{mode}", "/dev/null", simulate=False)
+    latencies = []
+    
+    started = time.perf_counter()
+    for line in lines:
+        before = time.perf_counter()
+        device.handle_line(line)
+        latencies.append((time.perf_counter() - before) * 1000)
+    elapsed = time.perf_counter() - started
+    
+    # Time for the listener to write out what is still queued
+    drain_started = time.perf_counter()
+    if listener is not None:
+        listener.stop()
+    drain = time.perf_counter() - drain_started
+    return {
+        "lines_per_second": round(len(lines) / elapsed, 1),
+        "handle_line_ms": percentiles(latencies),
+        "records_written": sink.writes,
+        "drain_seconds": round(drain, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging cost on the serial read path")
+    parser.add_argument("--lines", type=int, default=2000, help="Serial lines per mode")
+    parser.add_argument("--sink-ms", type=float, default=0.2, help="Time the log sink takes per write")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    lines = [reading_line(20 + i % 100 / 10, 60 + i % 200 / 10, 30 + i % 40).strip()
+             for i in range(args.lines)]
+    results = {}
+    for mode in ("sync", "async", "async_ratelimit"):
+        results[mode] = row = run(mode, lines, args.sink_ms)
+        latency = row["handle_line_ms"]
+        print(f"{mode:16} {row['lines_per_second']:>10} lines/s  p50 {latency['p50']} ms  "
+              f"p99 {latency['p99']} ms  max {latency['max']} ms  "
+              f"{row['records_written']} record(s) written, drain {row['drain_seconds']}s")
+    
+    logging.getLogger().handlers.clear()
+    if args.output:
+        save_results(args.output, "logging", vars(args), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Multi-Device Bridge Overhead
+Adds pseudo-tty fake Arduinos to one arduino_bridge.py process in steps and
+measures resident memory, CPU and threads per extra device.
+
+Usage:
+    python benchmarks/multi_device_bench.py [--steps 1,2,4,8,16] [--interval 0.1] [--window 5]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import arduino_bridge
+from fake_arduino import FakeArduino
+
+
+def rss_kb():
+    """Current resident set size in KiB (Linux), falls back to peak RSS"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(window):
+    """CPU seconds used and lines read across all devices during the window"""
+    lines_before = sum(d.lines_read for d in arduino_bridge.devices.values())
+    cpu_before = time.process_time()
+    time.sleep(window)
+    cpu = time.process_time() - cpu_before
+    lines = sum(d.lines_read for d in arduino_bridge.devices.values()) - lines_before
+    return cpu, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-device overhead of arduino_bridge.py")
+    parser.add_argument("--steps", default="1,2,4,8,16", help="Device counts to measure")
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between readings per device")
+    parser.add_argument("--window", type=float, default=5.0, help="Measurement window per step (s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    # Per-line INFO logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    arduino_bridge.logger.setLevel(logging.WARNING)
+    
+    steps = sorted(int(n) for n in args.steps.split(","))
+    fakes = []
+    results = []
+    baseline_rss = rss_kb()
+    baseline_threads = threading.active_count()
+    
+    for count in steps:
+        while len(fakes) < count:
+            fake = FakeArduino(args.interval, seed=len(fakes)).start()
+            fakes.append(fake)
+            arduino_bridge.add_device(f"bench{len(fakes)}", fake.port, plant_id=len(fakes)).start()
+        time.sleep(2.5)  # connect() waits for the board reset
+        
+        cpu, lines = measure(args.window)
+        row = {
+            "devices": count,
+            "rss_kb": rss_kb(),
+            "rss_per_device_kb": round((rss_kb() - baseline_rss) / count, 1),
+            # each fake board has its own writer thread; count only the bridge's
+            "bridge_threads": threading.active_count() - baseline_threads - count,
+            "cpu_percent": round(100 * cpu / args.window, 2),
+            "cpu_ms_per_line": round(1000 * cpu / lines, 3) if lines else None,
+            "lines_per_second": round(lines / args.window, 1)
+        }
+        results.append(row)
+        print(f"{count:4d} device(s): RSS {row['rss_kb']} KiB ({row['rss_per_device_kb']} KiB/device), "
+              f"CPU {row['cpu_percent']}%, {row['cpu_ms_per_line']} ms/line, "
+              f"{row['lines_per_second']} lines/s, {row['bridge_threads']} bridge thread(s)")
+    
+    for fake in fakes:
+        fake.stop()
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"interval": args.interval, "window": args.window, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite Runner
+Runs the /detect load test, the end-to-end sensor pipeline, the logging
+hot-path benchmark, video stream detection and the detection history store,
+each in its own process (so peak RSS is per service), and merges their
+results into one timestamped JSON file. Compare two runs to see what a change did.
+
+Usage:
+    python benchmarks/run_suite.py [--quick] [--only detect,sensor]
+    python benchmarks/run_suite.py --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import run_metadata
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# name -> (script, full arguments, --quick arguments)
+SUITE = {
+    "detect_thread": ("detect_load.py", ["--mode", "thread", "--duration", "20"],
+                      ["--mode", "thread", "--duration", "5"]),
+    "detect_process": ("detect_load.py", ["--mode", "process", "--duration", "20"],
+                       ["--mode", "process", "--duration", "5"]),
+    "sensor_binary": ("sensor_pipeline.py", ["--rate", "50", "--duration", "30"],
+                      ["--rate", "50", "--duration", "8"]),
+    "sensor_text": ("sensor_pipeline.py", ["--rate", "50", "--duration", "30", "--framing", "text"],
+                    ["--rate", "50", "--duration", "8", "--framing", "text"]),
+    "logging": ("logging_bench.py", ["--lines", "5000"], ["--lines", "1000"]),
+    "video": ("video_bench.py", [], ["--frames", "120", "--fps", "30,120"]),
+    "history": ("history_bench.py", [], ["--records", "30000", "--queries", "50"]),
+}
+
+# Metrics where a smaller number is an improvement
+LOWER_IS_BETTER = ("latency", "lag", "rss", "errors", "cpu", "_ms")
+
+
+def run_benchmark(name, quick):
+    script, full, quick_args = SUITE[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, f"{name}.json")
+        command = [sys.executable, os.path.join(BENCH_DIR, script),
+                   *(quick_args if quick else full), "--output", output]
+        print(f"▶ {name}: {' '.join(command[1:])}")
+        completed = subprocess.run(command, cwd=BENCH_DIR)
+        if not os.path.exists(output):
+            return {"error": f"exit code {completed.returncode}, no results"}
+        with open(output) as f:
+            result = json.load(f)
+    result.pop("meta", None)
+    result["exit_code"] = completed.returncode
+    return result
+
+
+def flatten(value, prefix=""):
+    """Numeric leaves of a nested result as {"a.b.c": number}"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit')} {old['meta'].get('timestamp')}")
+    print(f"new: {new['meta'].get('commit')} {new['meta'].get('timestamp')}")
+    
+    for name in sorted(set(old["benchmarks"]) & set(new["benchmarks"])):
+        before = flatten(old["benchmarks"][name].get("results", {}))
+        after = flatten(new["benchmarks"][name].get("results", {}))
+        print(f"\n{name}")
+        for metric in sorted(set(before) | set(after)):
+            a, b = before.get(metric), after.get(metric)
+            if a is None or b is None:
+                print(f"  {metric:40} {a!s:>12} → {b!s:>12}")
+                continue
+            change = ""
+            if a:
+                delta = 100 * (b - a) / abs(a)
+                lower_better = any(word in metric for word in LOWER_IS_BETTER)
+                better = delta < 0 if lower_better else delta > 0
+                marker = "" if abs(delta) < 1 else (" ✓" if better else " ✗")
+                change = f"{delta:+7.1f}%{marker}"
+            print(f"  {metric:40} {a!s:>12} → {b!s:>12}  {change}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare runs")
+    parser.add_argument("--quick", action="store_true", help="Short runs (smoke test)")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(SUITE)}")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two result files")
+    args = parser.parse_args()
+    
+    if args.compare:
+        return compare(*args.compare)
+    
+    names = args.only.split(",") if args.only else list(SUITE)
+    unknown = [name for name in names if name not in SUITE]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        return 2
+    
+    merged = {"meta": run_metadata(), "benchmarks": {}}
+    for name in names:
+        merged["benchmarks"][name] = run_benchmark(name, args.quick)
+    
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(merged, f, indent=2)
+    print(f"\nResults: {output}")
+    
+    failed = [name for name, result in merged["benchmarks"].items() if result.get("exit_code", 1)]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+End-to-End Sensor Pipeline
+Chains a pty fake Arduino → arduino_bridge.py → plant_sensor_bridge.py →
+stub PHP sync API in one process and measures serial lines parsed per second
+and the sensor-to-upload lag: every fake reading carries a unique
+temperature/humidity tag, so each uploaded reading is matched to the moment
+the board emitted it. POSIX only (pty).
+
+Usage:
+    python benchmarks/sensor_pipeline.py [--rate 20] [--duration 20] [--framing auto|text]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_common import free_port, peak_rss_kb, percentiles, save_results
+from fake_arduino import FakeArduino, reading_frame, reading_line
+from stub_php import INTERVAL_PATH, SYNC_PATH, StubPhpServer
+
+TAG_SOIL_MOISTURE = 50  # inside the stub plant's range: no threshold transitions
+
+
+class TaggedArduino(FakeArduino):
+    """Fake board whose readings encode a sequence number (0.1 °C / 0.1 % steps)"""
+    
+    def __init__(self, interval, binary_capable=True):
+        super().__init__(interval, binary_capable=binary_capable)
+        self.emitted = {}  # (temperature, humidity) -> emit time
+        self._tag = 0
+    
+    def write_line(self, line=None):
+        if line is not None:
+            return super().write_line(line)
+        tag = self._tag % 20000
+        self._tag += 1
+        temperature = round(20 + (tag % 100) / 10, 1)
+        humidity = round(60 + (tag // 100) / 10, 1)
+        if self.binary:
+            data = reading_frame(self.seq, temperature, humidity, TAG_SOIL_MOISTURE)
+            self.seq += 1
+        else:
+            data = reading_line(temperature, humidity, TAG_SOIL_MOISTURE).encode("utf-8")
+        self.emitted[(temperature, humidity)] = time.time()
+        os.write(self.master_fd, data)
+        self.lines_written += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the serial → bridge → upload pipeline")
+    parser.add_argument("--rate", type=float, default=20.0, help="Fake Arduino readings per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument("--framing", choices=("auto", "text"), default="auto",
+                        help="ARDUINO_FRAMING for the bridge (auto negotiates binary frames)")
+    parser.add_argument("--php-delay-ms", type=float, default=0, help="Stub PHP latency per POST")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="sensor-pipeline-")
+    # Upload every sample (no rollups) and keep the bridge's history off disk
+    os.environ["SENSOR_AGGREGATION"] = "0"
+    os.environ["ARDUINO_TIMESERIES"] = "0"
+    os.environ["ARDUINO_FRAMING"] = args.framing
+    import arduino_bridge
+    import plant_sensor_bridge
+    from werkzeug.serving import make_server
+    
+    # Per-reading INFO logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    for logger in (arduino_bridge.logger, plant_sensor_bridge.logger, logging.getLogger("werkzeug")):
+        logger.setLevel(logging.WARNING)
+    
+    stub = StubPhpServer(interval=1, delay_ms=args.php_delay_ms).start()
+    plant_sensor_bridge.PLANT_API_URL = stub.url + SYNC_PATH
+    plant_sensor_bridge.SENSOR_INTERVAL_API = stub.url + INTERVAL_PATH
+    
+    fake = TaggedArduino(1 / args.rate).start()
+    device = arduino_bridge.add_device("bench", fake.port, simulate=False)
+    device.start()
+    port = free_port()
+    server = make_server("127.0.0.1", port, arduino_bridge.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bridge-server", daemon=True).start()
+    time.sleep(2.5)  # connect() waits for the board reset
+    
+    bridge = plant_sensor_bridge.PlantSensorBridge(
+        "bench", bridge_url=f"http://127.0.0.1:{port}", device_id="bench",
+        spool_path=os.path.join(workdir, "spool.db"))
+    bridge.uploader.url = stub.url + SYNC_PATH
+    threading.Thread(target=plant_sensor_bridge.run_bridges, args=([bridge],),
+                     name="plant-bridge", daemon=True).start()
+    time.sleep(2)  # first config fetch and upload
+    
+    lines_before, readings_before = device.lines_read, device.readings
+    received_before = len(stub.received)
+    cpu_before = time.process_time()
+    started = time.time()
+    time.sleep(args.duration)
+    elapsed = time.time() - started
+    cpu = time.process_time() - cpu_before
+    lines = device.lines_read - lines_before
+    readings = device.readings - readings_before
+    read_errors = device.read_errors
+    
+    bridge.running = False
+    arduino_bridge.logger.setLevel(logging.CRITICAL)  # the reader sees the pty close
+    fake.stop()
+    server.shutdown()
+    stub.stop()
+    
+    lags = []
+    for arrived, reading in stub.received[received_before:]:
+        key = (round(reading.get("temperature", 0), 1), round(reading.get("humidity", 0), 1))
+        emitted = fake.emitted.get(key)
+        if emitted is not None and emitted <= arrived:
+            lags.append((arrived - emitted) * 1000)
+    
+    results = {
+        "lines_per_second": round(lines / elapsed, 1),
+        "readings_per_second": round(readings / elapsed, 1),
+        "lines_written": fake.lines_written,
+        "framing": device.framing,
+        "read_errors": read_errors,
+        "uploads": len(stub.received) - received_before,
+        "posts": stub.posts,
+        "sensor_to_upload_ms": percentiles(lags),
+        "cpu_percent": round(100 * cpu / elapsed, 2),
+        "peak_rss_kb": peak_rss_kb()
+    }
+    lag = results["sensor_to_upload_ms"]
+    print(f"{args.rate:g} readings/s ({results['framing']}): {results['lines_per_second']} lines/s parsed, "
+          f"{results['uploads']} upload(s), lag p50 {lag.get('p50')} ms / p95 {lag.get('p95')} ms / "
+          f"p99 {lag.get('p99')} ms, CPU {results['cpu_percent']}%, peak RSS {results['peak_rss_kb']} KiB")
+    
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, "sensor_pipeline", config, results)
+    return 0 if lags else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Serial Parser Benchmark
+Compares the per-reading cost of the text line parser with the binary frame
+decoder in arduino_bridge.py, and checks that injected frame loss and
+corruption are detected through sequence gaps and CRC errors.
+
+Usage:
+    python benchmarks/serial_parse_bench.py [--readings 100000] [--chunk 64]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import arduino_bridge
+from fake_arduino import reading_line
+
+SERIAL_BITS_PER_BYTE = 10  # 8N1
+
+
+def sample_values(count, seed=1):
+    rng = random.Random(seed)
+    return [(round(rng.uniform(20, 30), 1), round(rng.uniform(60, 80), 1), rng.randint(30, 70))
+            for _ in range(count)]
+
+
+def bench_text(values):
+    """Decode + strip + parse_arduino_data, as SerialDevice does per line"""
+    lines = [reading_line(*v).encode("utf-8") for v in values]
+    start = time.perf_counter()
+    for raw in lines:
+        arduino_bridge.parse_arduino_data(raw.decode("utf-8", errors="replace").strip())
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(len(raw) for raw in lines) / len(lines)
+
+
+def bench_binary(values, chunk):
+    """FrameDecoder.feed over the byte stream in serial-read-sized chunks"""
+    stream = b"".join(arduino_bridge.encode_frame(i, *v) for i, v in enumerate(values))
+    decoder = arduino_bridge.FrameDecoder()
+    start = time.perf_counter()
+    decoded = 0
+    for offset in range(0, len(stream), chunk):
+        decoded += len(decoder.feed(stream[offset:offset + chunk]))
+    elapsed = time.perf_counter() - start
+    assert decoded == len(values), f"decoded {decoded} of {len(values)} frames"
+    return elapsed, arduino_bridge.FRAME_SIZE
+
+
+def check_detection(values, drop_every, corrupt_every, chunk):
+    """Drop and corrupt frames, then compare what the decoder reports"""
+    stream = bytearray()
+    dropped = corrupted = 0
+    for i, v in enumerate(values):
+        frame = bytearray(arduino_bridge.encode_frame(i, *v))
+        if i % drop_every == drop_every - 1 and i < len(values) - 1:
+            dropped += 1
+            continue
+        if i % corrupt_every == 1:
+            frame[6] ^= 0x04  # flip a bit in the temperature field
+            corrupted += 1
+        stream += frame
+    
+    decoder = arduino_bridge.FrameDecoder()
+    for offset in range(0, len(stream), chunk):
+        decoder.feed(bytes(stream[offset:offset + chunk]))
+    stats = decoder.stats()
+    return {
+        "injected_dropped": dropped,
+        "injected_corrupted": corrupted,
+        "detected_crc_errors": stats["crc_errors"],
+        # a corrupt frame is discarded, so it also shows up as a sequence gap
+        "detected_lost": stats["dropped_frames"],
+        "all_detected": stats["crc_errors"] == corrupted and stats["dropped_frames"] == dropped + corrupted
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text vs binary serial parsing")
+    parser.add_argument("--readings", type=int, default=100000, help="Readings per parser")
+    parser.add_argument("--chunk", type=int, default=64, help="Bytes per simulated serial read")
+    parser.add_argument("--baud", type=int, default=arduino_bridge.BAUD_RATE, help="Link speed for the throughput cap")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    # parse_arduino_data logs simulated lines; keep logging out of the timing
+    arduino_bridge.logger.setLevel(logging.WARNING)
+    values = sample_values(args.readings)
+    
+    results = {}
+    for name, (elapsed, bytes_per_reading) in (
+            ("text", bench_text(values)),
+            ("binary", bench_binary(values, args.chunk))):
+        results[name] = {
+            "us_per_reading": round(1e6 * elapsed / len(values), 3),
+            "bytes_per_reading": round(bytes_per_reading, 1),
+            "max_readings_per_second_at_baud": round(args.baud / SERIAL_BITS_PER_BYTE / bytes_per_reading, 1)
+        }
+        print(f"{name:>6}: {results[name]['us_per_reading']} us/reading, "
+              f"{results[name]['bytes_per_reading']} bytes/reading, "
+              f"max {results[name]['max_readings_per_second_at_baud']} readings/s at {args.baud} baud")
+    print(f"speedup: {results['text']['us_per_reading'] / results['binary']['us_per_reading']:.1f}x")
+    
+    results["detection"] = check_detection(values[:10000], drop_every=50, corrupt_every=97, chunk=args.chunk)
+    print(f"detection: {results['detection']}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if results["detection"]["all_detected"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Reading-State Contention Benchmark
+One writer thread publishes reading sets as fast as it can while N reader
+threads serialize the current state, comparing:
+  in-place  - the old shared dict mutated sensor by sensor
+  locked    - the same dict behind a threading.Lock
+  snapshot  - arduino_bridge.ReadingSnapshot published by reference swap
+Reports reads/s, writes/s and torn reads (sensors from different writes).
+
+Usage:
+    python benchmarks/snapshot_contention_bench.py [--readers 1,4,16] [--duration 2]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("ARDUINO_TIMESERIES", "0")
+
+import arduino_bridge
+
+SENSORS = arduino_bridge.SENSOR_TYPES
+
+
+def reading(seq):
+    return {"value": float(seq % 100), "timestamp": seq, "status": "online"}
+
+
+class InPlaceState:
+    def __init__(self):
+        self.data = {sensor: reading(0) for sensor in SENSORS}
+    
+    def write(self, seq):
+        for sensor in SENSORS:
+            self.data[sensor] = reading(seq)
+    
+    def read(self):
+        return json.dumps(self.data)
+
+
+class LockedState(InPlaceState):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+    
+    def write(self, seq):
+        with self.lock:
+            super().write(seq)
+    
+    def read(self):
+        with self.lock:
+            return json.dumps(self.data)
+
+
+class SnapshotState:
+    def __init__(self):
+        self.device = arduino_bridge.SerialDevice("bench", "bench-port")
+    
+    def write(self, seq):
+        self.device.update(seq, {sensor: reading(seq) for sensor in SENSORS})
+    
+    def read(self):
+        return json.dumps(self.device.snapshot.to_dict())
+
+
+def run(state, readers, duration):
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "torn": 0}
+    lock = threading.Lock()
+    
+    def writer():
+        seq = 0
+        while not stop.is_set():
+            seq += 1
+            state.write(seq)
+        counts["writes"] = seq
+    
+    def reader():
+        reads = torn = 0
+        while not stop.is_set():
+            data = json.loads(state.read())
+            if len({data[sensor]["timestamp"] for sensor in SENSORS}) != 1:
+                torn += 1
+            reads += 1
+        with lock:
+            counts["reads"] += reads
+            counts["torn"] += torn
+    
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "reads_per_second": round(counts["reads"] / duration),
+        "writes_per_second": round(counts["writes"] / duration),
+        "torn_reads": counts["torn"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reading-state publication strategies under contention")
+    parser.add_argument("--readers", default="1,4,16", help="Reader thread counts")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    sys.setswitchinterval(1e-5)  # switch threads often so races actually show up
+    results = []
+    for readers in (int(n) for n in args.readers.split(",")):
+        for name, factory in (("in-place", InPlaceState), ("locked", LockedState), ("snapshot", SnapshotState)):
+            row = dict(run(factory(), readers, args.duration), strategy=name, readers=readers)
+            results.append(row)
+            print(f"{readers:3d} reader(s) {name:>9}: {row['reads_per_second']:>8} reads/s, "
+                  f"{row['writes_per_second']:>8} writes/s, {row['torn_reads']} torn")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Stub PHP Sync Endpoint
+Stands in for api/plant_sensor_sync.php and api/get_sensor_interval.php so
+plant_sensor_bridge.py can be benchmarked without a web server or MySQL.
+Records when each uploaded reading arrives to measure upload lag.
+
+Usage:
+    python benchmarks/stub_php.py [--port 8089] [--interval 1] [--delay-ms 0]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYNC_PATH = "/api/plant_sensor_sync.php"
+INTERVAL_PATH = "/api/get_sensor_interval.php"
+
+ACTIVE_PLANT = {
+    "id": 1,
+    "name": "Tomato",
+    "local_name": "Kamatis",
+    "thresholds": {
+        "soil_moisture": {"min": 40, "max": 70},
+        "temperature": {"min": 18, "max": 30},
+        "humidity": {"min": 60, "max": 80}
+    },
+    "warning_trigger": 3
+}
+
+
+class StubPhpServer:
+    """Threaded HTTP server answering like the PHP sync API, recording uploads"""
+    
+    def __init__(self, port=0, interval=1, delay_ms=0, fail_every=0):
+        self.interval = interval
+        self.delay = delay_ms / 1000
+        self.fail_every = fail_every  # answer every Nth POST with HTTP 500 (0 = never)
+        self.received = []            # (arrival time, reading dict)
+        self.posts = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real host
+            
+            def log_message(self, *args):
+                pass
+            
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == INTERVAL_PATH:
+                    self._reply(200, {"success": True, "interval_seconds": stub.interval,
+                                      "display": f"{stub.interval} seconds"})
+                elif path == SYNC_PATH:
+                    self._reply(200, {"success": True, "active_plant": ACTIVE_PLANT})
+                else:
+                    self._reply(404, {"success": False, "message": "Not found"})
+            
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                arrived = time.time()
+                if self.path.split("?")[0] != SYNC_PATH:
+                    self._reply(404, {"success": False, "message": "Not found"})
+                    return
+                with stub._lock:
+                    stub.posts += 1
+                    stub.bytes_received += length
+                    fail = stub.fail_every and stub.posts % stub.fail_every == 0
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if fail:
+                    self._reply(500, {"success": False, "message": "Injected failure"})
+                    return
+                
+                data = json.loads(body or b"{}")
+                readings = data.get("readings", [data])
+                with stub._lock:
+                    stub.received.extend((arrived, reading) for reading in readings)
+                results = [{"success": True, "key": reading.get("key")} for reading in readings]
+                self._reply(200, {"success": True, "processed": len(readings), "received": len(readings),
+                                  "results": results, "violations": [], "warning_level": 0,
+                                  "notification_triggered": False})
+        
+        return Handler
+    
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-php", daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def lags(self):
+        """Seconds between each reading's recorded_at and its arrival"""
+        with self._lock:
+            return [arrived - reading["recorded_at"] for arrived, reading in self.received
+                    if "recorded_at" in reading]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub for the PHP plant sensor sync API")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--interval", type=int, default=1, help="interval_seconds to hand out")
+    parser.add_argument("--delay-ms", type=float, default=0, help="Artificial latency per POST")
+    parser.add_argument("--fail-every", type=int, default=0, help="Fail every Nth POST with HTTP 500")
+    args = parser.parse_args()
+    
+    stub = StubPhpServer(args.port, args.interval, args.delay_ms, args.fail_every).start()
+    print(f"Stub PHP API on {stub.url}{SYNC_PATH} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{stub.posts} POST(s), {len(stub.received)} reading(s)")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Sensor History Range Query Benchmark
+Bulk-loads N days of 1 s samples for one sensor into arduino_bridge's
+memory-mapped TimeSeriesStore (raw + rollup levels) and times /history-style
+range queries at several spans and steps.
+
+Usage:
+    python benchmarks/timeseries_bench.py [--days 365] [--dir /tmp/ts_bench] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+import arduino_bridge
+
+SENSOR = "temperature"
+
+
+def bulk_load(path, days, start):
+    """Write raw and rollup column files directly (vectorized), as if recorded live"""
+    ts = start + np.arange(int(days * 86400), dtype=np.float64)
+    values = (25 + 5 * np.sin(ts / 43200 * np.pi) + np.random.default_rng(1).normal(0, 0.3, len(ts))).astype(np.float32)
+    
+    def write(directory, columns):
+        os.makedirs(directory, exist_ok=True)
+        for name, column in columns.items():
+            column.tofile(os.path.join(directory, f"{name}.bin"))
+    
+    base = os.path.join(path, SENSOR)
+    write(os.path.join(base, "raw"), {"ts": ts, "value": values})
+    for level in arduino_bridge.TIMESERIES_LEVELS:
+        bucket = (ts - ts % level)
+        starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+        write(os.path.join(base, f"{level}s"), {
+            "ts": bucket[starts],
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+            "sum": np.add.reduceat(values.astype(np.float64), starts),
+            "count": np.diff(np.append(starts, len(ts))).astype(np.uint32)
+        })
+    return len(ts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time range queries over the on-disk sensor history")
+    parser.add_argument("--days", type=float, default=365, help="Days of 1 s data to load")
+    parser.add_argument("--dir", help="Store directory (default: a temporary directory)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    path = args.dir or tempfile.mkdtemp(prefix="ts_bench_")
+    start = 1_700_000_000.0
+    began = time.perf_counter()
+    rows = bulk_load(path, args.days, start)
+    print(f"Loaded {rows:,} samples in {time.perf_counter() - began:.1f}s into {path}")
+    
+    began = time.perf_counter()
+    store = arduino_bridge.TimeSeriesStore(path, [SENSOR])
+    print(f"Opened store in {1000 * (time.perf_counter() - began):.1f} ms")
+    end = start + rows
+    
+    queries = [
+        ("last hour, raw", end - 3600, end, 1),
+        ("last day, 1 min", end - 86400, end, 60),
+        ("last week, 15 min", end - 7 * 86400, end, 900),
+        ("full span, 1 h", start, end, 3600),
+        ("full span, 1 day", start, end, 86400),
+        ("full span, auto (max points)", start, end,
+         store.align_step(int(np.ceil((end - start) / arduino_bridge.HISTORY_MAX_POINTS))))
+    ]
+    results = []
+    for name, t_from, t_to, step in queries:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            series = store.query(SENSOR, t_from, t_to, step)
+            timings.append(1000 * (time.perf_counter() - t0))
+        row = {
+            "query": name,
+            "step": step,
+            "level": series["level"],
+            "points": len(series["timestamps"]),
+            "p50_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3)
+        }
+        results.append(row)
+        print(f"{name:>30}: {row['points']:>6} points from {row['level']} level, "
+              f"p50 {row['p50_ms']} ms, max {row['max_ms']} ms")
+    
+    if not args.dir:
+        shutil.rmtree(path, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"days": args.days, "samples": rows, "queries": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
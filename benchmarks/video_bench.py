@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Video Stream Detection Benchmark
+Writes a synthetic MJPEG video (static scene, a moving object one third of
+the time) and plays it through yolo_detect2.VideoStream at rising frame
+rates with a mock model, to find the highest source frame rate each
+frame-skip / motion setting keeps up with: the model is not saturated and
+still runs on every k-th frame. Frames that arrive while the model is busy
+are dropped by design and reported for information.
+
+Usage:
+    python benchmarks/video_bench.py [--infer-ms 80] [--frames 300] [--fps 15,30,60,120,240]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cv2
+import numpy as np
+
+from bench_common import peak_rss_kb, save_results
+from detect_load import MockBackend
+
+# (label, frame_skip, motion_threshold)
+SETTINGS = [
+    ("every frame", 1, 0.0),
+    ("every 5th", 5, 0.0),
+    ("every 15th", 15, 0.0),
+    ("motion only", 0, 0.02),
+    ("every 30th + motion", 30, 0.02),
+]
+MAX_UTILIZATION = 0.9  # model busy fraction above which a rate counts as saturated
+ON_SCHEDULE = 0.9      # inferred frames needed, as a fraction of frames / k
+
+
+def write_video(path, frames, fps, size=(640, 480), seed=0):
+    """Static textured scene; a dark blob crosses it during one second out of three"""
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8), (9, 9), 0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    moving_frames = 0
+    for index in range(frames):
+        frame = background.copy()
+        if (index // 30) % 3 == 0:
+            x = (index * 12) % (size[0] - 120)
+            cv2.rectangle(frame, (x, 180), (x + 120, 300), (20, 20, 20), -1)
+            moving_frames += 1
+        writer.write(frame)
+    writer.release()
+    return moving_frames
+
+
+def play(yolo_detect2, path, frame_skip, motion, infer_ms):
+    stream = yolo_detect2.VideoStream("bench", path, frame_skip=frame_skip,
+                                      motion_threshold=motion, realtime=True)
+    started = time.perf_counter()
+    stream.start()
+    while stream.running():
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stats = stream.stats()
+    stats["elapsed_seconds"] = round(elapsed, 2)
+    stats["drop_ratio"] = round(stats["frames_dropped"] / max(1, stats["frames_decoded"]), 3)
+    stats["model_utilization"] = round(stats["frames_inferred"] * infer_ms / 1000 / elapsed, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame rates VideoStream handles per skip/motion setting")
+    parser.add_argument("--infer-ms", type=float, default=80.0, help="Mock model cost per frame")
+    parser.add_argument("--frames", type=int, default=300, help="Frames per test video")
+    parser.add_argument("--fps", default="15,30,60,120,240", help="Source frame rates to try")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    os.environ["YOLO_CACHE_MODE"] = "off"
+    import yolo_detect2
+    yolo_detect2.model = MockBackend(infer_ms=args.infer_ms, per_image_ms=0)
+    yolo_detect2.startup["state"] = "ready"
+    yolo_detect2.batcher.start()
+    
+    rates = sorted(float(fps) for fps in args.fps.split(","))
+    workdir = tempfile.mkdtemp(prefix="video-bench-")
+    videos = {}
+    for fps in rates:
+        videos[fps] = os.path.join(workdir, f"scene_{fps:g}fps.avi")
+        write_video(videos[fps], args.frames, fps)
+    
+    results = []
+    for label, frame_skip, motion in SETTINGS:
+        handled = None
+        runs = []
+        for fps in rates:
+            stats = play(yolo_detect2, videos[fps], frame_skip, motion, args.infer_ms)
+            runs.append({"fps": fps, "frames_inferred": stats["frames_inferred"],
+                         "frames_dropped": stats["frames_dropped"], "drop_ratio": stats["drop_ratio"],
+                         "motion_triggers": stats["motion_triggers"],
+                         "model_utilization": stats["model_utilization"]})
+            on_schedule = not frame_skip or stats["frames_inferred"] >= ON_SCHEDULE * args.frames / frame_skip
+            if stats["model_utilization"] > MAX_UTILIZATION or not on_schedule:
+                break  # higher rates only fall further behind
+            handled = fps
+        results.append({"setting": label, "frame_skip": frame_skip, "motion_threshold": motion,
+                        "max_fps_without_drops": handled, "runs": runs})
+        last = runs[-1]
+        print(f"{label:22} keeps up to {handled if handled is not None else '<' + str(rates[0])} fps "
+              f"(at {last['fps']:g} fps: {last['frames_inferred']} inferred, "
+              f"model {last['model_utilization']:.0%} busy, {last['frames_dropped']} dropped, "
+              f"{last['motion_triggers']} motion trigger(s))")
+    
+    if args.output:
+        save_results(args.output, "video", vars(args), {"settings": results, "peak_rss_kb": peak_rss_kb()})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,7 @@ if (!isset($_SESSION['user_id']) || !isset($_SESSION['username'])) {
 }
 
 require_once 'config/database.php';
+require_once 'includes/plant-monitor-logic.php';
 
 $currentUser = [
     'id' => $_SESSION['user_id'],
@@ -32,41 +33,35 @@ function getSensorAnalytics($startDate, $endDate)
     try {
         $pdo = getDatabaseConnection();
         
-        // Get average sensor readings for the period from sensorreadings table
-        // Returns data for temperature, humidity, and soil_moisture
+        // Get average sensor readings for the period from sensorreadings, with the
+        // windows covered by bridge rollups read from sensorrollups instead
+        list($samples, $params) = PlantMonitor::sensorSamples($pdo, $startDate . ' 00:00:00', $endDate . ' 23:59:59');
         $stmt = $pdo->prepare("
             SELECT 
                 'temperature' as sensor_type,
-                AVG(Temperature) as avg_value,
-                MIN(Temperature) as min_value,
-                MAX(Temperature) as max_value,
-                COUNT(*) as reading_count
-            FROM sensorreadings
-            WHERE ReadingTime BETWEEN ? AND ?
+                SUM(TempMean * SampleCount) / SUM(SampleCount) as avg_value,
+                MIN(TempMin) as min_value,
+                MAX(TempMax) as max_value,
+                COALESCE(SUM(SampleCount), 0) as reading_count
+            FROM {$samples} temperature_samples
             UNION ALL
             SELECT 
                 'humidity' as sensor_type,
-                AVG(Humidity) as avg_value,
-                MIN(Humidity) as min_value,
-                MAX(Humidity) as max_value,
-                COUNT(*) as reading_count
-            FROM sensorreadings
-            WHERE ReadingTime BETWEEN ? AND ?
+                SUM(HumidityMean * SampleCount) / SUM(SampleCount) as avg_value,
+                MIN(HumidityMin) as min_value,
+                MAX(HumidityMax) as max_value,
+                COALESCE(SUM(SampleCount), 0) as reading_count
+            FROM {$samples} humidity_samples
             UNION ALL
             SELECT 
                 'soil_moisture' as sensor_type,
-                AVG(SoilMoisture) as avg_value,
-                MIN(SoilMoisture) as min_value,
-                MAX(SoilMoisture) as max_value,
-                COUNT(*) as reading_count
-            FROM sensorreadings
-            WHERE ReadingTime BETWEEN ? AND ?
+                SUM(SoilMean * SampleCount) / SUM(SampleCount) as avg_value,
+                MIN(SoilMin) as min_value,
+                MAX(SoilMax) as max_value,
+                COALESCE(SUM(SampleCount), 0) as reading_count
+            FROM {$samples} soil_samples
         ");
-        $stmt->execute([
-            $startDate . ' 00:00:00', $endDate . ' 23:59:59',
-            $startDate . ' 00:00:00', $endDate . ' 23:59:59',
-            $startDate . ' 00:00:00', $endDate . ' 23:59:59'
-        ]);
+        $stmt->execute(array_merge($params, $params, $params));
         
         return $stmt->fetchAll(PDO::FETCH_ASSOC);
     } catch (Exception $e) {
@@ -83,25 +78,25 @@ function getSensorTrendData($startDate, $endDate, $sensorType)
     try {
         $pdo = getDatabaseConnection();
         
-        // Map sensor type to column name in sensorreadings table
+        // Map sensor type to its mean column in PlantMonitor::sensorSamples()
         $columnMap = [
-            'temperature' => 'Temperature',
-            'humidity' => 'Humidity',
-            'soil_moisture' => 'SoilMoisture'
+            'temperature' => 'TempMean',
+            'humidity' => 'HumidityMean',
+            'soil_moisture' => 'SoilMean'
         ];
         
-        $column = $columnMap[$sensorType] ?? 'Temperature';
+        $column = $columnMap[$sensorType] ?? 'TempMean';
         
+        list($samples, $params) = PlantMonitor::sensorSamples($pdo, $startDate . ' 00:00:00', $endDate . ' 23:59:59');
         $stmt = $pdo->prepare("
             SELECT 
-                DATE(ReadingTime) as date,
-                AVG({$column}) as avg_value
-            FROM sensorreadings
-            WHERE ReadingTime BETWEEN ? AND ?
-            GROUP BY DATE(ReadingTime)
+                DATE(SampleTime) as date,
+                SUM({$column} * SampleCount) / SUM(SampleCount) as avg_value
+            FROM {$samples} samples
+            GROUP BY DATE(SampleTime)
             ORDER BY date ASC
         ");
-        $stmt->execute([$startDate . ' 00:00:00', $endDate . ' 23:59:59']);
+        $stmt->execute($params);
         
         return $stmt->fetchAll(PDO::FETCH_ASSOC);
     } catch (Exception $e) {
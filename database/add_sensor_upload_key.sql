@@ -0,0 +1,13 @@
+-- ============================================================================
+-- Sensor Reading Upload Keys
+-- plant_sensor_bridge.py tags every spooled reading with a key; a batch that
+-- is replayed after a timeout is stored once (NULL keys are never duplicates)
+-- ============================================================================
+
+USE farm_database;
+
+ALTER TABLE `SensorReadings`
+  ADD COLUMN `UploadKey` VARCHAR(64) NULL COMMENT 'Bridge-assigned key, de-duplicates replayed uploads',
+  ADD UNIQUE KEY `uniq_plant_upload` (`PlantID`, `UploadKey`);
+
+SELECT 'Sensor reading upload keys added successfully!' as status;
@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Sensor Rollups Table
+-- Per-window aggregates (min/max/mean/last) computed by plant_sensor_bridge.py;
+-- raw samples stay on the bridge, only rollups are uploaded
+-- ============================================================================
+
+USE farm_database;
+
+CREATE TABLE IF NOT EXISTS `SensorRollups` (
+  `RollupID` INT AUTO_INCREMENT PRIMARY KEY,
+  `PlantID` INT NOT NULL,
+  `WindowSeconds` INT NOT NULL COMMENT 'Window length (60 = 1 min, 900 = 15 min, 3600 = 1 h)',
+  `WindowStart` TIMESTAMP NOT NULL,
+  `SampleCount` INT NOT NULL COMMENT 'Raw samples aggregated by the bridge',
+  `SoilMin` FLOAT NULL,
+  `SoilMax` FLOAT NULL,
+  `SoilMean` FLOAT NULL,
+  `SoilLast` FLOAT NULL,
+  `TempMin` FLOAT NULL,
+  `TempMax` FLOAT NULL,
+  `TempMean` FLOAT NULL,
+  `TempLast` FLOAT NULL,
+  `HumidityMin` FLOAT NULL,
+  `HumidityMax` FLOAT NULL,
+  `HumidityMean` FLOAT NULL,
+  `HumidityLast` FLOAT NULL,
+  FOREIGN KEY (`PlantID`) REFERENCES `Plants`(`PlantID`) ON DELETE CASCADE,
+  UNIQUE KEY `uniq_plant_window` (`PlantID`, `WindowSeconds`, `WindowStart`),
+  INDEX `idx_window_start` (`WindowStart`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+SELECT 'Sensor rollups table created successfully!' as status;
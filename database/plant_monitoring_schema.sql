@@ -46,12 +46,42 @@ CREATE TABLE IF NOT EXISTS `SensorReadings` (
   `Humidity` INT NOT NULL COMMENT 'Humidity percentage',
   `WarningLevel` INT DEFAULT 0 COMMENT 'Cumulative warning count',
   `ReadingTime` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  `UploadKey` VARCHAR(64) NULL COMMENT 'Bridge-assigned key, de-duplicates replayed uploads',
   FOREIGN KEY (`PlantID`) REFERENCES `Plants`(`PlantID`) ON DELETE CASCADE,
+  UNIQUE KEY `uniq_plant_upload` (`PlantID`, `UploadKey`),
   INDEX `idx_plant_reading` (`PlantID`, `ReadingTime`),
   INDEX `idx_reading_time` (`ReadingTime`),
   INDEX `idx_warning_level` (`WarningLevel`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- --------------------------------------------------------
+-- Table structure for table `SensorRollups` (Plant-specific)
+-- Per-window min/max/mean/last uploaded by plant_sensor_bridge.py
+-- --------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS `SensorRollups` (
+  `RollupID` INT AUTO_INCREMENT PRIMARY KEY,
+  `PlantID` INT NOT NULL,
+  `WindowSeconds` INT NOT NULL COMMENT 'Window length (60 = 1 min, 900 = 15 min, 3600 = 1 h)',
+  `WindowStart` TIMESTAMP NOT NULL,
+  `SampleCount` INT NOT NULL COMMENT 'Raw samples aggregated by the bridge',
+  `SoilMin` FLOAT NULL,
+  `SoilMax` FLOAT NULL,
+  `SoilMean` FLOAT NULL,
+  `SoilLast` FLOAT NULL,
+  `TempMin` FLOAT NULL,
+  `TempMax` FLOAT NULL,
+  `TempMean` FLOAT NULL,
+  `TempLast` FLOAT NULL,
+  `HumidityMin` FLOAT NULL,
+  `HumidityMax` FLOAT NULL,
+  `HumidityMean` FLOAT NULL,
+  `HumidityLast` FLOAT NULL,
+  FOREIGN KEY (`PlantID`) REFERENCES `Plants`(`PlantID`) ON DELETE CASCADE,
+  UNIQUE KEY `uniq_plant_window` (`PlantID`, `WindowSeconds`, `WindowStart`),
+  INDEX `idx_window_start` (`WindowStart`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- --------------------------------------------------------
 -- Table structure for table `Notifications` (Plant-specific)
 -- --------------------------------------------------------
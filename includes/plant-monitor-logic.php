@@ -10,12 +10,20 @@ class PlantMonitor {
     private $pdo;
     private $activePlant = null;
     
-    public function __construct() {
+    /**
+     * @param int|null $plantID Plant monitored by this instance (one per serial
+     *                          device on multi-device bridges); null = active plant
+     */
+    public function __construct($plantID = null) {
         // Set timezone to Philippines (UTC+8)
         date_default_timezone_set('Asia/Manila');
         
         $this->pdo = getDatabaseConnection();
-        $this->loadActivePlant();
+        if ($plantID !== null) {
+            $this->loadPlant($plantID);
+        } else {
+            $this->loadActivePlant();
+        }
     }
     
     /**
@@ -31,6 +39,15 @@ class PlantMonitor {
         $this->activePlant = $stmt->fetch();
     }
     
+    /**
+     * Load a specific plant configuration
+     */
+    private function loadPlant($plantID) {
+        $stmt = $this->pdo->prepare("SELECT * FROM plants WHERE PlantID = ? LIMIT 1");
+        $stmt->execute([$plantID]);
+        $this->activePlant = $stmt->fetch();
+    }
+    
     /**
      * Get active plant data
      */
@@ -41,8 +58,16 @@ class PlantMonitor {
     /**
      * Process sensor readings and check thresholds
      * Tracks consecutive violations over time
+     *
+     * @param int|null $recordedAt Unix time the reading was taken (replayed
+     *                             readings keep their original time); null = now
+     * @param array|null $bridgeState Warning state evaluated by the bridge's local
+     *                                rule engine ('warning_level', 'notify',
+     *                                'violations'); null = evaluate here
+     * @param string|null $uploadKey Bridge-assigned reading key; a replayed reading
+     *                               with a stored key is acknowledged, not saved again
      */
-    public function processSensorReading($soilMoisture, $temperature, $humidity) {
+    public function processSensorReading($soilMoisture, $temperature, $humidity, $recordedAt = null, $bridgeState = null, $uploadKey = null) {
         if (!$this->activePlant) {
             return [
                 'success' => false,
@@ -111,30 +136,70 @@ class PlantMonitor {
             $currentViolationCount++;
         }
         
-        // Get consecutive violation count from previous readings
-        $consecutiveViolations = $this->getConsecutiveViolations($plantID);
-        
-        // If there are current violations, increment the consecutive count
-        if ($currentViolationCount > 0) {
-            $consecutiveViolations++;
+        if ($bridgeState !== null && isset($bridgeState['warning_level'])) {
+            // The bridge tracks the consecutive count between uploads (with hysteresis),
+            // so it only sends transitions and rollups; trust its state
+            $consecutiveViolations = (int)$bridgeState['warning_level'];
+            if (isset($bridgeState['violations']) && is_array($bridgeState['violations'])) {
+                $violations = $bridgeState['violations'];
+                $currentViolationCount = count($violations);
+            }
         } else {
-            // Reset consecutive violations if all sensors are within thresholds
-            $consecutiveViolations = 0;
+            // Get consecutive violation count from previous readings
+            $consecutiveViolations = $this->getConsecutiveViolations($plantID);
+            
+            // If there are current violations, increment the consecutive count
+            if ($currentViolationCount > 0) {
+                $consecutiveViolations++;
+            } else {
+                // Reset consecutive violations if all sensors are within thresholds
+                $consecutiveViolations = 0;
+            }
         }
         
-        // Save sensor reading with consecutive violation count
-        $readingID = $this->saveSensorReading($plantID, $soilMoisture, $temperature, $humidity, $consecutiveViolations);
-        
-        // Generate notifications if consecutive violations reached warning trigger
+        // The reading and its notifications are stored together or not at all,
+        // so a failed upload can be replayed without duplicating either
         $notificationTriggered = false;
-        if ($consecutiveViolations >= $this->activePlant['WarningTrigger']) {
-            // Only send notification once when threshold is reached
-            if ($consecutiveViolations == $this->activePlant['WarningTrigger']) {
-                foreach ($violations as $violation) {
-                    $this->generateNotification($plantID, $violation, $consecutiveViolations);
+        $this->pdo->beginTransaction();
+        try {
+            // Save sensor reading with consecutive violation count
+            $readingID = $this->saveSensorReading($plantID, $soilMoisture, $temperature, $humidity, $consecutiveViolations, $recordedAt, $uploadKey);
+            if ($readingID === null) {
+                // Already stored by an earlier attempt of the same upload
+                $this->pdo->rollBack();
+                return [
+                    'success' => true,
+                    'duplicate' => true,
+                    'warning_level' => $consecutiveViolations,
+                    'violations' => $violations,
+                    'notification_triggered' => false
+                ];
+            }
+            
+            // Generate notifications if consecutive violations reached warning trigger
+            if ($bridgeState !== null && isset($bridgeState['warning_level'])) {
+                // The bridge flags the one reading where its level reached the trigger
+                if (!empty($bridgeState['notify'])) {
+                    foreach ($violations as $violation) {
+                        $this->generateNotification($plantID, $violation, $consecutiveViolations);
+                    }
+                    $notificationTriggered = true;
                 }
-                $notificationTriggered = true;
+            } elseif ($consecutiveViolations >= $this->activePlant['WarningTrigger']) {
+                // Only send notification once when threshold is reached
+                if ($consecutiveViolations == $this->activePlant['WarningTrigger']) {
+                    foreach ($violations as $violation) {
+                        $this->generateNotification($plantID, $violation, $consecutiveViolations);
+                    }
+                    $notificationTriggered = true;
+                }
+            }
+            $this->pdo->commit();
+        } catch (Exception $e) {
+            if ($this->pdo->inTransaction()) {
+                $this->pdo->rollBack();
             }
+            throw $e;
         }
         
         return [
@@ -177,16 +242,41 @@ class PlantMonitor {
     
     /**
      * Save sensor reading to database
+     *
+     * @return string|null New ReadingID, or null if $uploadKey was already stored
      */
-    private function saveSensorReading($plantID, $soilMoisture, $temperature, $humidity, $warningLevel) {
+    private function saveSensorReading($plantID, $soilMoisture, $temperature, $humidity, $warningLevel, $recordedAt = null, $uploadKey = null) {
         // Use Philippine time (timezone set in constructor to Asia/Manila)
-        $philippineTime = date('Y-m-d H:i:s');
+        $philippineTime = $recordedAt !== null ? date('Y-m-d H:i:s', (int)$recordedAt) : date('Y-m-d H:i:s');
+        $row = [$plantID, $soilMoisture, $temperature, $humidity, $warningLevel, $philippineTime];
+        
+        if ($uploadKey !== null) {
+            try {
+                // UNIQUE (PlantID, UploadKey), see database/add_sensor_upload_key.sql
+                $stmt = $this->pdo->prepare("
+                    INSERT INTO sensorreadings (PlantID, SoilMoisture, Temperature, Humidity, WarningLevel, ReadingTime, UploadKey)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ");
+                $stmt->execute(array_merge($row, [$uploadKey]));
+                return $this->pdo->lastInsertId();
+            } catch (PDOException $e) {
+                $code = $e->errorInfo[1] ?? null;
+                if ($code == 1062) {
+                    return null; // duplicate key: stored by an earlier attempt
+                }
+                if ($code != 1054) {
+                    throw $e;
+                }
+                // UploadKey column not migrated yet: store without de-duplication
+                error_log("SensorReadings.UploadKey missing, apply database/add_sensor_upload_key.sql");
+            }
+        }
         
         $stmt = $this->pdo->prepare("
             INSERT INTO sensorreadings (PlantID, SoilMoisture, Temperature, Humidity, WarningLevel, ReadingTime)
             VALUES (?, ?, ?, ?, ?, ?)
         ");
-        $stmt->execute([$plantID, $soilMoisture, $temperature, $humidity, $warningLevel, $philippineTime]);
+        $stmt->execute($row);
         return $this->pdo->lastInsertId();
     }
     
@@ -305,22 +395,137 @@ class PlantMonitor {
         return $stmt->fetchAll();
     }
     
+    /**
+     * Store a window rollup computed by plant_sensor_bridge.py
+     * Idempotent per (plant, window, start) so replayed uploads don't duplicate rows
+     *
+     * @param array $stats sensor => ['min', 'max', 'mean', 'last']
+     */
+    public function saveRollup($windowSeconds, $windowStart, $sampleCount, $stats) {
+        if (!$this->activePlant) {
+            return [
+                'success' => false,
+                'message' => 'No active plant configured'
+            ];
+        }
+        
+        $row = [$this->activePlant['PlantID'], (int)$windowSeconds, date('Y-m-d H:i:s', (int)$windowStart), (int)$sampleCount];
+        foreach (['soil_moisture', 'temperature', 'humidity'] as $sensor) {
+            foreach (['min', 'max', 'mean', 'last'] as $field) {
+                $row[] = isset($stats[$sensor][$field]) ? floatval($stats[$sensor][$field]) : null;
+            }
+        }
+        
+        $stmt = $this->pdo->prepare("
+            INSERT INTO sensorrollups (PlantID, WindowSeconds, WindowStart, SampleCount,
+                SoilMin, SoilMax, SoilMean, SoilLast,
+                TempMin, TempMax, TempMean, TempLast,
+                HumidityMin, HumidityMax, HumidityMean, HumidityLast)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON DUPLICATE KEY UPDATE SampleCount = VALUES(SampleCount),
+                SoilMin = VALUES(SoilMin), SoilMax = VALUES(SoilMax), SoilMean = VALUES(SoilMean), SoilLast = VALUES(SoilLast),
+                TempMin = VALUES(TempMin), TempMax = VALUES(TempMax), TempMean = VALUES(TempMean), TempLast = VALUES(TempLast),
+                HumidityMin = VALUES(HumidityMin), HumidityMax = VALUES(HumidityMax),
+                HumidityMean = VALUES(HumidityMean), HumidityLast = VALUES(HumidityLast)
+        ");
+        $stmt->execute($row);
+        
+        return [
+            'success' => true,
+            'window' => (int)$windowSeconds,
+            'window_start' => $row[2]
+        ];
+    }
+    
+    /**
+     * Get rollups of one window size (e.g. 3600 for hourly charts)
+     */
+    public function getRollups($windowSeconds, $hours = 24) {
+        $stmt = $this->pdo->prepare("
+            SELECT *
+            FROM sensorrollups
+            WHERE PlantID = ? AND WindowSeconds = ?
+              AND WindowStart >= DATE_SUB(NOW(), INTERVAL ? HOUR)
+            ORDER BY WindowStart
+        ");
+        $stmt->execute([$this->activePlant['PlantID'] ?? 0, (int)$windowSeconds, (int)$hours]);
+        return $stmt->fetchAll();
+    }
+    
     /**
      * Get sensor statistics
      */
     public function getSensorStatistics($hours = 24) {
+        list($samples, $params) = self::sensorSamples(
+            $this->pdo,
+            date('Y-m-d H:i:s', time() - (int)$hours * 3600),
+            date('Y-m-d H:i:s')
+        );
         $stmt = $this->pdo->prepare("
             SELECT 
-                AVG(SoilMoisture) as avg_soil,
-                AVG(Temperature) as avg_temp,
-                AVG(Humidity) as avg_humidity,
-                MIN(Temperature) as min_temp,
-                MAX(Temperature) as max_temp,
-                COUNT(*) as reading_count
-            FROM sensorreadings
-            WHERE ReadingTime >= DATE_SUB(NOW(), INTERVAL ? HOUR)
+                SUM(SoilMean * SampleCount) / SUM(SampleCount) as avg_soil,
+                SUM(TempMean * SampleCount) / SUM(SampleCount) as avg_temp,
+                SUM(HumidityMean * SampleCount) / SUM(SampleCount) as avg_humidity,
+                MIN(TempMin) as min_temp,
+                MAX(TempMax) as max_temp,
+                COALESCE(SUM(SampleCount), 0) as reading_count
+            FROM {$samples} samples
         ");
-        $stmt->execute([$hours]);
+        $stmt->execute($params);
         return $stmt->fetch();
     }
+    
+    /**
+     * Sensor samples between $start and $end for analytics, as [derived table SQL, params]
+     *
+     * sensorreadings stays the source of truth. Bridge rollups (coarsest uploaded window)
+     * replace the readings of the windows they cover; readings outside them (other
+     * writers, older data, non-aggregating bridges) are used as they are. Columns:
+     * SampleTime, SampleCount and Soil/Temp/Humidity + Mean/Min/Max.
+     */
+    public static function sensorSamples(PDO $pdo, $start, $end) {
+        $readings = "
+                SELECT sr.ReadingTime as SampleTime, 1 as SampleCount,
+                    sr.SoilMoisture as SoilMean, sr.SoilMoisture as SoilMin, sr.SoilMoisture as SoilMax,
+                    sr.Temperature as TempMean, sr.Temperature as TempMin, sr.Temperature as TempMax,
+                    sr.Humidity as HumidityMean, sr.Humidity as HumidityMin, sr.Humidity as HumidityMax
+                FROM sensorreadings sr
+                WHERE sr.ReadingTime BETWEEN ? AND ?";
+        
+        $window = self::rollupWindow($pdo);
+        if ($window === null) {
+            return ["({$readings}\n            )", [$start, $end]];
+        }
+        
+        // Bridge readings are stamped at their window's end, hence (WindowStart, end]
+        $sql = "({$readings}
+                  AND NOT EXISTS (
+                    SELECT 1 FROM sensorrollups r
+                    WHERE r.PlantID = sr.PlantID AND r.WindowSeconds = ?
+                      AND r.WindowStart < sr.ReadingTime
+                      AND r.WindowStart >= sr.ReadingTime - INTERVAL ? SECOND
+                  )
+                UNION ALL
+                SELECT WindowStart, SampleCount,
+                    SoilMean, SoilMin, SoilMax,
+                    TempMean, TempMin, TempMax,
+                    HumidityMean, HumidityMin, HumidityMax
+                FROM sensorrollups
+                WHERE WindowSeconds = ? AND WindowStart BETWEEN ? AND ?
+            )";
+        return [$sql, [$start, $end, $window, $window, $window, $start, $end]];
+    }
+    
+    /**
+     * Coarsest rollup window the bridges upload, or null if there are no rollups
+     */
+    private static function rollupWindow(PDO $pdo) {
+        try {
+            $window = $pdo->query("SELECT MAX(WindowSeconds) FROM sensorrollups")->fetchColumn();
+        } catch (PDOException $e) {
+            // SensorRollups not created yet (database/create_sensor_rollups.sql)
+            return null;
+        }
+        return $window ? (int)$window : null;
+    }
 }
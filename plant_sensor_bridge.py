@@ -5,213 +5,899 @@ Reads data from Arduino bridge and syncs with plant monitoring system
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import math
+import os
+import random
+import sqlite3
+import threading
 import time
 import json
+import uuid
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from service_logging import setup_logging
+from service_metrics import MetricsRegistry, start_http_server
+
+# Configure logging: a background thread writes the records, repeated
+# messages are rate-limited (SENSOR_LOG_LEVEL / _LOG_LEVELS / _LOG_RATE_LIMIT)
+log_rate_limit, log_listener = setup_logging("SENSOR")
+logger = logging.getLogger("plant_sensor_bridge")
+upload_logger = logging.getLogger("plant_sensor_bridge.upload")          # sync results and retries
+threshold_logger = logging.getLogger("plant_sensor_bridge.thresholds")  # violation transitions
+
+# Prometheus metrics, served by a small embedded exporter (METRICS_PORT)
+metrics = MetricsRegistry()
+upload_seconds = metrics.histogram("plant_bridge_upload_seconds", "Batch POST latency", ["bridge"])
+uploads_total = metrics.counter("plant_bridge_uploads", "Batch POSTs by result", ["bridge", "result"])
+uploaded_readings_total = metrics.counter("plant_bridge_uploaded_readings", "Readings accepted by the server", ["bridge"])
+queue_depth = metrics.gauge("plant_bridge_queue_depth", "Readings waiting in the upload spool", ["bridge"])
+dead_letters_total = metrics.gauge("plant_bridge_dead_letters", "Readings given up on after UPLOAD_MAX_ATTEMPTS rejections", ["bridge"])
+samples_total = metrics.counter("plant_bridge_samples", "Sensor samples taken", ["bridge"])
+missed_ticks_total = metrics.counter("plant_bridge_missed_ticks", "Sampling ticks skipped after falling behind", ["bridge"])
+violations_total = metrics.counter("plant_bridge_violations", "Threshold violations started, by sensor", ["bridge", "sensor"])
+warnings_total = metrics.counter("plant_bridge_warnings", "Warning notifications raised", ["bridge"])
+violating_sensors = metrics.gauge("plant_bridge_violating_sensors", "Sensors currently out of range", ["bridge"])
 
 # Configuration
 ARDUINO_BRIDGE_URL = "http://127.0.0.1:5000"
 PLANT_API_URL = "http://localhost/api/plant_sensor_sync.php"
 SENSOR_INTERVAL_API = "http://localhost/api/get_sensor_interval.php"
 DEFAULT_SYNC_INTERVAL = 30  # seconds (fallback)
+CONFIG_REFRESH_INTERVAL = 60  # seconds between sync interval refreshes
+HTTP_POOL_SIZE = 8            # keep-alive connections shared by every bridge
+METRICS_PORT = int(os.environ.get("SENSOR_METRICS_PORT", "9105"))  # /metrics exporter, 0 = off
+IO_WORKERS = 8                # threads running blocking HTTP/SQLite calls for the event loop
+
+# Upload batching and offline spooling
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sensor_spool.db")
+UPLOAD_BATCH_SIZE = 50      # readings per POST
+UPLOAD_TIMEOUT = 10         # seconds per batch POST
+UPLOAD_MAX_ATTEMPTS = 5     # rejections before a reading moves to the dead_letter table
+BACKOFF_INITIAL = 2         # seconds after the first failed upload
+BACKOFF_MAX = 300           # cap for exponential backoff
+
+# On-bridge aggregation: raw samples stay local, only the configured window rollups
+# are uploaded. The finest window's rollup also becomes the SensorReadings row.
+AGGREGATION_ENABLED = os.environ.get("SENSOR_AGGREGATION", "1") != "0"
+RAW_SAMPLE_INTERVAL = int(os.environ.get("SENSOR_SAMPLE_INTERVAL", "10"))  # seconds
+ROLLUP_WINDOWS = tuple(int(w) for w in os.environ.get("SENSOR_ROLLUP_WINDOWS", "900,3600").split(","))
+RAW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sensor_raw.db")
+RAW_RETENTION_HOURS = 72
+SENSORS = ("temperature", "humidity", "soil_moisture")
+
+# Local threshold evaluation: a sensor enters violation outside [min, max] and
+# only clears once it is back inside by this margin (avoids flapping at the edge)
+THRESHOLD_HYSTERESIS = {"temperature": 0.5, "humidity": 2.0, "soil_moisture": 2.0}
+SENSOR_LABELS = {
+    "soil_moisture": ("Soil Moisture", "%"),
+    "temperature": ("Temperature", "°C"),
+    "humidity": ("Humidity", "%")
+}
+
+class ReadingSpool:
+    """Append-only SQLite journal of readings waiting to be uploaded, oldest first"""
+    
+    def __init__(self, path=SPOOL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recorded_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(spool)")}
+        if "attempts" not in columns:  # spool written by an older bridge
+            self._db.execute("ALTER TABLE spool ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("ALTER TABLE spool ADD COLUMN last_error TEXT")
+        # Readings the server kept rejecting, kept for inspection instead of dropped
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                recorded_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            )
+        """)
+    
+    def append(self, recorded_at, payload):
+        """Journal one reading before any upload is attempted"""
+        with self._lock:
+            self._db.execute("INSERT INTO spool (recorded_at, payload) VALUES (?, ?)",
+                             (recorded_at, json.dumps(payload)))
+    
+    def peek(self, limit):
+        """Oldest readings as (id, payload) without removing them"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload FROM spool ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+    
+    def ack(self, ids):
+        """Drop the readings the server stored"""
+        with self._lock:
+            self._db.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in ids])
+    
+    def fail(self, failures, max_attempts=UPLOAD_MAX_ATTEMPTS):
+        """Count a rejection per (id, error); returns how many moved to dead_letter"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "UPDATE spool SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    [(error, row_id) for row_id, error in failures]
+                )
+                moved = self._db.execute("""
+                    INSERT INTO dead_letter (id, recorded_at, payload, attempts, error, failed_at)
+                    SELECT id, recorded_at, payload, attempts, last_error, ? FROM spool WHERE attempts >= ?
+                """, (time.time(), max_attempts)).rowcount
+                self._db.execute("DELETE FROM spool WHERE attempts >= ?", (max_attempts,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return moved
+    
+    def dead_letters(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+    
+    def depth(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+    
+    def oldest(self):
+        """recorded_at of the oldest unsent reading, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(recorded_at) FROM spool").fetchone()
+        return row[0]
+
+class RawReadingStore:
+    """Local SQLite history of every raw sample, pruned to RAW_RETENTION_HOURS"""
+    
+    def __init__(self, path=RAW_PATH, retention_hours=RAW_RETENTION_HOURS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.retention = retention_hours * 3600
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS raw_readings ("
+            "ts REAL NOT NULL, temperature REAL, humidity REAL, soil_moisture REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_raw_ts ON raw_readings (ts)")
+        self._db.commit()
+    
+    def append(self, ts, values):
+        with self._lock:
+            self._db.execute("INSERT INTO raw_readings VALUES (?, ?, ?, ?)",
+                             (ts, values['temperature'], values['humidity'], values['soil_moisture']))
+            self._db.commit()
+    
+    def since(self, start, end=None):
+        """Raw rows (ts, temperature, humidity, soil_moisture) in [start, end)"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT ts, temperature, humidity, soil_moisture FROM raw_readings "
+                "WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end or float("inf"))
+            ).fetchall()
+    
+    def prune(self, now=None):
+        """Drop samples older than the retention period, returns rows removed"""
+        cutoff = (now or time.time()) - self.retention
+        with self._lock:
+            removed = self._db.execute("DELETE FROM raw_readings WHERE ts < ?", (cutoff,)).rowcount
+            self._db.commit()
+        return removed
+    
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM raw_readings").fetchone()[0]
+
+class WindowAggregate:
+    """Running min/max/sum/last of each sensor over one time window (O(1) per sample)"""
+    
+    __slots__ = ("start", "count", "stats")
+    
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.stats = {}  # sensor -> [min, max, sum, last]
+    
+    def add(self, values):
+        self.count += 1
+        for sensor, value in values.items():
+            stat = self.stats.get(sensor)
+            if stat is None:
+                self.stats[sensor] = [value, value, value, value]
+                continue
+            if value < stat[0]:
+                stat[0] = value
+            if value > stat[1]:
+                stat[1] = value
+            stat[2] += value
+            stat[3] = value
+    
+    def summary(self, window):
+        return {
+            "window": window,
+            "window_start": int(self.start),
+            "count": self.count,
+            "stats": {
+                sensor: {
+                    "min": stat[0],
+                    "max": stat[1],
+                    "mean": round(stat[2] / self.count, 2),
+                    "last": stat[3]
+                }
+                for sensor, stat in self.stats.items()
+            }
+        }
+
+class RollupAggregator:
+    """Streams samples into epoch-aligned windows and emits each window's rollup once it closes"""
+    
+    def __init__(self, windows=ROLLUP_WINDOWS):
+        self.windows = tuple(sorted(set(windows)))
+        self.reading_window = self.windows[0]  # its rollup is flagged log_reading
+        self.open = {}  # window seconds -> WindowAggregate
+    
+    def add(self, ts, values):
+        """Add one sample, returns rollups of the windows it closed"""
+        closed = []
+        for window in self.windows:
+            start = ts - ts % window
+            aggregate = self.open.get(window)
+            if aggregate is not None and aggregate.start != start:
+                closed.append(self._close(window, aggregate))
+                aggregate = None
+            if aggregate is None:
+                aggregate = self.open[window] = WindowAggregate(start)
+            aggregate.add(values)
+        return closed
+    
+    def _close(self, window, aggregate):
+        rollup = aggregate.summary(window)
+        rollup["log_reading"] = window == self.reading_window
+        return rollup
+
+class ThresholdEngine:
+    """Compiled plant thresholds with per-sensor hysteresis and an incremental warning level
+    
+    Mirrors PlantMonitor::processSensorReading(): the warning level counts consecutive
+    logging periods with any sensor in violation, resets when all are in range, and a
+    notification is due when it reaches the plant's warning_trigger.
+    """
+    
+    def __init__(self, active_plant, period, hysteresis=THRESHOLD_HYSTERESIS):
+        self.plant_id = active_plant.get('id')
+        self.trigger = int(active_plant.get('warning_trigger') or 1)
+        self.period = max(1, period)
+        self.rules = []
+        for sensor, (label, unit) in SENSOR_LABELS.items():
+            limits = active_plant.get('thresholds', {}).get(sensor, {})
+            if limits.get('min') is None or limits.get('max') is None:
+                continue
+            low, high = float(limits['min']), float(limits['max'])
+            band = min(hysteresis.get(sensor, 0.0), (high - low) / 4)
+            self.rules.append((sensor, label, low, high, low + band, high - band,
+                               f"{limits['min']}–{limits['max']}{unit}"))
+        self.status = {rule[0]: None for rule in self.rules}  # None | "Below Minimum" | "Above Maximum"
+        self.sensor_since = {}      # sensor -> when its current violation began
+        self.violating_since = None
+        self.notified = False
+        self.warning_level = 0
+        self.current = {}
+    
+    def evaluate(self, values, now=None):
+        """Update state from one sample, returns transition events (usually none)"""
+        now = now or time.time()
+        events = []
+        for sensor, label, low, high, low_clear, high_clear, value_range in self.rules:
+            value = values.get(sensor)
+            if value is None:
+                continue
+            self.current[sensor] = value
+            status = self.status[sensor]
+            if value < low:
+                new_status = "Below Minimum"
+            elif value > high:
+                new_status = "Above Maximum"
+            elif status is None or low_clear <= value <= high_clear:
+                new_status = None
+            else:
+                new_status = status  # inside the hysteresis band: still violating
+            if new_status != status:
+                self.status[sensor] = new_status
+                if new_status:
+                    self.sensor_since[sensor] = now
+                else:
+                    self.sensor_since.pop(sensor, None)
+                events.append({
+                    "type": "violation" if new_status else "cleared",
+                    "sensor": label,
+                    "status": new_status or "Within Range",
+                    "current": value,
+                    "range": value_range
+                })
+        
+        if self.sensor_since:
+            if self.violating_since is None:
+                self.violating_since = now
+            self.warning_level = int((now - self.violating_since) // self.period) + 1
+        else:
+            self.violating_since = None
+            self.warning_level = 0
+            self.notified = False
+        
+        if self.warning_level >= self.trigger and not self.notified:
+            self.notified = True
+            events.append({"type": "warning", "warning_level": self.warning_level,
+                           "violations": self.violations()})
+        return events
+    
+    def violations(self):
+        """Current violations in the same shape the PHP API returns"""
+        return [
+            {"sensor": label, "status": self.status[sensor], "current": self.current.get(sensor),
+             "range": value_range}
+            for sensor, label, _, _, _, _, value_range in self.rules
+            if self.status[sensor]
+        ]
+    
+    def sensor_levels(self, now=None):
+        """Per-sensor warning counters (consecutive logging periods in violation)"""
+        now = now or time.time()
+        return {
+            sensor: int((now - since) // self.period) + 1 if since is not None else 0
+            for sensor, since in ((rule[0], self.sensor_since.get(rule[0])) for rule in self.rules)
+        }
+
+class BatchUploader:
+    """Uploads spooled readings in order over a keep-alive session, with backoff"""
+    
+    def __init__(self, session, spool=None, url=PLANT_API_URL, fields=None, name="default"):
+        self.session = session
+        self.spool = spool or ReadingSpool()
+        self.url = url
+        self.fields = fields or {}  # sent with every batch, e.g. plant_id
+        self.upload_seconds = upload_seconds.labels(name)
+        self.uploads_ok = uploads_total.labels(name, "success")
+        self.uploads_failed = uploads_total.labels(name, "failure")
+        uploaded_readings_total.labels(name).set_function(lambda: self.uploaded)
+        queue_depth.labels(name).set_function(self.spool.depth)
+        dead_letters_total.labels(name).set_function(self.spool.dead_letters)
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.uploaded = 0
+        self.last_success = None
+        self.last_error = None
+    
+    def enqueue(self, payload, recorded_at=None):
+        """Journal a reading; it is sent by the next flush()
+        
+        The key lets the server recognise a reading replayed after a lost response.
+        """
+        recorded_at = recorded_at or time.time()
+        payload = dict(payload, recorded_at=int(recorded_at), key=uuid.uuid4().hex)
+        self.spool.append(recorded_at, payload)
+    
+    def flush(self, max_batches=None):
+        """Send queued readings oldest-first until empty, a failure, or max_batches
+        
+        Only readings the server reports as stored are dropped from the spool; rejected
+        ones are retried after backoff and dead-lettered after UPLOAD_MAX_ATTEMPTS.
+        Returns the last successful response body (for violation reporting) or None.
+        """
+        if time.time() < self.next_attempt:
+            return None
+        
+        last_result = None
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = self.spool.peek(UPLOAD_BATCH_SIZE)
+            if not rows:
+                break
+            
+            result = self._post([payload for _, payload in rows])
+            if result is None:
+                self._backoff()
+                break
+            
+            stored, rejected = self._outcomes(rows, result)
+            if stored:
+                self.spool.ack(stored)
+                self.uploaded += len(stored)
+                last_result = result
+            if rejected:
+                self._reject(rejected)
+                self._backoff()
+                break
+            
+            self.failures = 0
+            self.next_attempt = 0.0
+            self.last_success = time.time()
+            batches += 1
+        return last_result
+    
+    def _post(self, readings):
+        started = time.perf_counter()
+        result = self._send(readings)
+        self.upload_seconds.observe_since(started)
+        (self.uploads_ok if result is not None else self.uploads_failed).inc()
+        return result
+    
+    def _send(self, readings):
+        try:
+            response = self.session.post(self.url, json=dict(self.fields, readings=readings), timeout=UPLOAD_TIMEOUT)
+            if response.status_code != 200:
+                self.last_error = f"HTTP error: {response.status_code}"
+                return None
+            result = response.json()
+            if not result.get('success'):
+                self.last_error = f"Sync failed: {result.get('message', 'no readings processed')}"
+                return None
+            return result
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+    
+    def _outcomes(self, rows, result):
+        """Split a batch into stored spool ids and (id, error) rejections"""
+        results = result.get('results')
+        if isinstance(results, list) and len(results) == len(rows):
+            stored, rejected = [], []
+            for (row_id, _), outcome in zip(rows, results):
+                if outcome.get('success'):
+                    stored.append(row_id)
+                else:
+                    rejected.append((row_id, outcome.get('message', 'rejected')))
+            return stored, rejected
+        # No per-reading results: only a fully processed batch counts as stored
+        if result.get('processed', 0) >= len(rows):
+            return [row_id for row_id, _ in rows], []
+        error = f"processed {result.get('processed', 0)} of {len(rows)}"
+        return [], [(row_id, error) for row_id, _ in rows]
+    
+    def _reject(self, rejected):
+        """Keep rejected readings for retry, dead-lettering the ones out of attempts"""
+        self.last_error = f"Server rejected {len(rejected)} reading(s): {rejected[0][1]}"
+        moved = self.spool.fail(rejected)
+        if moved:
+            upload_logger.error("%d reading(s) rejected %d times, moved to dead_letter in %s",
+                                moved, UPLOAD_MAX_ATTEMPTS, self.spool.path)
+    
+    def _backoff(self):
+        """Exponential backoff with jitter before the next replay attempt"""
+        self.failures += 1
+        delay = min(BACKOFF_MAX, BACKOFF_INITIAL * (2 ** (self.failures - 1)))
+        delay *= random.uniform(0.8, 1.2)
+        self.next_attempt = time.time() + delay
+        upload_logger.error("Upload failed (%s); %d reading(s) spooled, retrying in %.0fs",
+                            self.last_error, self.spool.depth(), delay)
+    
+    def stats(self):
+        """Queue depth and replay lag"""
+        oldest = self.spool.oldest()
+        return {
+            "queue_depth": self.spool.depth(),
+            "replay_lag_seconds": round(time.time() - oldest, 1) if oldest else 0,
+            "uploaded": self.uploaded,
+            "dead_letters": self.spool.dead_letters(),
+            "consecutive_failures": self.failures,
+            "next_attempt_in": max(0, round(self.next_attempt - time.time(), 1)),
+            "last_success": self.last_success,
+            "last_error": self.last_error
+        }
+
+def create_session(pool_size=HTTP_POOL_SIZE):
+    """requests.Session with a keep-alive connection pool, shareable between bridges"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    return session
 
 class PlantSensorBridge:
-    def __init__(self):
+    def __init__(self, name="default", session=None, executor=None,
+                 bridge_url=ARDUINO_BRIDGE_URL, spool_path=None,
+                 device_id=None, plant_id=None, raw_path=None):
+        self.name = name
         self.running = False
         self.active_plant = None
+        self.device_id = device_id  # serial device on the Arduino bridge (None = default)
+        self.plant_id = plant_id    # PlantID it monitors (None = active plant)
         self.sync_interval = DEFAULT_SYNC_INTERVAL
+        self.bridge_url = bridge_url
+        
+        # One keep-alive connection pool for every request (shared when given)
+        self.session = session or create_session()
+        self.executor = executor
+        if spool_path is None and name != "default":
+            spool_path = SPOOL_PATH.replace(".db", f"_{name}.db")
+        self.uploader = BatchUploader(self.session, ReadingSpool(spool_path or SPOOL_PATH),
+                                      fields={"plant_id": plant_id} if plant_id else None, name=name)
+        self.raw_store = None
+        self.aggregator = None
+        if AGGREGATION_ENABLED:
+            if raw_path is None and name != "default":
+                raw_path = RAW_PATH.replace(".db", f"_{name}.db")
+            self.raw_store = RawReadingStore(raw_path or RAW_PATH)
+            self.aggregator = RollupAggregator()
+        self.rollups_queued = 0
+        self.thresholds = None
+        self.transitions_queued = 0
+        self._data_etag = None
+        self._sensor_data = None
+        self._upload_wakeup = None
+        self.samples = 0
+        self.missed_ticks = 0
+        samples_total.labels(name).set_function(lambda: self.samples)
+        missed_ticks_total.labels(name).set_function(lambda: self.missed_ticks)
+        self.warnings_total = warnings_total.labels(name)
+        violating_sensors.labels(name).set_function(
+            lambda: len(self.thresholds.violations()) if self.thresholds else 0)
         
     def get_sensor_interval(self):
         """Get sensor logging interval from API"""
         try:
-            response = requests.get(SENSOR_INTERVAL_API, timeout=5)
+            response = self.session.get(SENSOR_INTERVAL_API, timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
                     self.sync_interval = data.get('interval_seconds', DEFAULT_SYNC_INTERVAL)
-                    logger.info(f"Sync interval: {self.sync_interval} seconds ({data.get('display', 'N/A')})")
+                    if self.thresholds:
+                        self.thresholds.period = max(1, self.sync_interval)
+                    logger.info("Sync interval: %s seconds (%s)", self.sync_interval,
+                                data.get('display', 'N/A'))
                     return True
             return False
         except Exception as e:
-            logger.error(f"Failed to get sensor interval: {e}")
+            logger.error("Failed to get sensor interval: %s", e)
             self.sync_interval = DEFAULT_SYNC_INTERVAL
             return False
     
     def get_active_plant(self):
-        """Get active plant configuration from API"""
+        """Get active (or configured) plant configuration from API"""
         try:
-            response = requests.get(PLANT_API_URL, timeout=5)
+            params = {"plant_id": self.plant_id} if self.plant_id else None
+            response = self.session.get(PLANT_API_URL, params=params, timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
-                    self.active_plant = data.get('active_plant')
-                    logger.info(f"Active plant: {self.active_plant['name']} ({self.active_plant['local_name']})")
+                    active_plant = data.get('active_plant')
+                    if active_plant != self.active_plant:
+                        # (Re)compile thresholds only when the plant or its limits change
+                        self.active_plant = active_plant
+                        self.thresholds = ThresholdEngine(active_plant, self.sync_interval)
+                        logger.info("Active plant: %s (%s)", self.active_plant['name'],
+                                    self.active_plant['local_name'])
                     return True
             return False
         except Exception as e:
-            logger.error(f"Failed to get active plant: {e}")
+            logger.error("Failed to get active plant: %s", e)
             return False
     
     def get_sensor_data(self):
         """Get sensor data from Arduino bridge"""
         try:
-            response = requests.get(f"{ARDUINO_BRIDGE_URL}/data", timeout=5)
+            path = f"/devices/{self.device_id}/data" if self.device_id else "/data"
+            # Conditional GET: an unchanged reading set comes back as an empty 304
+            headers = {"If-None-Match": self._data_etag} if self._data_etag else None
+            response = self.session.get(f"{self.bridge_url}{path}", headers=headers, timeout=5)
+            if response.status_code == 304:
+                return self._sensor_data
             if response.status_code == 200:
                 data = response.json()
                 if data.get('status') == 'success':
-                    return data.get('data')
+                    self._data_etag = response.headers.get('ETag')
+                    self._sensor_data = data.get('data')
+                    return self._sensor_data
             return None
         except Exception as e:
-            logger.error(f"Failed to get sensor data: {e}")
+            logger.error("Failed to get sensor data: %s", e)
+            return None
+    
+    @staticmethod
+    def reading_values(sensor_data):
+        """Sensor values from an Arduino bridge response, None if incomplete"""
+        values = {sensor: sensor_data.get(sensor, {}).get('value') for sensor in SENSORS}
+        if None in values.values():
             return None
+        return values
+    
+    def record_reading(self, sensor_data):
+        """Journal a complete reading (or the rollups it closes), returns False if incomplete"""
+        values = self.reading_values(sensor_data)
+        if values is None:
+            logger.warning("Incomplete sensor data, skipping sync")
+            return False
+        
+        if self.aggregator:
+            self.aggregate_reading(time.time(), values)
+            return True
+        
+        # Journal first so the reading survives a PHP host or tunnel outage
+        self.uploader.enqueue(values)
+        return True
+    
+    def record_transition(self, sensor_data, events):
+        """Queue a reading for a threshold transition, carrying the local warning state"""
+        values = self.reading_values(sensor_data)
+        if values is None:
+            return False
+        self.uploader.enqueue(dict(
+            values,
+            warning_level=self.thresholds.warning_level,
+            notify=any(event['type'] == 'warning' for event in events),
+            violations=self.thresholds.violations()
+        ))
+        self.transitions_queued += 1
+        return True
+    
+    def aggregate_reading(self, now, values):
+        """Keep the raw sample locally and queue the rollups of any windows it closed"""
+        self.raw_store.append(now, values)
+        for rollup in self.aggregator.add(now, values):
+            payload = dict(rollup)
+            if rollup['log_reading']:
+                # Mean values fill the plain reading fields so the server can log
+                # the finest rollup as a normal SensorReadings row
+                stats = rollup['stats']
+                payload.update(
+                    temperature=stats['temperature']['mean'],
+                    humidity=stats['humidity']['mean'],
+                    soil_moisture=stats['soil_moisture']['mean']
+                )
+                if self.thresholds:
+                    # Logged with the local warning level; notifications go out with transitions
+                    payload.update(warning_level=self.thresholds.warning_level, notify=False,
+                                   violations=self.thresholds.violations())
+            self.uploader.enqueue(payload, recorded_at=rollup['window_start'] + rollup['window'])
+            self.rollups_queued += 1
+            if rollup['window'] == self.aggregator.windows[-1]:
+                removed = self.raw_store.prune(now)
+                if removed:
+                    logger.info("Pruned %s raw sample(s) older than %sh", removed, RAW_RETENTION_HOURS)
     
     def sync_sensor_data(self, sensor_data):
-        """Sync sensor data with plant monitoring system"""
+        """Queue a reading for upload and send the backlog as batches"""
         try:
-            # Extract sensor values
-            temperature = sensor_data.get('temperature', {}).get('value')
-            humidity = sensor_data.get('humidity', {}).get('value')
-            soil_moisture = sensor_data.get('soil_moisture', {}).get('value')
-            
-            if temperature is None or humidity is None or soil_moisture is None:
-                logger.warning("Incomplete sensor data, skipping sync")
+            if not self.record_reading(sensor_data):
+                return False
+            return self.upload_pending()
+        except Exception as e:
+            upload_logger.error("Failed to sync sensor data: %s", e)
+            return False
+    
+    def upload_pending(self):
+        """Send the spooled backlog and report violations from the latest reading"""
+        try:
+            result = self.uploader.flush()
+            stats = self.uploader.stats()
+            if result is None:
+                if stats['queue_depth']:
+                    upload_logger.warning("Upload queue: %d reading(s), replay lag %ss",
+                                          stats['queue_depth'], stats['replay_lag_seconds'])
                 return False
             
-            # Send to plant monitoring API
-            payload = {
-                'temperature': temperature,
-                'humidity': humidity,
-                'soil_moisture': soil_moisture
-            }
+            upload_logger.info("✓ Synced %s reading(s)", result.get('processed', 1))
             
-            response = requests.post(
-                PLANT_API_URL,
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=5
-            )
+            # Check for violations (latest reading in the batch)
+            if result.get('violations'):
+                upload_logger.warning("⚠ %s threshold violation(s) detected", len(result['violations']))
+                for violation in result['violations']:
+                    upload_logger.warning("  - %s: %s (Current: %s, Range: %s)", violation['sensor'],
+                                          violation['status'], violation['current'], violation['range'])
             
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    logger.info(f"✓ Synced: T={temperature}°C, H={humidity}%, SM={soil_moisture}%")
-                    
-                    # Check for violations
-                    if result.get('violations'):
-                        logger.warning(f"⚠ {len(result['violations'])} threshold violation(s) detected")
-                        for violation in result['violations']:
-                            logger.warning(f"  - {violation['sensor']}: {violation['status']} (Current: {violation['current']}, Range: {violation['range']})")
-                    
-                    # Check if notification triggered
-                    if result.get('notification_triggered'):
-                        logger.warning(f"🔔 Notification triggered! Warning level: {result.get('warning_level')}")
-                    
-                    return True
-                else:
-                    logger.error(f"Sync failed: {result.get('message')}")
-            else:
-                logger.error(f"HTTP error: {response.status_code}")
+            # Check if notification triggered
+            if result.get('notification_triggered'):
+                upload_logger.warning("🔔 Notification triggered! Warning level: %s", result.get('warning_level'))
             
-            return False
+            return stats['queue_depth'] == 0
             
         except Exception as e:
-            logger.error(f"Failed to sync sensor data: {e}")
+            upload_logger.error("Failed to upload sensor data: %s", e)
             return False
     
     def check_thresholds(self, sensor_data):
-        """Display threshold comparison"""
-        if not self.active_plant:
-            return
-        
-        temperature = sensor_data.get('temperature', {}).get('value')
-        humidity = sensor_data.get('humidity', {}).get('value')
-        soil_moisture = sensor_data.get('soil_moisture', {}).get('value')
-        
-        thresholds = self.active_plant.get('thresholds', {})
-        
-        logger.info("=" * 60)
-        logger.info(f"Plant: {self.active_plant['name']} ({self.active_plant['local_name']})")
-        logger.info("-" * 60)
-        
-        # Temperature
-        temp_range = thresholds.get('temperature', {})
-        temp_status = "✓" if temp_range.get('min') <= temperature <= temp_range.get('max') else "✗"
-        logger.info(f"{temp_status} Temperature: {temperature}°C (Range: {temp_range.get('min')}-{temp_range.get('max')}°C)")
+        """Evaluate thresholds locally, logging only state transitions; returns the events"""
+        if not self.thresholds:
+            return []
         
-        # Humidity
-        hum_range = thresholds.get('humidity', {})
-        hum_status = "✓" if hum_range.get('min') <= humidity <= hum_range.get('max') else "✗"
-        logger.info(f"{hum_status} Humidity: {humidity}% (Range: {hum_range.get('min')}-{hum_range.get('max')}%)")
-        
-        # Soil Moisture
-        soil_range = thresholds.get('soil_moisture', {})
-        soil_status = "✓" if soil_range.get('min') <= soil_moisture <= soil_range.get('max') else "✗"
-        logger.info(f"{soil_status} Soil Moisture: {soil_moisture}% (Range: {soil_range.get('min')}-{soil_range.get('max')}%)")
+        events = self.thresholds.evaluate({
+            sensor: sensor_data.get(sensor, {}).get('value') for sensor in SENSORS
+        })
+        for event in events:
+            if event['type'] == 'warning':
+                self.warnings_total.inc()
+                threshold_logger.warning("🔔 [%s] Warning level %d reached (%d violation(s)), notifying",
+                                         self.name, event['warning_level'], len(event['violations']))
+            elif event['type'] == 'violation':
+                violations_total.labels(self.name, event['sensor']).inc()
+                threshold_logger.warning("✗ [%s] %s: %s (Current: %s, Range: %s)", self.name,
+                                         event['sensor'], event['status'], event['current'], event['range'])
+            else:
+                threshold_logger.info("✓ [%s] %s back within range (Current: %s, Range: %s)", self.name,
+                                      event['sensor'], event['current'], event['range'])
+        return events
+    
+    async def _call(self, func, *args):
+        """Run a blocking HTTP/SQLite call on the shared I/O thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    async def sample_loop(self):
+        """Sample on a drift-free schedule: ticks are anchored to the start time,
+        so slow requests never stretch the sampling period"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
         
-        logger.info("=" * 60)
+        while self.running:
+            # Get sensor data from Arduino bridge
+            sensor_data = await self._call(self.get_sensor_data)
+            
+            if sensor_data:
+                # Local rule engine: only transitions are reported to the server
+                events = self.check_thresholds(sensor_data)
+                
+                # Journal the reading (or closed rollups) and wake the uploader
+                queued = self.rollups_queued
+                if await self._call(self.record_reading, sensor_data):
+                    self.samples += 1
+                    if not self.aggregator or self.rollups_queued != queued:
+                        self._upload_wakeup.set()
+                if events and self.aggregator:
+                    if await self._call(self.record_transition, sensor_data, events):
+                        self._upload_wakeup.set()
+            else:
+                logger.warning("No sensor data available from Arduino bridge")
+            
+            # Wait for next tick: raw sampling rate when aggregating, otherwise
+            # the (possibly refreshed) logging interval
+            interval = max(1, RAW_SAMPLE_INTERVAL if self.aggregator else self.sync_interval)
+            next_tick += interval
+            now = loop.time()
+            if next_tick < now:
+                # Fell behind by whole periods: skip them rather than bursting
+                missed = math.ceil((now - next_tick) / interval)
+                self.missed_ticks += missed
+                next_tick += missed * interval
+                logger.warning("Sampling fell behind, skipped %s tick(s)", missed)
+            await asyncio.sleep(next_tick - now)
     
-    def run(self):
-        """Main loop"""
+    async def config_loop(self):
+        """Periodically refresh the sync interval and plant thresholds from the database"""
+        while self.running:
+            await asyncio.sleep(CONFIG_REFRESH_INTERVAL)
+            old_interval = self.sync_interval
+            await self._call(self.get_sensor_interval)
+            await self._call(self.get_active_plant)
+            if old_interval != self.sync_interval:
+                logger.info("Sync interval updated: %ss → %ss", old_interval, self.sync_interval)
+    
+    async def upload_loop(self):
+        """Upload the spool whenever a reading arrives or the retry backoff expires"""
+        while self.running:
+            timeout = None
+            if self.uploader.next_attempt:
+                timeout = max(0.0, self.uploader.next_attempt - time.time())
+            try:
+                await asyncio.wait_for(self._upload_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._upload_wakeup.clear()
+            await self._call(self.upload_pending)
+    
+    async def run_async(self):
+        """Run sampling, config refresh and upload as independent tasks"""
         logger.info("=" * 60)
-        logger.info("Plant Sensor Bridge - Starting")
+        logger.info("Plant Sensor Bridge - Starting (%s)", self.name)
         logger.info("=" * 60)
         
         # Get sensor interval from database settings
-        self.get_sensor_interval()
+        await self._call(self.get_sensor_interval)
         
         # Get active plant configuration
-        if not self.get_active_plant():
-            logger.error("Failed to get active plant configuration. Exiting.")
+        if not await self._call(self.get_active_plant):
+            logger.error("[%s] Failed to get active plant configuration. Exiting.", self.name)
             return
         
         self.running = True
-        logger.info(f"Sync interval: {self.sync_interval} seconds")
-        logger.info("Press Ctrl+C to stop")
-        logger.info("")
-        
-        last_interval_check = time.time()
-        interval_check_frequency = 60  # Check for interval changes every 60 seconds
+        self._upload_wakeup = asyncio.Event()
+        self._upload_wakeup.set()  # replay anything left in the spool right away
+        logger.info("Sync interval: %s seconds", self.sync_interval)
+        if self.aggregator:
+            logger.info("Sampling every %ss, uploading rollups for %s windows", RAW_SAMPLE_INTERVAL,
+                        ", ".join(f"{w}s" for w in self.aggregator.windows))
         
+        tasks = [
+            asyncio.create_task(self.sample_loop(), name=f"{self.name}-sample"),
+            asyncio.create_task(self.config_loop(), name=f"{self.name}-config"),
+            asyncio.create_task(self.upload_loop(), name=f"{self.name}-upload")
+        ]
         try:
-            while self.running:
-                # Periodically refresh the sync interval from database
-                if time.time() - last_interval_check >= interval_check_frequency:
-                    old_interval = self.sync_interval
-                    self.get_sensor_interval()
-                    if old_interval != self.sync_interval:
-                        logger.info(f"Sync interval updated: {old_interval}s → {self.sync_interval}s")
-                    last_interval_check = time.time()
-                
-                # Get sensor data from Arduino bridge
-                sensor_data = self.get_sensor_data()
-                
-                if sensor_data:
-                    # Display threshold comparison
-                    self.check_thresholds(sensor_data)
-                    
-                    # Sync with plant monitoring system
-                    self.sync_sensor_data(sensor_data)
-                else:
-                    logger.warning("No sensor data available from Arduino bridge")
-                
-                # Wait for next sync using dynamic interval
-                time.sleep(self.sync_interval)
-                
-        except KeyboardInterrupt:
-            logger.info("\nShutting down gracefully...")
-            self.running = False
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            await asyncio.gather(*tasks)
+        finally:
             self.running = False
+            for task in tasks:
+                task.cancel()
+    
+    def run(self):
+        """Main loop"""
+        run_bridges([self])
+
+async def _run_all(bridges=None):
+    # One I/O pool for every bridge; the shared Session pools their connections
+    executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="bridge-io")
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(executor)
+    bridges = bridges or []
+    try:
+        if not bridges:
+            bridges.extend(await loop.run_in_executor(executor, discover_bridges, ARDUINO_BRIDGE_URL, executor))
+        await asyncio.gather(*(bridge.run_async() for bridge in bridges))
+    finally:
+        for bridge in bridges:
+            bridge.running = False
+        executor.shutdown(wait=False)
+
+def start_metrics_exporter(port=METRICS_PORT):
+    """Serve /metrics for every bridge in this process (port 0 disables it)"""
+    if not port:
+        return None
+    try:
+        server = start_http_server(metrics, port)
+    except OSError as e:
+        logger.warning("Metrics exporter disabled, port %s unavailable: %s", port, e)
+        return None
+    logger.info("📈 Metrics: http://127.0.0.1:%s/metrics", port)
+    return server
+
+def run_bridges(bridges=None):
+    """Drive one or many bridges (e.g. one per plant) from a single event loop
+    
+    Without bridges, one is discovered per device on the Arduino bridge.
+    """
+    logger.info("Press Ctrl+C to stop")
+    try:
+        asyncio.run(_run_all(bridges))
+    except KeyboardInterrupt:
+        logger.info("\nShutting down gracefully...")
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+
+def discover_bridges(bridge_url=ARDUINO_BRIDGE_URL, executor=None):
+    """One bridge per serial device on the Arduino bridge, sharing a session and _run_all's pool"""
+    session = create_session()
+    try:
+        response = session.get(f"{bridge_url}/devices", timeout=5)
+        device_list = response.json().get('devices', []) if response.status_code == 200 else []
+    except Exception as e:
+        logger.warning("Could not list devices (%s), using the default device", e)
+        device_list = []
+    
+    if len(device_list) <= 1:
+        return [PlantSensorBridge(session=session, executor=executor, bridge_url=bridge_url)]
+    return [
+        PlantSensorBridge(name=device['id'], session=session, executor=executor,
+                          bridge_url=bridge_url, device_id=device['id'],
+                          plant_id=device.get('plant_id'))
+        for device in device_list
+    ]
 
 if __name__ == "__main__":
-    bridge = PlantSensorBridge()
-    bridge.run()
+    start_metrics_exporter()
+    run_bridges()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Service Logging
+Non-blocking logging shared by arduino_bridge.py and plant_sensor_bridge.py.
+Records go through a QueueHandler to one QueueListener thread that formats
+and writes them, so a slow console or log file never stalls a serial read
+or an upload. Repeated messages are rate-limited per call site, and each
+component's verbosity can be set from the environment:
+
+    ARDUINO_LOG_LEVEL=WARNING
+    ARDUINO_LOG_LEVELS=arduino_bridge.serial=DEBUG,werkzeug=WARNING
+    ARDUINO_LOG_RATE_LIMIT=5/60      # burst/period seconds, 0 disables
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+RATE_LIMIT_BURST = 5        # records per message template...
+RATE_LIMIT_PERIOD = 60.0    # ...per this many seconds
+RATE_LIMIT_MAX_KEYS = 1024  # distinct templates tracked before the table resets
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through `burst` records per message template and period, drop the rest
+
+    Keys on the unformatted template (name, level, msg), which is why the
+    services log with lazy %-style arguments: every reading shares a key.
+    The first record after a quiet period reports how many were dropped.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, period=RATE_LIMIT_PERIOD, max_keys=RATE_LIMIT_MAX_KEYS):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.max_keys = max_keys
+        self.suppressed = 0
+        self._windows = {}  # (name, level, msg) -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and record.created - window[0] < self.period:
+                if window[1] < self.burst:
+                    window[1] += 1
+                    return True
+                window[2] += 1
+                self.suppressed += 1
+                return False
+
+            if len(self._windows) >= self.max_keys:
+                self._windows.clear()
+            dropped = window[2] if window is not None else 0
+            self._windows[key] = [record.created, 1, 0]
+        if dropped:
+            record.msg = "%s (%d similar message(s) suppressed in the last %ds)" % (
+                record.getMessage(), dropped, self.period)
+            record.args = None
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves %-formatting to the listener thread
+
+    The stock handler formats in the caller's thread; the services only pass
+    numbers and strings as arguments, so the record can be queued as is.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)  # tracebacks must be rendered here
+        return record
+
+
+class ServiceQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() may be called more than once (e.g. again at exit)"""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def parse_levels(spec):
+    """"name=LEVEL,name=LEVEL" -> {name: level}"""
+    levels = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = entry.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(env_prefix, level=logging.INFO, fmt=LOG_FORMAT, stream=None):
+    """Route all logging through a background listener; returns the filter and listener
+
+    env_prefix selects the service's settings, e.g. "ARDUINO" reads
+    ARDUINO_LOG_LEVEL, ARDUINO_LOG_LEVELS and ARDUINO_LOG_RATE_LIMIT.
+    """
+    root = logging.getLogger()
+    root.setLevel(os.environ.get(f"{env_prefix}_LOG_LEVEL", logging.getLevelName(level)).upper())
+    for name, component_level in parse_levels(os.environ.get(f"{env_prefix}_LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(component_level)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(fmt))
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+
+    rate_limit = None
+    burst, _, period = os.environ.get(f"{env_prefix}_LOG_RATE_LIMIT",
+                                      f"{RATE_LIMIT_BURST}/{RATE_LIMIT_PERIOD:g}").partition("/")
+    if int(burst or 0) > 0:
+        rate_limit = RateLimitFilter(int(burst), float(period or RATE_LIMIT_PERIOD))
+        handler.addFilter(rate_limit)
+
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    listener = ServiceQueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # flush what is still queued on exit
+    return rate_limit, listener
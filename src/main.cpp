@@ -33,6 +33,76 @@ const int MAX_DHT_ERRORS = 5;
 bool dhtSensorAvailable = true;
 bool systemInitialized = false;
 
+// ----- SERIAL FRAMING -----
+// Text lines by default; the bridge sends "MODE BIN" to switch to compact
+// binary frames (12 bytes instead of ~55, with a sequence number and CRC)
+// and "MODE TEXT" to switch back.
+bool binaryFraming = false;
+uint16_t frameSeq = 0;
+char commandBuffer[16];
+uint8_t commandLength = 0;
+const uint8_t FRAME_FLAG_SIMULATED = 0x01;
+
+// CRC-16/XMODEM (poly 0x1021, init 0) - matches binascii.crc_hqx(data, 0)
+uint16_t crc16Xmodem(const uint8_t* data, uint8_t length) {
+  uint16_t crc = 0;
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Frame (little-endian): 0xAA 0x55 | flags | seq u16 | temp x10 i16 | humidity x10 u16 | soil u8 | crc u16
+void sendFrame(float temperature, float humidity, int soilPercent, bool simulated) {
+  int16_t temp10 = (int16_t)lround(temperature * 10);
+  uint16_t hum10 = (uint16_t)lround(humidity * 10);
+  uint8_t frame[12];
+  frame[0] = 0xAA;
+  frame[1] = 0x55;
+  frame[2] = simulated ? FRAME_FLAG_SIMULATED : 0;
+  frame[3] = frameSeq & 0xFF;
+  frame[4] = frameSeq >> 8;
+  frame[5] = temp10 & 0xFF;
+  frame[6] = (uint16_t)temp10 >> 8;
+  frame[7] = hum10 & 0xFF;
+  frame[8] = hum10 >> 8;
+  frame[9] = (uint8_t)soilPercent;
+  uint16_t crc = crc16Xmodem(frame + 2, 8);
+  frame[10] = crc & 0xFF;
+  frame[11] = crc >> 8;
+  Serial.write(frame, sizeof(frame));
+  frameSeq++;
+}
+
+// Read "MODE BIN" / "MODE TEXT" commands from the bridge without blocking
+void handleSerialCommands() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\r') {
+      continue;
+    }
+    if (c != '\n') {
+      if (commandLength < sizeof(commandBuffer) - 1) {
+        commandBuffer[commandLength++] = c;
+      }
+      continue;
+    }
+    commandBuffer[commandLength] = '\0';
+    commandLength = 0;
+    if (strcmp(commandBuffer, "MODE BIN") == 0) {
+      Serial.println("MODE BIN OK");  // last text line before binary frames
+      binaryFraming = true;
+      frameSeq = 0;
+    } else if (strcmp(commandBuffer, "MODE TEXT") == 0) {
+      binaryFraming = false;
+      Serial.println("MODE TEXT OK");
+    }
+  }
+}
+
 void setup() {
   // Initialize serial communication
   Serial.begin(9600);
@@ -70,6 +140,8 @@ void setup() {
 }
 
 void loop() {
+  handleSerialCommands();
+  
   unsigned long currentTime = millis();
   
   // Check if it's time for a new reading
@@ -118,6 +190,11 @@ void loop() {
     int soilPercent = map(soilRaw, SOIL_DRY, SOIL_WET, 0, 100);
     soilPercent = constrain(soilPercent, 0, 100); // Ensure 0-100% range
     
+    if (binaryFraming) {
+      sendFrame(temperature, humidity, soilPercent, !dhtSensorAvailable);
+      return;
+    }
+    
     // Output formatted data for Python bridge (EXACT format expected)
     Serial.print("Temp: ");
     Serial.print(temperature, 1); // 1 decimal place
@@ -170,4 +247,7 @@ void loop() {
  * "Temp: 24.5 °C | Humidity: 65.2 % | Soil Moisture: 45 %"
  * 
  * This format is parsed by arduino_bridge.py
+ * 
+ * After "MODE BIN" from the bridge, readings are sent as 12-byte binary
+ * frames instead (see sendFrame() and FrameDecoder in arduino_bridge.py).
  */
\ No newline at end of file
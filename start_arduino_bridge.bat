@@ -15,10 +15,10 @@ if errorlevel 1 (
 
 REM Check if required packages are installed
 echo Checking Python packages...
-python -c "import flask, serial" >nul 2>&1
+python -c "import flask, serial, numpy" >nul 2>&1
 if errorlevel 1 (
     echo Installing required Python packages...
-    pip install flask pyserial
+    pip install flask pyserial numpy
     if errorlevel 1 (
         echo ERROR: Failed to install required packages
         pause
@@ -4,18 +4,50 @@ YOLO Pest Detection Service - Flask Version
 Persistent service that keeps the model loaded in memory for faster detection.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from ultralytics import YOLO
-import io
-from PIL import Image
+from werkzeug.exceptions import HTTPException
+import ast
+import atexit
+import multiprocessing
+import multiprocessing.connection
 import os
 import sys
 import uuid
-from datetime import datetime
+import hashlib
+import json
+import queue
+import sqlite3
+import zipfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from datetime import datetime, timezone
+
+from service_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
 
 app = Flask(__name__)
 
+# Upload limits: reject by Content-Length before reading, and hard-cap the
+# multipart stream so oversized bodies are never buffered
+MAX_IMAGE_BYTES = 10 * 1024 * 1024      # max 10MB per image
+MAX_IMAGE_PIXELS = 40_000_000           # refuse decompression bombs before decoding
+MULTIPART_OVERHEAD = 64 * 1024          # room for form fields and part headers
+MODEL_INPUT_SIZE = 640                  # YOLO input size, JPEGs are decoded straight to ~this
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DETECT_MAX_CONTENT_LENGTH = MAX_IMAGE_BYTES + MULTIPART_OVERHEAD
+
+# /detect/batch limits
+BATCH_REQUEST_MAX_IMAGES = 32
+BATCH_REQUEST_MAX_BYTES = 100 * 1024 * 1024   # whole multipart body or zip
+BATCH_REQUEST_TIMEOUT = 120                   # seconds for all images of one request
+BATCH_MAX_CONTENT_LENGTH = BATCH_REQUEST_MAX_BYTES + MULTIPART_OVERHEAD
+
+# Hard cap on the streamed body of every request, including chunked uploads
+# without a Content-Length; only /detect/batch raises it (per request)
+app.config['MAX_CONTENT_LENGTH'] = DETECT_MAX_CONTENT_LENGTH
+
 # Enable CORS for all routes
 CORS(app, resources={
     r"/*": {
@@ -29,52 +61,1795 @@ CORS(app, resources={
     }
 })
 
-# Global model variable
+# Global model variable (an inference backend, see create_backend)
 model = None
 
-def load_model():
-    """Load YOLO model at startup"""
+# Prometheus metrics (/metrics). Label children are bound once here so the
+# hot path only does a bucket lookup and an add. Backend stages (inference,
+# postprocess) are recorded in-process only; in process mode they stay in
+# the workers and engine_wait covers queueing plus inference instead.
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("yolo_stage_seconds", "Time spent per detection stage", ["stage"])
+decode_seconds = stage_seconds.labels("decode")
+inference_seconds = stage_seconds.labels("inference")
+postprocess_seconds = stage_seconds.labels("postprocess")
+annotation_seconds = stage_seconds.labels("annotation")
+disk_write_seconds = stage_seconds.labels("disk_write")
+engine_wait_seconds = metrics.histogram("yolo_engine_wait_seconds",
+                                        "Time a /detect image waits for its detections (queue + inference)")
+batch_size_histogram = metrics.histogram("yolo_batch_size", "Images per model call",
+                                         buckets=(1, 2, 4, 8, 16, 32))
+request_seconds = metrics.histogram("yolo_request_seconds", "HTTP request latency", ["endpoint"])
+requests_total = metrics.counter("yolo_requests", "HTTP requests by endpoint and status", ["endpoint", "status"])
+images_total = metrics.counter("yolo_images", "Images run through the model")
+detections_total = metrics.counter("yolo_detections", "Pests detected")
+annotation_errors_total = metrics.counter("yolo_annotation_errors", "Annotated images that failed to write")
+video_frames_total = metrics.counter("yolo_video_frames", "Video frames by outcome", ["stream", "outcome"])
+
+# Inference backend: pytorch (ultralytics, default) or onnx (onnxruntime, CPU)
+MODEL_BACKEND = os.environ.get("YOLO_BACKEND", "pytorch")
+PT_MODEL_PATH = "best.pt"
+ONNX_MODEL_PATH = "best.onnx"
+ONNX_INT8_MODEL_PATH = "best.int8.onnx"
+MODEL_PATH = os.environ.get("YOLO_MODEL_PATH",
+                            ONNX_MODEL_PATH if MODEL_BACKEND == "onnx" else PT_MODEL_PATH)
+ONNX_THREADS = int(os.environ.get("YOLO_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+CONF_THRESHOLD = 0.25   # same defaults as ultralytics predict()
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+
+# Startup: "background" binds the HTTP server first and loads/warms the model
+# in a thread (/health reports "loading"), "blocking" loads before binding
+STARTUP_MODE = os.environ.get("YOLO_STARTUP_MODE", "background")
+startup = {
+    "state": "starting",   # starting, loading, ready or error
+    "error": None,
+    "import_s": None,      # heavy backend imports (torch/ultralytics or onnxruntime)
+    "load_s": None,        # reading the weights
+    "warmup_s": None,      # first dummy inference
+    "total_s": None
+}
+
+# Micro-batching configuration (override with environment variables)
+BATCH_MAX_SIZE = int(os.environ.get("YOLO_BATCH_MAX_SIZE", "8"))          # images per model call
+BATCH_MAX_WAIT_MS = float(os.environ.get("YOLO_BATCH_MAX_WAIT_MS", "15"))  # max wait to fill a batch
+DETECT_TIMEOUT = 30  # seconds a request waits for its batch to finish
+
+
+def result_to_detections(result):
+    """Convert a YOLO result into plain (class_id, confidence, [x1, y1, x2, y2]) tuples"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    
+    class_ids = boxes.cls.tolist()
+    confidences = boxes.conf.tolist()
+    coordinates = boxes.xyxy.tolist()
+    return [
+        (int(class_id), float(confidence), xyxy)
+        for class_id, confidence, xyxy in zip(class_ids, confidences, coordinates)
+    ]
+
+
+def format_pests(detections, scale=(1.0, 1.0)):
+    """Build the /detect "pests" list from detection tuples
+
+    scale maps decoded-image coordinates back to the original upload when
+    the JPEG was downscaled on decode.
+    """
+    scale_x, scale_y = scale
+    pests = []
+    for class_id, confidence, xyxy in detections:
+        pests.append({
+            "type": model.names[class_id],
+            "confidence": round(confidence * 100, 1),
+            "bbox": {
+                "x1": round(xyxy[0] * scale_x, 2),
+                "y1": round(xyxy[1] * scale_y, 2),
+                "x2": round(xyxy[2] * scale_x, 2),
+                "y2": round(xyxy[3] * scale_y, 2)
+            }
+        })
+    return pests
+
+
+def nms(boxes, scores, iou_threshold, metric="iou"):
+    """Greedy non-maximum suppression over Nx4 xyxy boxes, returns kept indices
+
+    metric="ios" (intersection over the smaller box) also suppresses the
+    partial boxes an object cut by a tile edge leaves inside a larger box.
+    """
+    import numpy as np
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        inter_w = (np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        if metric == "ios":
+            overlap = inter / (np.minimum(areas[best], areas[rest]) + 1e-9)
+        else:
+            overlap = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class UltralyticsBackend:
+    """Default backend: ultralytics YOLO on PyTorch"""
+
+    name = "pytorch"
+
+    @staticmethod
+    def import_dependencies():
+        import ultralytics  # noqa: F401 (pulls in torch)
+
+    def __init__(self, model_path, threads=None):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+
+    def predict(self, images):
+        """Run a batch of PIL images or RGB arrays, returns one detection list per image"""
+        # ultralytics reads numpy input as BGR: flip the channel axis (a view, no copy)
+        images = [image[:, :, ::-1] if hasattr(image, "shape") else image for image in images]
+        results = self.model(images, verbose=False,
+                             conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, max_det=MAX_DETECTIONS)
+        started = time.perf_counter()
+        detections = [result_to_detections(result) for result in results]
+        postprocess_seconds.observe_since(started)
+        return detections
+
+
+class OnnxBackend:
+    """Exported YOLOv8 ONNX model (FP32 or INT8) on onnxruntime's CPU provider"""
+
+    name = "onnx"
+
+    @staticmethod
+    def import_dependencies():
+        import numpy  # noqa: F401
+        import onnxruntime  # noqa: F401
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if threads or ONNX_THREADS:
+            options.intra_op_num_threads = threads or ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports take exactly one image per run; dynamic ones take a batch
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        imgsz = ast.literal_eval(metadata["imgsz"]) if "imgsz" in metadata else None
+        if imgsz is None and isinstance(model_input.shape[2], int):
+            imgsz = [model_input.shape[2], model_input.shape[3]]
+        self.input_height, self.input_width = imgsz or (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+
+    def _letterbox(self, image):
+        """Resize keeping aspect ratio and pad to the input size, like ultralytics"""
+        import cv2
+        import numpy as np
+
+        pixels = image if isinstance(image, np.ndarray) else np.asarray(image.convert('RGB'))
+        height, width = pixels.shape[:2]
+        ratio = min(self.input_height / height, self.input_width / width)
+        new_width, new_height = round(width * ratio), round(height * ratio)
+        pad_x = (self.input_width - new_width) / 2
+        pad_y = (self.input_height - new_height) / 2
+        
+        if (new_width, new_height) != (width, height):
+            pixels = cv2.resize(pixels, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        top, bottom = round(pad_y - 0.1), round(pad_y + 0.1)
+        left, right = round(pad_x - 0.1), round(pad_x + 0.1)
+        pixels = cv2.copyMakeBorder(pixels, top, bottom, left, right,
+                                    cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        return pixels, ratio, (left, top), (width, height)
+
+    def _postprocess(self, output, ratio, padding, size):
+        """Decode one (4 + classes, anchors) output into detection tuples"""
+        import numpy as np
+
+        predictions = output.T
+        scores = predictions[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        mask = confidences > CONF_THRESHOLD
+        if not mask.any():
+            return []
+        
+        xywh = predictions[mask, :4]
+        class_ids, confidences = class_ids[mask], confidences[mask]
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+        
+        # Class-aware NMS by offsetting each class into its own coordinate range
+        keep = nms(boxes + class_ids[:, None] * 7680.0, confidences, IOU_THRESHOLD)[:MAX_DETECTIONS]
+        
+        # Undo the letterbox back to decoded-image coordinates
+        boxes = boxes[keep]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - padding[0]) / ratio).clip(0, size[0])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - padding[1]) / ratio).clip(0, size[1])
+        return [
+            (int(class_id), float(confidence), xyxy)
+            for class_id, confidence, xyxy in zip(class_ids[keep], confidences[keep], boxes.tolist())
+        ]
+
+    def predict(self, images):
+        """Run a batch of PIL images or RGB arrays, returns one detection list per image"""
+        import numpy as np
+
+        prepared = [self._letterbox(image) for image in images]
+        step = self.fixed_batch or len(prepared)
+        detections = []
+        for start in range(0, len(prepared), step):
+            chunk = prepared[start:start + step]
+            blob = np.stack([pixels for pixels, _, _, _ in chunk]).transpose(0, 3, 1, 2)
+            blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+            started = time.perf_counter()
+            for output, (_, ratio, padding, size) in zip(outputs, chunk):
+                detections.append(self._postprocess(output, ratio, padding, size))
+            postprocess_seconds.observe_since(started)
+        return detections
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend
+}
+
+
+def create_backend(backend=None, model_path=None, threads=None):
+    """Instantiate the configured inference backend"""
+    backend = backend or MODEL_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown YOLO backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[backend](model_path or MODEL_PATH, threads=threads)
+
+
+def warm_up(backend):
+    """Run one dummy inference so the first real /detect doesn't pay for lazy init"""
+    from PIL import Image
+
+    blank = Image.new('RGB', (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), (114, 114, 114))
+    backend.predict([blank])
+
+
+def export_onnx(int8=False):
+    """Export best.pt to ONNX (dynamic batch) and optionally INT8-quantize the weights"""
+    from ultralytics import YOLO
+
+    exported = YOLO(PT_MODEL_PATH).export(format="onnx", imgsz=MODEL_INPUT_SIZE,
+                                          dynamic=True, simplify=True)
+    print(f"✓ Exported ONNX model: {exported}")
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(exported, ONNX_INT8_MODEL_PATH, weight_type=QuantType.QUInt8)
+        print(f"✓ Quantized INT8 model: {ONNX_INT8_MODEL_PATH}")
+
+
+class InferenceBatcher:
+    """Queues /detect images and runs them through the model in micro-batches"""
+
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._errors = 0
+        self._last_batch_size = 0
+        self._last_batch_ms = 0.0
+        self._total_wait_ms = 0.0
+        self._size_counts = [0] * (self.max_batch_size + 1)
+
+    def start(self):
+        """Start the background batching worker (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, image):
+        """Queue one image, returns a Future resolved with its detection tuples"""
+        future = Future()
+        self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        """Block for the first image, then fill the batch until full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Deadline passed: only take what is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Worker loop: one batched model call per collected batch"""
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            images = [item[0] for item in batch]
+
+            try:
+                detections = model.predict(images)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += len(batch)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            inference_seconds.observe(finished - started)
+            batch_size_histogram.observe(len(batch))
+            for (_, future, _), image_detections in zip(batch, detections):
+                future.set_result(image_detections)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(batch)
+                self._last_batch_size = len(batch)
+                self._last_batch_ms = (finished - started) * 1000
+                self._total_wait_ms += sum((started - queued) * 1000 for _, _, queued in batch)
+                self._size_counts[len(batch)] += 1
+
+    def stats(self):
+        """Queue depth and batch-size statistics for /health"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "images": self._images,
+                "errors": self._errors,
+                "avg_batch_size": round(self._images / self._batches, 2) if self._batches else 0,
+                "last_batch_size": self._last_batch_size,
+                "last_batch_ms": round(self._last_batch_ms, 1),
+                "avg_queue_wait_ms": round(self._total_wait_ms / self._images, 1) if self._images else 0,
+                "batch_size_counts": {
+                    str(size): count for size, count in enumerate(self._size_counts) if count
+                }
+            }
+
+
+# Multi-process serving configuration (override with environment variables)
+SERVING_MODE = os.environ.get("YOLO_SERVING_MODE", "thread")  # thread or process
+WORKER_COUNT = int(os.environ.get("YOLO_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+WORKER_RESTART_DELAY = 2  # seconds before a crashed worker is restarted
+
+
+def _inference_worker(worker_id, task_queue, result_conn, torch_threads, max_batch_size):
+    """Worker process: run the model on tasks from its own queue until told to stop
+
+    Results go back over the worker's own pipe, so a worker killed mid-send
+    can only break its own channel, never the other workers'.
+    """
     global model
-    model_path = "best.pt"
     
-    if not os.path.exists(model_path):
-        print(f"ERROR: Model file not found: {model_path}", file=sys.stderr)
-        sys.exit(1)
+    # One worker per core slice: stop each process from spawning a thread per core
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except Exception:
+        pass
+    
+    try:
+        # Spawned workers start from a fresh interpreter and load their own weights
+        model = create_backend(threads=torch_threads)
+    except Exception as e:
+        result_conn.send(("fatal", worker_id, None, f"Failed to load model: {e}"))
+        return
+    result_conn.send(("ready", worker_id, os.getpid(), None))
+    
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        tasks = [task]
+        # Drain whatever is already queued into one batched call
+        while len(tasks) < max_batch_size:
+            try:
+                task = task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                task_queue.put(None)
+                break
+            tasks.append(task)
+        
+        try:
+            detections = model.predict([image for _, image in tasks])
+            for (task_id, _), image_detections in zip(tasks, detections):
+                result_conn.send(("result", worker_id, task_id, image_detections))
+        except Exception as e:
+            for task_id, _ in tasks:
+                result_conn.send(("error", worker_id, task_id, str(e)))
+
+
+class WorkerPool:
+    """Dispatches /detect images to K inference processes and restarts crashed ones"""
+
+    def __init__(self, worker_count=WORKER_COUNT, max_batch_size=BATCH_MAX_SIZE):
+        self.worker_count = max(1, worker_count)
+        self.max_batch_size = max(1, max_batch_size)
+        # Always spawn, for the first start as for restarts: a child forked after
+        # torch is imported and warmed can hang in inherited OpenMP/MKL thread
+        # pools, and a fork of the multithreaded server could inherit held locks
+        self.start_method = "spawn"
+        self._ctx = multiprocessing.get_context(self.start_method)
+        self._workers = []
+        self._pending = {}  # task_id -> (worker index, Future)
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._next_task_id = 0
+        self._torch_threads = max(1, (os.cpu_count() or 1) // self.worker_count)
+
+    def start(self):
+        """Start all worker processes plus the result collector and supervisor threads"""
+        for index in range(self.worker_count):
+            self._workers.append({
+                "id": index,
+                "process": None,
+                "queue": None,
+                "conn": None,
+                "state": "starting",
+                "pid": None,
+                "inflight": 0,
+                "completed": 0,
+                "errors": 0,
+                "restarts": 0,
+                "last_error": None,
+                "started_at": None
+            })
+            self._spawn(index)
+        threading.Thread(target=self._collect, name="yolo-pool-results", daemon=True).start()
+        threading.Thread(target=self._supervise, name="yolo-pool-supervisor", daemon=True).start()
+        atexit.register(self.close)
+
+    def _spawn(self, index):
+        """Start the process for worker `index` (never called with the lock held)"""
+        task_queue = self._ctx.Queue()
+        receiver, sender = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_inference_worker,
+            args=(index, task_queue, sender, self._torch_threads, self.max_batch_size),
+            name=f"yolo-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        sender.close()  # the child holds the only write end: its exit reads as EOF
+        with self._lock:
+            worker = self._workers[index]
+            old_conn = worker["conn"]
+            worker.update(process=process, queue=task_queue, conn=receiver, state="starting",
+                          pid=process.pid, inflight=0,
+                          started_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        if old_conn is not None:
+            old_conn.close()
+
+    def submit(self, image):
+        """Send an image to the least-loaded live worker, returns a Future of detections"""
+        future = Future()
+        with self._lock:
+            candidates = [w for w in self._workers if w["state"] == "ready"] or \
+                         [w for w in self._workers if w["state"] == "starting"]
+            if self._closing.is_set() or not candidates:
+                future.set_exception(RuntimeError("No inference workers available"))
+                return future
+            worker = min(candidates, key=lambda w: w["inflight"])
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._pending[task_id] = (worker["id"], future)
+            worker["inflight"] += 1
+            task_queue = worker["queue"]
+        task_queue.put((task_id, image))
+        return future
+
+    def _collect(self):
+        """Resolve futures from the workers' result pipes"""
+        while not self._closing.is_set():
+            with self._lock:
+                connections = {w["conn"]: w["id"] for w in self._workers if w["conn"] is not None}
+            if not connections:
+                time.sleep(0.5)
+                continue
+            # Short timeout so pipes of restarted workers are picked up
+            for conn in multiprocessing.connection.wait(list(connections), timeout=0.5):
+                try:
+                    kind, _, payload, data = conn.recv()
+                except (EOFError, OSError):
+                    # Worker exited; the supervisor fails its requests and restarts it
+                    with self._lock:
+                        worker = self._workers[connections[conn]]
+                        if worker["conn"] is conn:
+                            worker["conn"] = None
+                    conn.close()
+                    continue
+                self._resolve(connections[conn], kind, payload, data)
+
+    def _resolve(self, index, kind, payload, data):
+        with self._lock:
+            worker = self._workers[index]
+            if kind == "ready":
+                worker["state"] = "ready"
+                return
+            if kind == "fatal":
+                worker["state"] = "failed"
+                worker["last_error"] = data
+                return
+            
+            pending = self._pending.pop(payload, None)
+            if pending is None:
+                return  # the worker was already declared dead
+            worker["inflight"] = max(0, worker["inflight"] - 1)
+            if kind == "result":
+                worker["completed"] += 1
+            else:
+                worker["errors"] += 1
+                worker["last_error"] = data
+        
+        future = pending[1]
+        if kind == "result":
+            future.set_result(data)
+        else:
+            future.set_exception(RuntimeError(data))
+
+    def _supervise(self):
+        """Restart workers whose process died and fail their in-flight requests"""
+        while not self._closing.wait(1):
+            for worker in self._workers:
+                process = worker["process"]
+                if process is None or process.is_alive():
+                    continue
+                # Workers also die at interpreter shutdown; don't bring them back
+                if self._closing.is_set() or sys.is_finalizing():
+                    return
+                
+                with self._lock:
+                    if worker["state"] == "failed":
+                        continue  # could not load the model: restarting won't help
+                    lost = [task_id for task_id, (index, _) in self._pending.items()
+                            if index == worker["id"]]
+                    futures = [self._pending.pop(task_id)[1] for task_id in lost]
+                    worker["state"] = "restarting"
+                    worker["restarts"] += 1
+                    worker["last_error"] = f"Process exited with code {process.exitcode}"
+                for future in futures:
+                    future.set_exception(RuntimeError("Inference worker crashed"))
+                
+                print(f"WARNING: YOLO worker {worker['id']} exited "
+                      f"(code {process.exitcode}), restarting...", file=sys.stderr)
+                if self._closing.wait(WORKER_RESTART_DELAY):
+                    return
+                self._spawn(worker["id"])
+
+    def close(self, timeout=5):
+        """Stop supervising and shut the workers down (idempotent, also run at exit)"""
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        with self._lock:
+            futures = [future for _, future in self._pending.values()]
+            self._pending.clear()
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker["queue"].put(None)
+            except Exception:
+                pass
+        deadline = time.time() + timeout
+        for worker in workers:
+            process = worker["process"]
+            process.join(max(0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+            worker["state"] = "stopped"
+        for future in futures:
+            future.set_exception(RuntimeError("Worker pool closed"))
+
+    def stats(self):
+        """Per-worker status for /health"""
+        with self._lock:
+            return {
+                "start_method": self.start_method,
+                "torch_threads_per_worker": self._torch_threads,
+                "pending": len(self._pending),
+                "workers": [
+                    {key: value for key, value in worker.items() if key not in ("process", "queue", "conn")}
+                    for worker in self._workers
+                ]
+            }
+
+
+# Shared batching queue in front of the model (thread mode)
+batcher = InferenceBatcher()
+
+# Inference processes (process mode), created at startup
+worker_pool = None
+
+
+def get_engine():
+    """Return the active inference engine: the worker pool or the in-process batcher"""
+    return worker_pool if worker_pool is not None else batcher
+
+metrics.gauge("yolo_model_loaded", "1 once the model is loaded and warm").set_function(
+    lambda: int(model is not None))
+metrics.gauge("yolo_batch_queue_depth", "Images waiting for the in-process batcher").set_function(
+    lambda: batcher._queue.qsize())
+
+# Annotated image configuration
+DETECTIONS_DIR = 'detections'
+ANNOTATION_WORKERS = int(os.environ.get("YOLO_ANNOTATION_WORKERS", "2"))
+ANNOTATION_JPEG_QUALITY = 90
+ANNOTATION_TRACKED_MAX = 1000  # filenames whose status is remembered
+
+
+class AnnotationWriter:
+    """Draws, encodes and writes annotated images on a background thread pool"""
+
+    def __init__(self, directory=DETECTIONS_DIR, workers=ANNOTATION_WORKERS):
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix="yolo-annotate")
+        self._jobs = OrderedDict()  # filename -> Future
+        self._lock = threading.Lock()
+
+    def reserve_filename(self):
+        """Generate the unique filename returned to the caller before the file exists"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_id = str(uuid.uuid4())[:8]
+        return f"detection_{timestamp}_{unique_id}.jpg"
+
+    def submit(self, image, detections):
+        """Queue an image and its detections for annotation, returns the reserved filename"""
+        filename = self.reserve_filename()
+        future = self._executor.submit(self._write, image, detections, filename)
+        with self._lock:
+            self._jobs[filename] = future
+            while len(self._jobs) > ANNOTATION_TRACKED_MAX:
+                self._jobs.popitem(last=False)
+        return filename
+
+    def _write(self, image, detections, filename):
+        """Draw boxes and write BGR pixels straight to JPEG (no RGB/PIL round trip)"""
+        import cv2
+
+        try:
+            started = time.perf_counter()
+            os.makedirs(self.directory, exist_ok=True)
+            annotated_img = draw_detections(image, detections)
+            filepath = os.path.join(self.directory, filename)
+            temp_path = filepath + ".part"
+            ok, encoded = cv2.imencode('.jpg', annotated_img,
+                                       [cv2.IMWRITE_JPEG_QUALITY, ANNOTATION_JPEG_QUALITY])
+            if not ok:
+                raise RuntimeError("JPEG encoding failed")
+            encoded_at = time.perf_counter()
+            annotation_seconds.observe(encoded_at - started)
+            with open(temp_path, 'wb') as f:
+                f.write(encoded.tobytes())
+            # Atomic rename so the web server never serves a half-written file
+            os.replace(temp_path, filepath)
+            disk_write_seconds.observe_since(encoded_at)
+            return filepath
+        except Exception:
+            annotation_errors_total.inc()
+            raise
+
+    def status(self, filename):
+        """Return (status, error) for a reserved filename"""
+        with self._lock:
+            future = self._jobs.get(filename)
+        if future is None:
+            exists = os.path.exists(os.path.join(self.directory, filename))
+            return ("ready" if exists else "unknown"), None
+        if not future.done():
+            return "pending", None
+        error = future.exception()
+        return ("error", str(error)) if error else ("ready", None)
+
+    def wait(self, filename, timeout):
+        """Block until a pending annotation finishes or the timeout expires"""
+        with self._lock:
+            future = self._jobs.get(filename)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def pending(self):
+        """Number of annotations not yet written"""
+        with self._lock:
+            return sum(1 for future in self._jobs.values() if not future.done())
+
+
+# Background annotation pipeline
+annotator = AnnotationWriter()
+metrics.gauge("yolo_annotations_pending", "Annotated images not yet written").set_function(annotator.pending)
+
+# Box colours (BGR), cycled by class id
+BOX_COLORS = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0)
+]
+
+
+def draw_detections(image, detections):
+    """Return a BGR copy of a PIL image with labelled detection boxes drawn on it"""
+    import cv2
+    import numpy as np
+
+    # Single RGB -> BGR copy; it is the canvas OpenCV draws on and encodes
+    canvas = np.ascontiguousarray(np.asarray(image.convert('RGB'))[:, :, ::-1])
+    line_width = max(round(sum(canvas.shape[:2]) / 2 * 0.003), 2)
+    font_scale = line_width / 3
+    font_thickness = max(line_width - 1, 1)
+    
+    for class_id, confidence, xyxy in detections:
+        color = BOX_COLORS[class_id % len(BOX_COLORS)]
+        x1, y1, x2, y2 = (int(round(v)) for v in xyxy)
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), color, line_width, cv2.LINE_AA)
+        
+        label = f"{model.names[class_id]} {confidence:.2f}"
+        (text_w, text_h), _ = cv2.getTextSize(label, 0, font_scale, font_thickness)
+        above = y1 - text_h - 3 >= 0
+        label_y2 = y1 - text_h - 3 if above else y1 + text_h + 3
+        cv2.rectangle(canvas, (x1, y1), (x1 + text_w, label_y2), color, -1, cv2.LINE_AA)
+        cv2.putText(canvas, label, (x1, y1 - 2 if above else y1 + text_h + 2), 0,
+                    font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA)
+    return canvas
+
+
+# Result cache configuration (override with environment variables)
+CACHE_MODE = os.environ.get("YOLO_CACHE_MODE", "exact")          # exact, perceptual or off
+CACHE_MAX_ENTRIES = int(os.environ.get("YOLO_CACHE_SIZE", "256"))
+CACHE_TTL_SECONDS = float(os.environ.get("YOLO_CACHE_TTL", "300"))
+CACHE_PHASH_DISTANCE = int(os.environ.get("YOLO_CACHE_PHASH_DISTANCE", "4"))  # max differing bits
+
+
+def perceptual_hash(image):
+    """64-bit difference hash (dHash) of a PIL image, robust to re-encoding noise"""
+    small = image.convert('L').resize((9, 8))
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class ResultCache:
+    """LRU/TTL cache of detection results keyed by the hash of the uploaded bytes"""
+
+    def __init__(self, mode=CACHE_MODE, max_entries=CACHE_MAX_ENTRIES,
+                 ttl=CACHE_TTL_SECONDS, phash_distance=CACHE_PHASH_DISTANCE):
+        self.mode = mode if mode in ("exact", "perceptual", "off") else "exact"
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()  # sha256 -> (stored_at, phash, pests, annotated_image)
+        self._lock = threading.Lock()
+        self._model_fingerprint = self._fingerprint()
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "off" and self.max_entries > 0
+
+    @property
+    def perceptual(self):
+        return self.mode == "perceptual"
+
+    def _fingerprint(self):
+        """Identify the weights file on disk so a new best.pt/best.onnx invalidates the cache"""
+        try:
+            stat = os.stat(MODEL_PATH)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _check_model(self):
+        fingerprint = self._fingerprint()
+        if fingerprint != self._model_fingerprint:
+            self._model_fingerprint = fingerprint
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def get(self, key, phash=None, need_annotation=False, record_miss=True):
+        """Return (pests, annotated_image) for an exact or near-duplicate image, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_model()
+            now = time.time()
+            entry = self._entries.get(key)
+            match_key = key
+            
+            if entry is None and phash is not None:
+                # Near-duplicate scan, bounded by the cache size
+                for candidate_key, candidate in self._entries.items():
+                    if candidate[1] is not None and bin(candidate[1] ^ phash).count("1") <= self.phash_distance:
+                        entry, match_key = candidate, candidate_key
+                        break
+            
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._entries[match_key]
+                self.expirations += 1
+                entry = None
+            
+            # A cached result without its annotated image can't serve a request that wants one
+            if entry is None or (need_annotation and entry[2] and entry[3] is None):
+                if record_miss:
+                    self.misses += 1
+                return None
+            
+            self._entries.move_to_end(match_key)
+            if match_key == key:
+                self.hits += 1
+            else:
+                self.perceptual_hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key, pests, annotated_image, phash=None):
+        """Store a detection result, evicting the least recently used entries"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), phash, pests, annotated_image)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters for /info"""
+        with self._lock:
+            lookups = self.hits + self.perceptual_hits + self.misses
+            return {
+                "mode": self.mode,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.perceptual_hits) / lookups, 3) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+# Repeated-frame result cache
+result_cache = ResultCache()
+
+cache_lookups = metrics.counter("yolo_cache_lookups", "Result cache lookups by outcome", ["result"])
+cache_lookups.labels("hit").set_function(lambda: result_cache.hits)
+cache_lookups.labels("perceptual_hit").set_function(lambda: result_cache.perceptual_hits)
+cache_lookups.labels("miss").set_function(lambda: result_cache.misses)
+
+
+# Detection history: every /detect result in an indexed SQLite store (WAL)
+HISTORY_ENABLED = os.environ.get("YOLO_HISTORY", "1") != "0"
+HISTORY_PATH = os.environ.get("YOLO_HISTORY_DB", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "detection_history.db"))
+CAMERA_RECORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "camera_records.json")
+HISTORY_QUEUE_MAX = 10000       # results waiting for the writer before new ones are dropped
+HISTORY_WRITE_BATCH = 500       # results committed per transaction
+HISTORY_QUERY_LIMIT = 100       # default and...
+HISTORY_QUERY_MAX_LIMIT = 1000  # ...maximum records per /history/detections page
+HISTORY_ARDUINO_MAX_BYTES = 4096
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    detected_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    image_path TEXT,
+    annotated_image TEXT,
+    width INTEGER,
+    height INTEGER,
+    pest_count INTEGER NOT NULL,
+    max_confidence REAL NOT NULL,
+    arduino_data TEXT,
+    record_id TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_detections_time ON detections (detected_at);
+CREATE INDEX IF NOT EXISTS idx_detections_confidence ON detections (max_confidence, detected_at);
+CREATE TABLE IF NOT EXISTS pests (
+    detection_id INTEGER NOT NULL REFERENCES detections (id),
+    detected_at REAL NOT NULL,
+    class TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL
+);
+CREATE INDEX IF NOT EXISTS idx_pests_detection ON pests (detection_id);
+CREATE INDEX IF NOT EXISTS idx_pests_class_time ON pests (class, detected_at, confidence);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    class TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, class)
+) WITHOUT ROWID;
+"""
+HISTORY_ALL_IMAGES = ""  # daily_counts class holding the number of images analysed that day
+
+
+def parse_history_time(value):
+    """Epoch seconds, or a local "YYYY-MM-DD[ HH:MM[:SS]]" / ISO 8601 time -> epoch seconds"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    text = value.strip().replace("T", " ")
+    if text.endswith("Z"):
+        return datetime.strptime(text[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text[:19], fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time '{value}'")
+
+
+def capture_record_key(record):
+    """The record's id, or a stable key from its device, time, image and values
+    (so re-importing records saved without an id doesn't duplicate them)"""
+    if record.get("id"):
+        return record["id"]
+    info = record.get("image_info") or {}
+    identity = [record.get("device"), record.get("timestamp") or info.get("created"),
+                record.get("filepath") or record.get("filename"), record.get("arduino_data")]
+    digest = hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode("utf-8"))
+    return "derived-" + digest.hexdigest()[:32]
+
+
+def history_day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class DetectionHistory:
+    """Append-only SQLite index of detection results, queried by time, class and confidence
+
+    Requests only enqueue their result; one writer thread commits the queue
+    in batches, so an append costs the same with ten rows or a million.
+    Per-day counts are rolled up in the same transaction, so daily totals
+    never scan the detections.
+    """
+
+    def __init__(self, path=HISTORY_PATH, queue_max=HISTORY_QUEUE_MAX):
+        self.path = path
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._reader = None
+        self.written = 0
+        self.dropped = 0   # queue full (disk stalled or too slow)
+        self.failed = 0    # rows lost to a database error
+        self.last_error = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(HISTORY_SCHEMA)
+        return db
+
+    def record(self, pests, source="detect", image_path=None, annotated_image=None,
+               size=None, arduino_data=None, detected_at=None):
+        """Queue one result for the writer thread (never blocks the request)"""
+        if not HISTORY_ENABLED:
+            return
+        if self._writer is None:
+            self._start_writer()
+        entry = (detected_at or time.time(), source, image_path, annotated_image,
+                 size, arduino_data, pests, None)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self):
+        # Started on first use, so merely importing the module (as spawned
+        # inference workers do) starts no thread
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="yolo-history", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        db = None
+        while True:
+            entries = [self._queue.get()]
+            while len(entries) < HISTORY_WRITE_BATCH:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if db is None:
+                    db = self._connect()
+                self._insert(db, entries)
+                self.written += len(entries)
+            except Exception as e:
+                self.failed += len(entries)
+                self.last_error = str(e)
+                print(f"⚠️  Detection history write failed: {e}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def _insert(self, db, entries):
+        """Insert entries and update the daily rollup in one transaction; returns rows added"""
+        added = 0
+        daily = {}
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for detected_at, source, image_path, annotated_image, size, arduino_data, pests, record_id in entries:
+                width, height = size or (None, None)
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO detections (detected_at, source, image_path, annotated_image, "
+                    "width, height, pest_count, max_confidence, arduino_data, record_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (detected_at, source, image_path, annotated_image, width, height, len(pests),
+                     max((pest["confidence"] for pest in pests), default=0.0),
+                     json.dumps(arduino_data) if arduino_data is not None else None, record_id))
+                if not cursor.rowcount:
+                    continue  # record_id already imported
+                added += 1
+                detection_id = cursor.lastrowid
+                db.executemany(
+                    "INSERT INTO pests (detection_id, detected_at, class, confidence, x1, y1, x2, y2) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(detection_id, detected_at, pest["type"], pest["confidence"],
+                      pest["bbox"]["x1"], pest["bbox"]["y1"], pest["bbox"]["x2"], pest["bbox"]["y2"])
+                     for pest in pests])
+                day = history_day(detected_at)
+                daily[(day, HISTORY_ALL_IMAGES)] = daily.get((day, HISTORY_ALL_IMAGES), 0) + 1
+                for pest in pests:
+                    daily[(day, pest["type"])] = daily.get((day, pest["type"]), 0) + 1
+            db.executemany(
+                "INSERT INTO daily_counts (day, class, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (day, class) DO UPDATE SET count = count + excluded.count",
+                [(day, pest_class, count) for (day, pest_class), count in daily.items()])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return added
+
+    def flush(self):
+        """Wait until everything queued so far is committed"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def import_records(self, path=CAMERA_RECORDS_PATH):
+        """One-shot import of the capture records JSON; safe to re-run (see capture_record_key)
+
+        Records without a usable time fall back to the image file's mtime and are
+        skipped when that is missing too. Returns (records read, records added,
+        records skipped).
+        """
+        with open(path) as f:
+            records = json.load(f)
+        entries = []
+        skipped = 0
+        for record in records:
+            info = record.get("image_info") or {}
+            arduino_data = record.get("arduino_data")
+            filepath = record.get("filepath") or record.get("filename")
+            timestamp = (record.get("timestamp") or info.get("created")
+                         or (arduino_data or {}).get("timestamp"))
+            try:
+                detected_at = parse_history_time(timestamp)
+            except (ValueError, AttributeError):
+                detected_at = None
+            if detected_at is None:
+                try:
+                    detected_at = os.path.getmtime(filepath)
+                except (TypeError, OSError):
+                    print(f"⚠️  Skipping record {record.get('id') or filepath}: no usable timestamp ({timestamp!r})")
+                    skipped += 1
+                    continue
+            size = (info["width"], info["height"]) if info.get("width") and info.get("height") else None
+            # Capture records carry no detections: imported as images without pests
+            entries.append((detected_at, "camera_records", filepath,
+                            None, size, arduino_data, [], capture_record_key(record)))
+        db = self._connect()
+        try:
+            added = 0
+            for start in range(0, len(entries), HISTORY_WRITE_BATCH):
+                added += self._insert(db, entries[start:start + HISTORY_WRITE_BATCH])
+            db.execute("PRAGMA optimize")
+        finally:
+            db.close()
+        return len(records), added, skipped
+
+    def _read(self, sql, params=()):
+        with self._read_lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            return self._reader.execute(sql, params).fetchall()
+
+    def query(self, start=None, end=None, pest_class=None, min_confidence=None,
+              limit=HISTORY_QUERY_LIMIT, before=None):
+        """Newest-first detections in [start, end), optionally with a pest of pest_class
+        at or above min_confidence (percent). before = (detected_at, id) of the last
+        record of the previous page. Returns (records, next cursor or None).
+        """
+        # Both tables are walked newest-first on a time index and stop after `limit` rows
+        if pest_class is not None:
+            table, id_column, confidence_column = "pests", "detection_id", "confidence"
+            conditions, params = ["class = ?"], [pest_class]
+        else:
+            table, id_column, confidence_column = "detections", "id", "max_confidence"
+            conditions, params = [], []
+        conditions += ["detected_at >= ?", "detected_at < ?"]
+        params += [start if start is not None else float("-inf"),
+                   end if end is not None else float("inf")]
+        if before is not None:
+            conditions.append(f"(detected_at, {id_column}) < (?, ?)")
+            params.extend(before)
+        if min_confidence is not None:
+            conditions.append(f"{confidence_column} >= ?")
+            params.append(min_confidence)
+        rows = self._read(
+            f"SELECT DISTINCT {id_column}, detected_at FROM {table} WHERE {' AND '.join(conditions)} "
+            f"ORDER BY detected_at DESC, {id_column} DESC LIMIT ?", params + [limit])
+        ids = [row[0] for row in rows]
+        records = self._load(ids)
+        next_cursor = f"{rows[-1][1]!r}:{rows[-1][0]}" if len(rows) == limit else None
+        return records, next_cursor
+
+    def _load(self, ids):
+        """Full records (with pests) for detection ids, in the given order"""
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        records = {}
+        for (detection_id, detected_at, source, image_path, annotated_image, width, height,
+             pest_count, arduino_data) in self._read(
+                "SELECT id, detected_at, source, image_path, annotated_image, width, height, "
+                f"pest_count, arduino_data FROM detections WHERE id IN ({placeholders})", ids):
+            records[detection_id] = {
+                "id": detection_id,
+                "detected_at": datetime.fromtimestamp(detected_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "time": detected_at,
+                "source": source,
+                "image_path": image_path,
+                "annotated_image": annotated_image,
+                "width": width,
+                "height": height,
+                "count": pest_count,
+                "pests": [],
+                "arduino_data": json.loads(arduino_data) if arduino_data else None
+            }
+        for detection_id, pest_class, confidence, x1, y1, x2, y2 in self._read(
+                "SELECT detection_id, class, confidence, x1, y1, x2, y2 FROM pests "
+                f"WHERE detection_id IN ({placeholders}) ORDER BY rowid", ids):
+            records[detection_id]["pests"].append({
+                "type": pest_class,
+                "confidence": confidence,
+                "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+            })
+        return [records[detection_id] for detection_id in ids if detection_id in records]
+
+    def daily_counts(self, start_day=None, end_day=None, pest_class=None):
+        """Per-day {"day", "images", "pests", "classes"} from the rollup, oldest first"""
+        sql = "SELECT day, class, count FROM daily_counts WHERE day >= ? AND day <= ?"
+        params = [start_day or "0000-00-00", end_day or "9999-99-99"]
+        if pest_class is not None:
+            sql += " AND class IN (?, ?)"
+            params.extend([HISTORY_ALL_IMAGES, pest_class])
+        days = OrderedDict()
+        for day, day_class, count in self._read(sql + " ORDER BY day", params):
+            entry = days.setdefault(day, {"day": day, "images": 0, "pests": 0, "classes": {}})
+            if day_class == HISTORY_ALL_IMAGES:
+                entry["images"] = count
+            else:
+                entry["pests"] += count
+                entry["classes"][day_class] = count
+        return list(days.values())
+
+    def stats(self):
+        return {
+            "enabled": HISTORY_ENABLED,
+            "path": self.path,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_error": self.last_error
+        }
+
+
+# Detection history store (data/detection_history.db)
+history = DetectionHistory()
+
+history_records = metrics.counter("yolo_history_records", "Detection results by history outcome", ["result"])
+history_records.labels("written").set_function(lambda: history.written)
+history_records.labels("dropped").set_function(lambda: history.dropped)
+history_records.labels("failed").set_function(lambda: history.failed)
+metrics.gauge("yolo_history_queue_depth", "Detection results waiting to be written").set_function(
+    history._queue.qsize)
+
+
+class UploadRejected(Exception):
+    """Upload refused before (or instead of) a full decode"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def hash_upload(stream, limit=MAX_IMAGE_BYTES):
+    """SHA-256 an uploaded file in chunks, enforcing the size cap while reading"""
+    hasher = hashlib.sha256()
+    total = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise UploadRejected(f"Image too large (max {limit // (1024 * 1024)}MB)", 413)
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+def open_upload(stream, target_size=MODEL_INPUT_SIZE):
+    """Decode an uploaded image, checking its header first and downscaling JPEGs on decode
+
+    Returns (image, scale) where scale maps decoded coordinates back to the
+    original image. target_size=None decodes at full resolution.
+    """
+    from PIL import Image
+
+    started = time.perf_counter()
+    try:
+        image = Image.open(stream)  # reads the header only
+    except Exception as e:
+        raise UploadRejected(f"Invalid image format: {str(e)}")
+    
+    original_width, original_height = image.size
+    if original_width * original_height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(
+            f"Image dimensions too large ({original_width}x{original_height}, "
+            f"max {MAX_IMAGE_PIXELS // 1_000_000} megapixels)", 413)
+    
+    # JPEG DCT scaling: decode at 1/2, 1/4 or 1/8 size while staying >= target
+    if target_size and image.format == 'JPEG':
+        image.draft('RGB', (target_size, target_size))
+    
+    try:
+        image.load()
+    except Exception as e:
+        raise UploadRejected(f"Invalid image format: {str(e)}")
+    
+    width, height = image.size
+    decode_seconds.observe_since(started)
+    return image, (original_width / width, original_height / height)
+
+
+def flag_param(name, default):
+    """Read a boolean form/query flag such as annotate=0 or tiled=1"""
+    value = request.values.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def wants_annotation():
+    """Per-request switch: annotate=0/false/no skips the annotated image"""
+    return flag_param('annotate', True)
+
+
+# Sliced (tiled) inference configuration
+TILE_SIZE = 640                  # default tile edge in pixels (the model input size)
+TILE_OVERLAP = 0.2               # default overlap between neighbouring tiles
+TILE_SIZE_RANGE = (128, 2048)
+TILE_MAX_OVERLAP = 0.75
+TILE_MAX_TILES = 64              # 4K at 640px / 20% overlap needs 32 (+1 full frame)
+TILE_MERGE_THRESHOLD = 0.6       # intersection-over-smaller for cross-tile duplicates
+TILE_LATENCY_BUDGET_MS = float(os.environ.get("YOLO_TILE_BUDGET_MS", "8000"))
+
+
+def tiling_params():
+    """Parse tile_size / tile_overlap / tile_full_frame from the request"""
+    try:
+        tile_size = int(request.values.get('tile_size', TILE_SIZE))
+        overlap = float(request.values.get('tile_overlap', TILE_OVERLAP))
+    except ValueError:
+        raise UploadRejected("tile_size must be an integer and tile_overlap a number")
+    if not TILE_SIZE_RANGE[0] <= tile_size <= TILE_SIZE_RANGE[1]:
+        raise UploadRejected(f"tile_size must be between {TILE_SIZE_RANGE[0]} and {TILE_SIZE_RANGE[1]}")
+    if not 0 <= overlap <= TILE_MAX_OVERLAP:
+        raise UploadRejected(f"tile_overlap must be between 0 and {TILE_MAX_OVERLAP}")
+    return tile_size, overlap, flag_param('tile_full_frame', True)
+
+
+def tile_offsets(length, tile_size, overlap):
+    """Start offsets along one axis so tiles of tile_size cover [0, length)"""
+    if length <= tile_size:
+        return [0]
+    stride = max(1, int(tile_size * (1 - overlap)))
+    offsets = list(range(0, length - tile_size, stride))
+    offsets.append(length - tile_size)  # last tile flush with the edge
+    return offsets
+
+
+def detect_tiled(image, tile_size, overlap, full_frame=True, engine=None):
+    """Sliced inference: batch overlapping tiles, merge boxes in original coordinates
+
+    Tiles are numpy views into one RGB array (no per-tile copies on our side)
+    and go through the engine together, so the batcher packs them into
+    full model batches. Returns (detections, tile_count).
+    """
+    import numpy as np
+
+    engine = engine or get_engine()
+    pixels = np.asarray(image.convert('RGB'))
+    height, width = pixels.shape[:2]
+    
+    windows = [(x, y) for y in tile_offsets(height, tile_size, overlap)
+               for x in tile_offsets(width, tile_size, overlap)]
+    if len(windows) > TILE_MAX_TILES:
+        raise UploadRejected(
+            f"Tiling would need {len(windows)} tiles (max {TILE_MAX_TILES}); "
+            f"increase tile_size or lower tile_overlap")
+    
+    futures = [engine.submit(pixels[y:y + tile_size, x:x + tile_size]) for x, y in windows]
+    if full_frame and len(windows) > 1:
+        # The whole frame still catches pests larger than a tile
+        futures.append(engine.submit(image))
+        windows.append((0, 0))
+    
+    deadline = time.perf_counter() + TILE_LATENCY_BUDGET_MS / 1000
+    boxes, scores, class_ids = [], [], []
+    for (offset_x, offset_y), future in zip(windows, futures):
+        remaining = max(0.0, deadline - time.perf_counter())
+        for class_id, confidence, xyxy in future.result(timeout=remaining):
+            boxes.append((xyxy[0] + offset_x, xyxy[1] + offset_y,
+                          xyxy[2] + offset_x, xyxy[3] + offset_y))
+            scores.append(confidence)
+            class_ids.append(class_id)
+    
+    if not boxes:
+        return [], len(windows)
+    
+    boxes = np.array(boxes, dtype=np.float32)
+    scores = np.array(scores, dtype=np.float32)
+    class_ids = np.array(class_ids, dtype=np.int64)
+    # Cross-tile NMS per class (class offset keeps classes apart)
+    offset = class_ids[:, None] * float(max(width, height) + 1)
+    keep = nms(boxes + offset, scores, TILE_MERGE_THRESHOLD, metric="ios")[:MAX_DETECTIONS]
+    return [
+        (int(class_ids[i]), float(scores[i]), boxes[i].tolist()) for i in keep
+    ], len(windows)
+
+# Continuous video detection (override with environment variables)
+VIDEO_SOURCES = os.environ.get("YOLO_VIDEO_SOURCES", "")  # "name=source,...": file, MJPEG/RTSP URL or camera index
+VIDEO_FRAME_SKIP = int(os.environ.get("YOLO_VIDEO_FRAME_SKIP", "10"))         # infer every k-th frame, 0 = motion only
+VIDEO_MOTION_THRESHOLD = float(os.environ.get("YOLO_VIDEO_MOTION", "0.02"))  # changed-pixel fraction, 0 = off
+VIDEO_MOTION_SIZE = 64          # edge of the grayscale thumbnail compared for motion
+VIDEO_MOTION_PIXEL_DELTA = 25   # grey levels a thumbnail pixel must change by to count as motion
+VIDEO_EVENTS_MAX = 200          # recent detection events kept per stream
+VIDEO_RECONNECT_DELAY = 5       # seconds before reopening a live source that stopped
+VIDEO_SSE_HEARTBEAT = 15        # seconds between keep-alive comments on /video/.../stream
+
+
+def parse_video_sources(spec):
+    """"name=source,..." -> {name: source}; a bare number is a camera index (V4L2/DirectShow)"""
+    sources = {}
+    for index, entry in enumerate(filter(None, (part.strip() for part in spec.split(",")))):
+        name, separator, source = entry.partition("=")
+        if not separator:
+            name, source = f"camera{index}", entry
+        source = source.strip()
+        sources[name.strip()] = int(source) if source.isdigit() else source
+    return sources
+
+
+class VideoStream:
+    """Decodes one video source on its own thread and runs detection on selected frames
+
+    The decoder keeps only the newest frame (a one-slot mailbox): when
+    inference is slower than the source, stale frames are overwritten and
+    counted as dropped instead of queueing up. The inference thread runs the
+    model on every k-th frame, or sooner when the scene has changed since
+    the last inferred frame.
+    """
+
+    def __init__(self, name, source, frame_skip=VIDEO_FRAME_SKIP,
+                 motion_threshold=VIDEO_MOTION_THRESHOLD, realtime=None, loop=False):
+        self.name = name
+        self.source = source
+        self.frame_skip = max(0, int(frame_skip))
+        self.motion_threshold = max(0.0, float(motion_threshold))
+        self.realtime = realtime  # pace decoding at the source frame rate (default: files only)
+        self.loop = loop          # restart files at the end instead of stopping
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.state = "stopped"
+        self.last_error = None
+        self.fps = None
+        self.started_at = None
+        self._frame = None        # (index, captured_at, BGR frame) not yet taken by inference
+        self._frame_ready = threading.Condition()
+        self._decoding = False
+        self._events = deque(maxlen=VIDEO_EVENTS_MAX)
+        self._last_event_id = 0
+        self._new_event = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self.frames_decoded = 0
+        self.frames_dropped = 0   # overwritten before inference looked at them
+        self.frames_skipped = 0   # looked at, but no interval or motion trigger
+        self.frames_inferred = 0
+        self.motion_triggers = 0
+        self.inference_ms = 0.0
+
+    def start(self):
+        """Start the decoder and inference threads (no-op if already running)"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._decoding = True
+        self.state = "starting"
+        self.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._threads = [
+            threading.Thread(target=self._decode, name=f"video-decode-{self.name}", daemon=True),
+            threading.Thread(target=self._infer, name=f"video-infer-{self.name}", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.state = "stopped"
+
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _decode(self):
+        """Read frames as fast as the source delivers them, keeping only the newest"""
+        import cv2
+
+        try:
+            while not self._stop.is_set():
+                capture = cv2.VideoCapture(self.source)
+                if not capture.isOpened():
+                    self.last_error = f"Cannot open video source {self.source!r}"
+                    if self.is_file:
+                        self.state = "error"
+                        return
+                    self.state = "reconnecting"
+                    self._stop.wait(VIDEO_RECONNECT_DELAY)
+                    continue
+                
+                self.state = "running"
+                fps = capture.get(cv2.CAP_PROP_FPS)
+                self.fps = round(fps, 2) if fps and fps > 0 else None
+                pace = (self.is_file if self.realtime is None else self.realtime) and self.fps
+                next_frame = time.perf_counter()
+                while not self._stop.is_set():
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    with self._frame_ready:
+                        if self._frame is not None:
+                            self.frames_dropped += 1
+                        self._frame = (self.frames_decoded, time.time(), frame)
+                        self.frames_decoded += 1
+                        self._frame_ready.notify()
+                    if pace:
+                        next_frame += 1 / self.fps
+                        delay = next_frame - time.perf_counter()
+                        if delay > 0:
+                            self._stop.wait(delay)
+                capture.release()
+                
+                if self.is_file and not self.loop:
+                    self.state = "ended"
+                    return
+                if not self.is_file and not self._stop.is_set():
+                    self.state = "reconnecting"
+                    self._stop.wait(VIDEO_RECONNECT_DELAY)
+        except Exception as e:
+            self.state = "error"
+            self.last_error = f"Decode error: {str(e)}"
+        finally:
+            with self._frame_ready:
+                self._decoding = False
+                self._frame_ready.notify_all()
+
+    def _motion(self, frame, reference):
+        """Grayscale thumbnail of a frame and the fraction of it that changed since reference"""
+        import cv2
+        import numpy as np
+
+        thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                               (VIDEO_MOTION_SIZE, VIDEO_MOTION_SIZE), interpolation=cv2.INTER_AREA)
+        if reference is None:
+            return thumbnail, 1.0
+        changed = np.count_nonzero(cv2.absdiff(thumbnail, reference) > VIDEO_MOTION_PIXEL_DELTA)
+        return thumbnail, changed / thumbnail.size
+
+    def _infer(self):
+        """Take the newest frame, decide whether it needs the model, publish the result"""
+        reference = None       # motion thumbnail of the last inferred frame
+        last_inferred = None   # frame index of the last inferred frame
+        
+        while True:
+            with self._frame_ready:
+                while self._frame is None and self._decoding and not self._stop.is_set():
+                    self._frame_ready.wait(1.0)
+                if self._frame is None or self._stop.is_set():
+                    return
+                index, captured_at, frame = self._frame
+                self._frame = None
+            
+            if model is None:
+                self.frames_skipped += 1  # still loading: nothing to run yet
+                continue
+            
+            thumbnail, motion = None, None
+            if self.motion_threshold:
+                thumbnail, motion = self._motion(frame, reference)
+            
+            if last_inferred is None:
+                reason = "first"
+            elif self.frame_skip and index - last_inferred >= self.frame_skip:
+                reason = "interval"
+            elif self.motion_threshold and motion >= self.motion_threshold:
+                reason = "motion"
+                self.motion_triggers += 1
+            elif not self.frame_skip and not self.motion_threshold:
+                reason = "every_frame"
+            else:
+                self.frames_skipped += 1
+                continue
+            
+            started = time.perf_counter()
+            try:
+                # OpenCV decodes BGR; the backends take RGB arrays (a view, no copy)
+                detections = get_engine().submit(frame[:, :, ::-1]).result(timeout=DETECT_TIMEOUT)
+            except Exception as e:
+                self.last_error = f"Detection error: {str(e)}"
+                continue
+            self.inference_ms = (time.perf_counter() - started) * 1000
+            self.frames_inferred += 1
+            last_inferred, reference = index, thumbnail
+            self._publish({
+                "stream": self.name,
+                "frame": index,
+                "captured_at": datetime.fromtimestamp(captured_at).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "reason": reason,
+                "motion": round(motion, 4) if motion is not None else None,
+                "pests": format_pests(detections),
+                "count": len(detections),
+                "latency_ms": round((time.time() - captured_at) * 1000, 1)
+            })
+
+    def _publish(self, event):
+        with self._new_event:
+            self._last_event_id += 1
+            event["id"] = self._last_event_id
+            self._events.append(event)
+            self._new_event.notify_all()
+
+    def events_since(self, since_id=0, timeout=0):
+        """Events newer than since_id, waiting up to timeout seconds for the next one"""
+        with self._new_event:
+            if timeout > 0:
+                self._new_event.wait_for(lambda: self._last_event_id > since_id, timeout)
+            return [event for event in self._events if event["id"] > since_id]
+
+    def stats(self):
+        """Decode/inference counters for /video/streams and /health"""
+        return {
+            "name": self.name,
+            "source": self.source if isinstance(self.source, int) else os.path.basename(str(self.source)),
+            "state": self.state,
+            "started_at": self.started_at,
+            "source_fps": self.fps,
+            "frame_skip": self.frame_skip,
+            "motion_threshold": self.motion_threshold,
+            "frames_decoded": self.frames_decoded,
+            "frames_dropped": self.frames_dropped,
+            "frames_skipped": self.frames_skipped,
+            "frames_inferred": self.frames_inferred,
+            "motion_triggers": self.motion_triggers,
+            "last_inference_ms": round(self.inference_ms, 1),
+            "last_event_id": self._last_event_id,
+            "last_error": self.last_error
+        }
+
+
+# Configured video sources; started from __main__ (or POST /video/streams/<name>/start)
+video_streams = {}
+
+
+def add_video_stream(name, source, **options):
+    """Register a video source and expose its frame counters as metrics"""
+    stream = VideoStream(name, source, **options)
+    video_streams[name] = stream
+    for outcome in ("decoded", "dropped", "skipped", "inferred"):
+        video_frames_total.labels(name, outcome).set_function(
+            lambda outcome=outcome: getattr(stream, f"frames_{outcome}"))
+    return stream
+
+
+def load_model(exit_on_error=True):
+    """Import the backend, load the weights and warm up, timing each phase"""
+    global model
+    model_path = MODEL_PATH
+    startup["state"] = "loading"
+    startup["error"] = None
     
     print("=" * 60)
     print("YOLO Pest Detection Service - Flask Version")
     print("=" * 60)
-    print(f"Loading YOLO model from: {model_path}")
+    print(f"Loading YOLO model from: {model_path} (backend: {MODEL_BACKEND})")
     
     try:
-        model = YOLO(model_path)
-        print("✓ Model loaded successfully!")
-        print(f"✓ Model classes: {len(model.names)}")
-        print(f"✓ Service ready on http://127.0.0.1:5000")
-        print("=" * 60)
+        if not os.path.exists(model_path):
+            hint = ""
+            if MODEL_BACKEND == "onnx":
+                hint = " (export it first: python yolo_detect2.py --export-onnx [--int8])"
+            raise FileNotFoundError(f"Model file not found: {model_path}{hint}")
+        if MODEL_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown YOLO backend '{MODEL_BACKEND}'")
+        
+        started = time.perf_counter()
+        BACKENDS[MODEL_BACKEND].import_dependencies()
+        imported = time.perf_counter()
+        loaded_model = create_backend(model_path=model_path)
+        loaded = time.perf_counter()
+        warm_up(loaded_model)
+        warmed = time.perf_counter()
     except Exception as e:
+        startup["state"] = "error"
+        startup["error"] = str(e)
         print(f"ERROR: Failed to load model: {e}", file=sys.stderr)
-        sys.exit(1)
+        if exit_on_error:
+            sys.exit(1)
+        return False
+    
+    startup.update(
+        import_s=round(imported - started, 3),
+        load_s=round(loaded - imported, 3),
+        warmup_s=round(warmed - loaded, 3),
+        total_s=round(warmed - started, 3)
+    )
+    # Publish the model only once it is warm so no request races the warm-up
+    model = loaded_model
+    startup["state"] = "ready"
+    
+    print("✓ Model loaded successfully!")
+    print(f"✓ Model classes: {len(model.names)}")
+    print(f"✓ Startup: import {startup['import_s']}s, load {startup['load_s']}s, "
+          f"warm-up {startup['warmup_s']}s")
+    print("=" * 60)
+    return True
+
+def model_unavailable():
+    """Error response for requests that arrive before the model is ready"""
+    if startup["state"] in ("starting", "loading"):
+        return jsonify({
+            "status": "error",
+            "message": "Model is still loading, retry shortly"
+        }), 503
+    return jsonify({
+        "status": "error",
+        "message": "Model not loaded"
+    }), 500
+
+@app.before_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count every request and time it (streamed /detect/batch: until the headers)"""
+    endpoint = request.endpoint or "unmatched"
+    requests_total.labels(endpoint, response.status_code).inc()
+    started = g.get("metrics_started")
+    if started is not None:
+        request_seconds.labels(endpoint).observe_since(started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    if startup["state"] == "ready":
+        status = "healthy"
+    elif startup["state"] == "error":
+        status = "error"
+    else:
+        status = "loading"
+    
     return jsonify({
-        "status": "healthy",
+        "status": status,
         "model": "loaded" if model is not None else "not loaded",
-        "version": "2.0-flask"
+        "startup": startup,
+        "version": "2.0-flask",
+        "serving_mode": "process" if worker_pool is not None else "thread",
+        "batching": batcher.stats(),
+        "worker_pool": worker_pool.stats() if worker_pool is not None else None,
+        "annotations_pending": annotator.pending(),
+        "history": history.stats(),
+        "video_streams": {name: stream.state for name, stream in video_streams.items()}
     })
 
 @app.route('/detect', methods=['POST'])
 def detect():
     """Main detection endpoint"""
     try:
-        # Check if model is loaded
-        if model is None:
+        # Reject oversized uploads from the header, before the body is parsed
+        if request.content_length and request.content_length > DETECT_MAX_CONTENT_LENGTH:
             return jsonify({
                 "status": "error",
-                "message": "Model not loaded"
-            }), 500
+                "message": "Image too large (max 10MB)"
+            }), 413
+        
+        # Check if model is loaded
+        if model is None:
+            return model_unavailable()
         
         # Check if image is provided
         if 'image' not in request.files:
@@ -92,110 +1867,460 @@ def detect():
                 "message": "Empty filename"
             }), 400
         
-        # Read image
-        image_bytes = image_file.read()
+        annotate = wants_annotation()
+        # Stored in the detection history: where the caller keeps the capture
+        image_path = request.form.get('image_path') or image_file.filename
         
-        # Validate image size (max 10MB)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            return jsonify({
-                "status": "error",
-                "message": "Image too large (max 10MB)"
-            }), 400
+        # Hash the spooled upload in chunks (no full read into memory)
+        try:
+            cache_key = hash_upload(image_file.stream)
+            tiling = tiling_params() if flag_param('tiled', False) else None
+        except UploadRejected as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status_code
+        if tiling is not None:
+            cache_key += ":tiled:%d:%g:%d" % tiling
         
-        # Open image with PIL
+        # Identical frames are answered from the cache without decoding. In perceptual
+        # mode the miss is counted by the near-duplicate lookup, which tiled requests skip
+        perceptual_lookup = result_cache.perceptual and tiling is None
+        cached = result_cache.get(cache_key, need_annotation=annotate,
+                                  record_miss=not perceptual_lookup)
+        if cached is not None:
+            record_history(*cached, image_path)
+            return cached_response(*cached)
+        
+        # Check dimensions from the header, then decode (decode here so the
+        # batch worker only runs the model)
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-        except Exception as e:
+            # Tiling needs full resolution; whole-frame detection decodes near 640px
+            target_size = None if tiling is not None else MODEL_INPUT_SIZE
+            image, scale = open_upload(image_file.stream, target_size)
+        except UploadRejected as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status_code
+        
+        # Near-duplicate frames (perceptual mode) are matched after decoding
+        phash = None
+        if result_cache.enabled and perceptual_lookup:
+            phash = perceptual_hash(image)
+            cached = result_cache.get(cache_key, phash, need_annotation=annotate)
+            if cached is not None:
+                record_history(*cached, image_path, upload_size(image, scale))
+                return cached_response(*cached)
+        
+        # Run inference through the active engine (batching queue or worker pool)
+        tiling_info = None
+        try:
+            if tiling is not None:
+                started = time.perf_counter()
+                detections, tile_count = detect_tiled(image, *tiling)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                tiling_info = {
+                    "tiles": tile_count,
+                    "tile_size": tiling[0],
+                    "tile_overlap": tiling[1],
+                    "elapsed_ms": round(elapsed_ms, 1),
+                    "budget_ms": TILE_LATENCY_BUDGET_MS
+                }
+            else:
+                submitted = time.perf_counter()
+                detections = get_engine().submit(image).result(timeout=DETECT_TIMEOUT)
+                engine_wait_seconds.observe_since(submitted)
+        except UploadRejected as e:
+            return jsonify({"status": "error", "message": str(e)}), e.status_code
+        except FutureTimeoutError:
             return jsonify({
                 "status": "error",
-                "message": f"Invalid image format: {str(e)}"
-            }), 400
-        
-        # Run inference with save option
-        results = model(image, verbose=False)
+                "message": "Detection timed out waiting for the model"
+            }), 503
         
         # Extract detections
-        pests = []
-        annotated_image_path = None
+        pests, annotated_image_path = finish_detection(
+            image, scale, detections, annotate, cache_key, phash)
+        record_history(pests, annotated_image_path, image_path, upload_size(image, scale))
         
-        for result in results:
-            boxes = result.boxes
-            
-            if boxes is not None and len(boxes) > 0:
-                # Save annotated image with bounding boxes
-                detections_dir = 'detections'
-                if not os.path.exists(detections_dir):
-                    os.makedirs(detections_dir, exist_ok=True)
-                
-                # Generate unique filename
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                unique_id = str(uuid.uuid4())[:8]
-                filename = f"detection_{timestamp}_{unique_id}.jpg"
-                filepath = os.path.join(detections_dir, filename)
-                
-                # Get annotated image from result and save
-                annotated_img = result.plot()  # Returns numpy array with boxes drawn
-                from PIL import Image as PILImage
-                import cv2
-                
-                # Convert BGR to RGB (OpenCV uses BGR)
-                annotated_img_rgb = cv2.cvtColor(annotated_img, cv2.COLOR_BGR2RGB)
-                pil_img = PILImage.fromarray(annotated_img_rgb)
-                pil_img.save(filepath, 'JPEG', quality=90)
-                
-                annotated_image_path = filename  # Return relative path
-                
-                for box in boxes:
-                    # Extract class name and confidence
-                    class_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    
-                    # Get bounding box coordinates
-                    xyxy = box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-                    
-                    # Get class name from model
-                    class_name = model.names[class_id]
-                    
-                    # Add to pests list
-                    pests.append({
-                        "type": class_name,
-                        "confidence": round(confidence * 100, 1),
-                        "bbox": {
-                            "x1": round(xyxy[0], 2),
-                            "y1": round(xyxy[1], 2),
-                            "x2": round(xyxy[2], 2),
-                            "y2": round(xyxy[3], 2)
-                        }
-                    })
-        
-        # Return results with annotated image path
-        return jsonify({
+        response = {
             "pests": pests,
             "count": len(pests),
             "annotated_image": annotated_image_path
-        })
+        }
+        if tiling_info is not None:
+            response["tiling"] = tiling_info
+        
+        # Return results with annotated image path
+        return jsonify(response)
     
+    except HTTPException:
+        # e.g. 413 raised while streaming an over-limit multipart body
+        raise
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": f"Detection error: {str(e)}"
         }), 500
 
+def finish_detection(image, scale, detections, annotate, cache_key, phash=None):
+    """Format pests, queue the annotated image and cache the result"""
+    pests = format_pests(detections, scale)
+    images_total.inc()
+    detections_total.inc(len(detections))
+    annotated_image_path = None
+    
+    # Reserve the annotated filename now; drawing and JPEG encoding
+    # happen on the annotation pool after the response is sent
+    if detections and annotate:
+        annotated_image_path = annotator.submit(image, detections)
+    
+    result_cache.put(cache_key, pests, annotated_image_path, phash)
+    return pests, annotated_image_path
+
+def upload_size(image, scale):
+    """(width, height) of the original upload from the decoded image and its scale"""
+    width, height = image.size
+    return round(width * scale[0]), round(height * scale[1])
+
+def record_history(pests, annotated_image_path, image_path, size=None, source="detect"):
+    """Store a result in the detection history with the request's "arduino_data"
+
+    arduino_data is an optional form field holding a JSON object of the
+    sensor readings taken with the capture.
+    """
+    arduino_data = None
+    raw = request.form.get('arduino_data')
+    if raw and len(raw) <= HISTORY_ARDUINO_MAX_BYTES:
+        try:
+            arduino_data = json.loads(raw)
+        except ValueError:
+            pass
+        if not isinstance(arduino_data, dict):
+            arduino_data = None
+    history.record(pests, source, image_path, annotated_image_path, size, arduino_data)
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """JSON error when the upload stream exceeds MAX_CONTENT_LENGTH"""
+    if request.path == '/detect':
+        message = "Image too large (max 10MB)"
+    else:
+        message = f"Request too large (max {BATCH_REQUEST_MAX_BYTES // (1024 * 1024)}MB)"
+    return jsonify({"status": "error", "message": message}), 413
+
+def iter_batch_uploads():
+    """Yield (filename, stream) for each image of a /detect/batch request
+
+    Accepts repeated multipart "images" fields or one "archive" zip file.
+    Zip members are size-checked from the central directory before reading.
+    """
+    import io
+
+    archive = request.files.get('archive')
+    if archive is not None and archive.filename:
+        try:
+            with zipfile.ZipFile(archive.stream) as zf:
+                members = [info for info in zf.infolist() if not info.is_dir()]
+                if len(members) > BATCH_REQUEST_MAX_IMAGES:
+                    raise UploadRejected(f"Too many images (max {BATCH_REQUEST_MAX_IMAGES})")
+                for info in members:
+                    if info.file_size > MAX_IMAGE_BYTES:
+                        yield info.filename, UploadRejected("Image too large (max 10MB)", 413)
+                        continue
+                    yield info.filename, io.BytesIO(zf.read(info))
+        except zipfile.BadZipFile as e:
+            raise UploadRejected(f"Invalid zip archive: {str(e)}")
+        return
+    
+    files = request.files.getlist('images') or request.files.getlist('image')
+    if not files:
+        raise UploadRejected("No images provided (use 'images' fields or an 'archive' zip)")
+    if len(files) > BATCH_REQUEST_MAX_IMAGES:
+        raise UploadRejected(f"Too many images (max {BATCH_REQUEST_MAX_IMAGES})")
+    for image_file in files:
+        yield image_file.filename, image_file.stream
+
+@app.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    """Detect pests in many images, streaming one NDJSON line per image as it finishes"""
+    # Raise the body cap for this request only, before anything parses the form
+    request.max_content_length = BATCH_MAX_CONTENT_LENGTH
+    if model is None:
+        return model_unavailable()
+    
+    annotate = wants_annotation()
+    started = time.perf_counter()
+    immediate = []   # lines known before inference (cache hits, rejected images)
+    pending = {}     # Future -> (index, filename, image, scale, cache_key)
+    engine = get_engine()
+    
+    try:
+        for index, (filename, stream) in enumerate(iter_batch_uploads()):
+            try:
+                if isinstance(stream, UploadRejected):
+                    raise stream
+                cache_key = hash_upload(stream)
+                cached = result_cache.get(cache_key, need_annotation=annotate)
+                if cached is not None:
+                    immediate.append(batch_line(index, filename, *cached, cached=True))
+                    record_history(*cached, filename, source="batch")
+                    continue
+                image, scale = open_upload(stream)
+            except UploadRejected as e:
+                immediate.append(batch_error(index, filename, str(e)))
+                continue
+            # Submit everything up front so the engine can batch across images
+            pending[engine.submit(image)] = (index, filename, image, scale, cache_key)
+    except UploadRejected as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
+    
+    total = len(immediate) + len(pending)
+    
+    def generate():
+        succeeded = failed = 0
+        for line in immediate:
+            if line["status"] == "success":
+                succeeded += 1
+            else:
+                failed += 1
+            yield json.dumps(line) + "\n"
+        
+        try:
+            for future in as_completed(pending, timeout=BATCH_REQUEST_TIMEOUT):
+                index, filename, image, scale, cache_key = pending.pop(future)
+                try:
+                    pests, annotated_image_path = finish_detection(
+                        image, scale, future.result(), annotate, cache_key)
+                    line = batch_line(index, filename, pests, annotated_image_path)
+                    record_history(pests, annotated_image_path, filename,
+                                   upload_size(image, scale), source="batch")
+                    succeeded += 1
+                except Exception as e:
+                    line = batch_error(index, filename, f"Detection error: {str(e)}")
+                    failed += 1
+                yield json.dumps(line) + "\n"
+        except FutureTimeoutError:
+            for index, filename, _, _, _ in pending.values():
+                failed += 1
+                yield json.dumps(batch_error(index, filename, "Detection timed out")) + "\n"
+        
+        yield json.dumps({
+            "status": "complete",
+            "total": total,
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+def batch_line(index, filename, pests, annotated_image_path, cached=False):
+    """One successful NDJSON result line"""
+    return {
+        "index": index,
+        "filename": filename,
+        "status": "success",
+        "pests": pests,
+        "count": len(pests),
+        "annotated_image": annotated_image_path,
+        "cached": cached
+    }
+
+def batch_error(index, filename, message):
+    """One failed NDJSON result line (the rest of the batch carries on)"""
+    return {"index": index, "filename": filename, "status": "error", "message": message}
+
+def cached_response(pests, annotated_image_path):
+    """Build the /detect response for a cache hit"""
+    return jsonify({
+        "pests": pests,
+        "count": len(pests),
+        "annotated_image": annotated_image_path,
+        "cached": True
+    })
+
+@app.route('/detections/<path:filename>', methods=['GET'])
+def get_annotated_image(filename):
+    """Serve an annotated image, or report its status while it is still being written"""
+    wait = min(request.args.get('wait', 0, type=float), DETECT_TIMEOUT)
+    if wait > 0:
+        annotator.wait(filename, wait)
+    
+    status, error = annotator.status(filename)
+    if status == "ready":
+        return send_from_directory(os.path.abspath(DETECTIONS_DIR), filename, mimetype='image/jpeg')
+    if status == "pending":
+        return jsonify({"status": "pending", "annotated_image": filename}), 202
+    if status == "error":
+        return jsonify({"status": "error", "message": f"Annotation failed: {error}"}), 500
+    return jsonify({"status": "error", "message": "Unknown annotated image"}), 404
+
+def video_stream_not_found(name):
+    return jsonify({"status": "error", "message": f"Unknown video stream '{name}'"}), 404
+
+@app.route('/video/streams', methods=['GET'])
+def list_video_streams():
+    """Configured video sources and their decode/inference counters"""
+    return jsonify({"streams": [stream.stats() for stream in video_streams.values()]})
+
+@app.route('/video/streams/<name>/start', methods=['POST'])
+def start_video_stream(name):
+    """(Re)start a configured source, optionally with new frame_skip / motion settings"""
+    stream = video_streams.get(name)
+    if stream is None:
+        return video_stream_not_found(name)
+    if stream.running():
+        stream.stop()
+    try:
+        if request.values.get('frame_skip') is not None:
+            stream.frame_skip = max(0, int(request.values['frame_skip']))
+        if request.values.get('motion') is not None:
+            stream.motion_threshold = max(0.0, float(request.values['motion']))
+    except ValueError:
+        return jsonify({"status": "error", "message": "frame_skip and motion must be numbers"}), 400
+    stream.start()
+    return jsonify(stream.stats())
+
+@app.route('/video/streams/<name>/stop', methods=['POST'])
+def stop_video_stream(name):
+    stream = video_streams.get(name)
+    if stream is None:
+        return video_stream_not_found(name)
+    stream.stop()
+    return jsonify(stream.stats())
+
+@app.route('/video/streams/<name>/events', methods=['GET'])
+def video_stream_events(name):
+    """Detection events after ?since=<id>; ?wait=<s> long-polls for the next one"""
+    stream = video_streams.get(name)
+    if stream is None:
+        return video_stream_not_found(name)
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), DETECT_TIMEOUT)
+    events = stream.events_since(since, wait)
+    return jsonify({
+        "stream": name,
+        "state": stream.state,
+        "last_event_id": events[-1]["id"] if events else since,
+        "events": events
+    })
+
+@app.route('/video/streams/<name>/stream', methods=['GET'])
+def video_stream_sse(name):
+    """Server-Sent Events: one "detection" event per inferred frame"""
+    stream = video_streams.get(name)
+    if stream is None:
+        return video_stream_not_found(name)
+    since = request.args.get('since', stream.stats()["last_event_id"], type=int)
+    
+    def generate():
+        last_id = since
+        while True:
+            events = stream.events_since(last_id, VIDEO_SSE_HEARTBEAT)
+            if not events:
+                if not stream.running():
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['id']}\nevent: detection\ndata: {json.dumps(event)}\n\n"
+            last_id = events[-1]["id"]
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+@app.route('/history/detections', methods=['GET'])
+def history_detections():
+    """Stored detections, newest first: ?from=&to=&class=&min_confidence=&limit=&before=
+
+    from/to take epoch seconds or local "YYYY-MM-DD[ HH:MM:SS]" times (to is
+    exclusive); before is the "next" cursor of the previous page.
+    """
+    try:
+        start = parse_history_time(request.args.get('from'))
+        end = parse_history_time(request.args.get('to'))
+        min_confidence = request.args.get('min_confidence', type=float)
+        limit = min(max(1, request.args.get('limit', HISTORY_QUERY_LIMIT, type=int)), HISTORY_QUERY_MAX_LIMIT)
+        before = None
+        if request.args.get('before'):
+            detected_at, _, detection_id = request.args['before'].partition(':')
+            before = (float(detected_at), int(detection_id))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    
+    records, next_cursor = history.query(start, end, request.args.get('class') or None,
+                                         min_confidence, limit, before)
+    return jsonify({
+        "status": "success",
+        "detections": records,
+        "count": len(records),
+        "next": next_cursor
+    })
+
+@app.route('/history/daily', methods=['GET'])
+def history_daily():
+    """Images and pests per day (optionally one ?class=) from ?from= to ?to= inclusive (YYYY-MM-DD)"""
+    try:
+        start = parse_history_time(request.args.get('from'))
+        end = parse_history_time(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    
+    days = history.daily_counts(history_day(start) if start is not None else None,
+                                history_day(end) if end is not None else None,
+                                request.args.get('class') or None)
+    return jsonify({"status": "success", "days": days})
+
 @app.route('/info', methods=['GET'])
 def info():
     """Get model information"""
     if model is None:
-        return jsonify({"error": "Model not loaded"}), 500
+        return model_unavailable()
     
     return jsonify({
         "model_classes": list(model.names.values()),
         "num_classes": len(model.names),
-        "model_type": "YOLOv8"
+        "model_type": "YOLOv8",
+        "backend": model.name,
+        "model_path": MODEL_PATH,
+        "cache": result_cache.stats()
     })
 
 if __name__ == '__main__':
-    # Load model before starting server
-    load_model()
+    # One-shot export: python yolo_detect2.py --export-onnx [--int8]
+    if '--export-onnx' in sys.argv:
+        export_onnx(int8='--int8' in sys.argv)
+        sys.exit(0)
+    
+    # One-shot import: python yolo_detect2.py --import-records [data/camera_records.json]
+    if '--import-records' in sys.argv:
+        position = sys.argv.index('--import-records') + 1
+        records_path = sys.argv[position] if position < len(sys.argv) else CAMERA_RECORDS_PATH
+        read, added, skipped = history.import_records(records_path)
+        print(f"✓ Imported {added} of {read} records from {records_path} into {history.path}"
+              + (f" ({skipped} skipped, no usable timestamp)" if skipped else ""))
+        sys.exit(0)
+    
+    if SERVING_MODE == "process":
+        # Workers are spawned and load their own weights in parallel; the
+        # parent's copy only serves /info and the cache fingerprint
+        worker_pool = WorkerPool()
+        worker_pool.start()
+        load_model()
+        print(f"✓ Worker pool: {worker_pool.worker_count} processes ({worker_pool.start_method})")
+    else:
+        batcher.start()
+        print(f"✓ Micro-batching: up to {batcher.max_batch_size} images / {BATCH_MAX_WAIT_MS:g} ms")
+        if STARTUP_MODE == "blocking":
+            load_model()
+        else:
+            # Bind the HTTP server immediately; /health reports "loading" until warm
+            threading.Thread(target=load_model, kwargs={"exit_on_error": False},
+                             name="yolo-loader", daemon=True).start()
+    
+    # Continuous detection on configured video sources (YOLO_VIDEO_SOURCES)
+    for name, source in parse_video_sources(VIDEO_SOURCES).items():
+        add_video_stream(name, source).start()
+        print(f"✓ Video stream '{name}': every {VIDEO_FRAME_SKIP} frame(s) "
+              f"or motion > {VIDEO_MOTION_THRESHOLD:g} (/video/streams/{name}/events)")
     
     # Display ngrok tunnel information
     print("\n" + "=" * 60)